@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+from fastapi import HTTPException
+from export import flatten_item
+from metrics import ANALYTICS_QUERY_SECONDS
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # analytics are unavailable without numpy and pandas; everything else works
+    np = pd = None
+
+logger = logging.getLogger(__name__)
+
+# Dataset versions kept as columnar frames per worker
+ANALYTICS_MAX_FRAMES = int(os.getenv('ANALYTICS_MAX_FRAMES', '16'))
+# Query results memoized per worker, across all frames
+ANALYTICS_MAX_RESULTS = int(os.getenv('ANALYTICS_MAX_RESULTS', '1024'))
+# Text columns with fewer distinct values than this share of rows are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+AGGREGATIONS = frozenset({'count', 'sum', 'mean', 'min', 'max'})
+
+
+def build_frame(items: List[Dict[str, Any]]) -> 'pd.DataFrame':
+    """
+    Columnar copy of a dataset, one column per field as in exports. Columns whose values
+    are all numeric (HubSpot sends numbers as strings) become float columns, and
+    repetitive text columns become categoricals, so group-bys work on integer codes.
+    """
+    frame = pd.DataFrame.from_records([flatten_item(item) for item in items])
+    for column in frame.columns:
+        values = frame[column].where(frame[column] != '')
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        if kind in ('integer', 'floating', 'mixed-integer-float', 'decimal', 'string'):
+            numbers = pd.to_numeric(values, errors='coerce')
+            if numbers.notna().sum() == values.notna().sum():
+                frame[column] = numbers.astype('float64')
+                continue
+        if kind == 'string' and values.nunique() < CATEGORY_MAX_RATIO * max(len(values), 1):
+            frame[column] = values.astype('category')
+        else:
+            frame[column] = values
+    return frame
+
+
+def _column(frame: 'pd.DataFrame', field: str) -> 'pd.Series':
+    if field not in frame.columns:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+    return frame[field]
+
+
+def _numeric_column(frame: 'pd.DataFrame', field: str) -> 'pd.Series':
+    column = _column(frame, field)
+    if column.dtype != 'float64':
+        raise HTTPException(status_code=400, detail=f"Field is not numeric: {field}")
+    return column
+
+
+def _metric_name(metric: Dict[str, Any]) -> str:
+    return metric['op'] if metric['op'] == 'count' and not metric.get('field') else f"{metric['op']}_{metric['field']}"
+
+
+def _records(frame: 'pd.DataFrame') -> List[Dict[str, Any]]:
+    # Through JSON, so numpy scalars become plain numbers and NaN becomes null
+    return json.loads(frame.to_json(orient='records'))
+
+
+def run_query(frame: 'pd.DataFrame', query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Group-by aggregates and/or a histogram over a frame. `where` keeps rows whose field
+    equals a value or is in a list of values; `metrics` are {'op', 'field'} with ops
+    count, sum, mean, min and max; groups are ordered by the first metric, descending.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for field, wanted in (query.get('where') or {}).items():
+        column = _column(frame, field)
+        wanted = wanted if isinstance(wanted, list) else [wanted]
+        if column.dtype == 'float64':
+            wanted = pd.to_numeric(pd.Series(wanted, dtype=object), errors='coerce')
+        mask &= column.isin(wanted).to_numpy()
+    rows = frame[mask] if not mask.all() else frame
+    result: Dict[str, Any] = {'rows': int(len(rows))}
+
+    metrics = query.get('metrics') or [{'op': 'count'}]
+    for metric in metrics:
+        if metric['op'] not in AGGREGATIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported aggregation: {metric['op']}")
+        if metric['op'] != 'count' or metric.get('field'):
+            (_column if metric['op'] == 'count' else _numeric_column)(rows, metric['field'])
+
+    group_by = query.get('group_by') or []
+    if group_by:
+        for field in group_by:
+            _column(rows, field)
+        grouped = rows.groupby(group_by, dropna=False, observed=True, sort=False)
+        table = pd.DataFrame({
+            _metric_name(metric): grouped.size() if metric['op'] == 'count' and not metric.get('field')
+            else grouped[metric['field']].agg(metric['op'])
+            for metric in metrics
+        })
+        table = table.sort_values(_metric_name(metrics[0]), ascending=False, kind='stable')
+        result['groups'] = _records(table.head(query.get('limit') or 100).reset_index())
+        result['group_count'] = int(len(table))
+    else:
+        totals = {
+            _metric_name(metric): len(rows) if metric['op'] == 'count' and not metric.get('field')
+            else getattr(rows[metric['field']], metric['op'])()
+            for metric in metrics
+        }
+        result['totals'] = _records(pd.DataFrame([totals]))[0]
+
+    histogram = query.get('histogram')
+    if histogram:
+        values = _numeric_column(rows, histogram['field']).to_numpy()
+        values = values[~np.isnan(values)]
+        value_range = (histogram['min'], histogram['max']) if histogram.get('min') is not None and histogram.get('max') is not None else None
+        counts, edges = np.histogram(values, bins=histogram.get('bins') or 10, range=value_range)
+        result['histogram'] = {'field': histogram['field'], 'edges': edges.tolist(), 'counts': counts.tolist()}
+    return result
+
+
+class DatasetAnalytics:
+    """
+    Aggregates over cached datasets. Each dataset version is turned into a columnar
+    frame once, on first query, and results are memoized per (version, query); a new
+    cache version has a new ETag, so it gets a new frame and stale results age out.
+    """
+    def __init__(self, max_frames: int = ANALYTICS_MAX_FRAMES, max_results: int = ANALYTICS_MAX_RESULTS):
+        self.max_frames = max_frames
+        self.max_results = max_results
+        self._frames: 'OrderedDict[tuple, asyncio.Future]' = OrderedDict()
+        self._results: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+
+    async def _frame(self, version: tuple, load_items) -> 'pd.DataFrame':
+        # Concurrent first queries of a version share one build
+        future = self._frames.get(version)
+        if future is None:
+            future = asyncio.ensure_future(self._build(load_items))
+            self._frames[version] = future
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        self._frames.move_to_end(version)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            self._frames.pop(version, None)
+            raise
+
+    @staticmethod
+    async def _build(load_items) -> 'pd.DataFrame':
+        items = await load_items()
+        started = time.perf_counter()
+        # Off the event loop; 100k items take a while to convert
+        frame = await asyncio.to_thread(build_frame, items)
+        logger.info("📊 Built analytics frame of %d rows in %.0f ms", len(frame), (time.perf_counter() - started) * 1000)
+        return frame
+
+    async def query(self, version: tuple, query: Dict[str, Any], load_items) -> Dict[str, Any]:
+        """
+        Answer `query` over the dataset version identified by `version`; `load_items` is
+        a coroutine function returning the version's items, called only to build its frame.
+        """
+        if pd is None:
+            raise HTTPException(status_code=501, detail="Analytics require numpy and pandas")
+        started = time.perf_counter()
+        key = (version, json.dumps(query, sort_keys=True))
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            ANALYTICS_QUERY_SECONDS.labels('memoized').observe(time.perf_counter() - started)
+            return result
+
+        frame = await self._frame(version, load_items)
+        started = time.perf_counter()
+        result = run_query(frame, query)
+        ANALYTICS_QUERY_SECONDS.labels('computed').observe(time.perf_counter() - started)
+        self._results[key] = result
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+        return result
+
+
+dataset_analytics = DatasetAnalytics()
+
+__all__ = ['dataset_analytics', 'DatasetAnalytics', 'build_frame', 'run_query', 'AGGREGATIONS']
@@ -0,0 +1,74 @@
+"""
+Peak memory of parsing a large synthetic provider page whole (json.loads) versus
+incrementally with JsonRecordStream, both consuming records one at a time and
+collecting them into a list as the provider fetchers do with each page. Collecting
+still holds every parsed record; what streaming saves is the raw body and the
+decoded text held alongside them.
+
+Run from the backend directory:
+    python -m benchmarks.json_stream_memory --records 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from integrations.json_stream import JsonRecordStream, CHUNK_SIZE
+
+
+def synthetic_record(i: int) -> dict:
+    return {
+        'id': f'rec{i:08d}',
+        'createdTime': '2024-01-01T00:00:00.000Z',
+        'fields': {
+            'Name': f'Record {i}',
+            'Notes': 'lorem ipsum dolor sit amet ' * 8,
+            'Amount': i * 1.5,
+            'Tags': ['alpha', 'beta', 'gamma'],
+        },
+    }
+
+
+async def synthetic_body(records: int):
+    """Yields the page body in network-sized chunks without ever building it whole"""
+    buffer = b'{"records": ['
+    for i in range(records):
+        buffer += (b',' if i else b'') + json.dumps(synthetic_record(i)).encode('utf-8')
+        if len(buffer) >= CHUNK_SIZE:
+            yield buffer
+            buffer = b''
+    yield buffer + b'], "offset": "itrNext"}'
+
+
+async def parse_whole(records: int) -> int:
+    body = b''.join([chunk async for chunk in synthetic_body(records)])
+    return sum(1 for _ in json.loads(body)['records'])
+
+
+async def parse_streaming(records: int) -> int:
+    return sum([1 async for _ in JsonRecordStream(synthetic_body(records), 'records')])
+
+
+async def parse_collected(records: int) -> int:
+    return len([record async for record in JsonRecordStream(synthetic_body(records), 'records')])
+
+
+def measure(label: str, parse, records: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = asyncio.run(parse(records))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<10} records={count:<8} peak={peak / 1024 / 1024:8.2f} MiB  time={elapsed:6.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000)
+    args = parser.parse_args()
+
+    measure('whole', parse_whole, args.records)
+    measure('streaming', parse_streaming, args.records)
+    measure('collected', parse_collected, args.records)
@@ -1,9 +1,52 @@
-from redis import Redis
+import gzip
+import hashlib
 import json
+import logging
+import os
+import time
+import zlib
 from datetime import timedelta
-from typing import Dict, Any, Optional
-from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from typing import Dict, Any, AsyncIterator, Optional, List, Tuple
+from redis_client import redis_client, transaction_pipeline, redis_breaker, local_store, RedisUnavailable, add_key_value_redis, get_values_redis, delete_key_redis, delete_keys_redis
 from integrations.integration_item import IntegrationItem  # Update this import path
+from metrics import CACHE_TTL_SECONDS, CACHE_REFRESHES, CACHE_CHUNKS
+from log import payload
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+
+# Adaptive TTL bounds: datasets that come back unchanged on refresh live longer,
+# datasets that changed are refreshed sooner
+CACHE_MIN_TTL = int(os.getenv('CACHE_MIN_TTL', '60'))
+CACHE_MAX_TTL = int(os.getenv('CACHE_MAX_TTL', str(int(timedelta(days=1).total_seconds()))))
+CACHE_TTL_GROWTH = float(os.getenv('CACHE_TTL_GROWTH', '2.0'))
+CACHE_TTL_SHRINK = float(os.getenv('CACHE_TTL_SHRINK', '0.5'))
+# Change-rate stats outlive the entries they describe
+CACHE_STATS_EXPIRATION = int(timedelta(days=30).total_seconds())
+# Expired entries are kept this much longer, served only to orgs over their usage budget
+CACHE_STALE_SECONDS = int(os.getenv('CACHE_STALE_SECONDS', str(int(timedelta(hours=6).total_seconds()))))
+# Dataset versions whose item changes are kept for delta loads
+DELTA_HISTORY = int(os.getenv('DELTA_HISTORY', '50'))
+# Bodies at least this large are stored as content-addressed chunks under a manifest
+CACHE_CHUNK_THRESHOLD = int(os.getenv('CACHE_CHUNK_THRESHOLD', str(1024 * 1024)))
+# Chunks end on an item boundary once past the minimum size, and always by the maximum
+CACHE_CHUNK_MIN_BYTES = 128 * 1024
+CACHE_CHUNK_MAX_BYTES = 1024 * 1024
+# Past the minimum, a chunk ends after an item whose checksum is divisible by this.
+# Boundaries follow content rather than offsets, so an inserted item only changes
+# the chunk it lands in and a refresh can reuse the rest
+CACHE_CHUNK_BOUNDARY_DIVISOR = 16
+# Chunks per MGET or SET round trip
+CACHE_CHUNK_BATCH = 8
+# Chunks outlive the manifest that lists them, so readers holding it can finish
+CACHE_CHUNK_GRACE_SECONDS = 300
 
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -11,57 +54,497 @@ class CustomJSONEncoder(json.JSONEncoder):
             try:
                 return obj.to_dict()
             except Exception as e:
-                print(f"Error converting IntegrationItem to dict: {str(e)}")
-                print(f"Object: {obj}")
+                logger.error("Error converting IntegrationItem to dict: %s (object: %s)", e, payload(obj))
                 raise
         return super().default(obj)
 
+def encode_entry(data: Any) -> Dict[str, bytes]:
+    """
+    Serialize data once into a cache entry: the JSON body, a content-hash ETag and,
+    for large bodies, pre-compressed gzip/brotli variants served as-is on every hit.
+    Bodies big enough to be stored in chunks are served uncompressed and get none.
+    """
+    body = json.dumps(data, cls=CustomJSONEncoder).encode('utf-8')
+    entry = {
+        'body': body,
+        'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"'.encode('utf-8'),
+    }
+    if COMPRESSION_MIN_BYTES <= len(body) < CACHE_CHUNK_THRESHOLD:
+        entry['gzip'] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            entry['br'] = brotli.compress(body, quality=5)
+    return entry
+
+def _items_of(data: Any) -> Optional[list]:
+    """The item list of a dataset (a list of items or {'items': [...]}), if it has one"""
+    items = data.get('items') if isinstance(data, dict) else data
+    return items if isinstance(items, list) else None
+
+def item_hashes(body: bytes) -> Optional[Dict[str, str]]:
+    """
+    Content hash per item id of a dataset body (a list of items or {'items': [...]}).
+    Returns None for datasets whose items have no ids, which cannot be diffed.
+    """
+    return _item_hashes(_items_of(json.loads(body)))
+
+def _item_hashes(items: Optional[list]) -> Optional[Dict[str, str]]:
+    if items is None or not all(isinstance(item, dict) and item.get('id') is not None for item in items):
+        return None
+    return {
+        str(item['id']): hashlib.sha256(json.dumps(item, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        for item in items
+    }
+
+def split_items(data: Any, items: list) -> Tuple[bytes, bytes, List[bytes]]:
+    """
+    Serialize a dataset as (head, tail, encoded items) such that
+    head + b', '.join(encoded items) + tail is its JSON body.
+    """
+    if isinstance(data, list):
+        head, tail = '[', ']'
+    else:
+        marker = '\x00items\x00'
+        head, tail = json.dumps({**data, 'items': marker}).split(json.dumps(marker))
+        head, tail = head + '[', ']' + tail
+    return head.encode('utf-8'), tail.encode('utf-8'), [json.dumps(item).encode('utf-8') for item in items]
+
+def chunk_items(encoded_items: List[bytes]) -> List[Tuple[bytes, int]]:
+    """Group encoded items into (chunk, item count) with content-defined boundaries"""
+    chunks, current, size = [], [], 0
+    for item in encoded_items:
+        current.append(item)
+        size += len(item) + 2
+        if size >= CACHE_CHUNK_MAX_BYTES or (
+            size >= CACHE_CHUNK_MIN_BYTES and zlib.crc32(item) % CACHE_CHUNK_BOUNDARY_DIVISOR == 0
+        ):
+            chunks.append((b', '.join(current), len(current)))
+            current, size = [], 0
+    if current:
+        chunks.append((b', '.join(current), len(current)))
+    return chunks
+
+class CacheChunkMissing(Exception):
+    """A chunk listed in a manifest has been evicted from Redis"""
+
+def merge_changes(changes: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Collapse consecutive per-version change records into one set of added, changed and
+    removed ids relative to the version before the first record.
+    """
+    existed, present = {}, {}
+    for change in changes:
+        for op in ('added', 'changed', 'removed'):
+            for item_id in change[op]:
+                # Whether the client's snapshot has the item follows from the first op seen on it
+                existed.setdefault(item_id, op != 'added')
+                present[item_id] = op != 'removed'
+    delta = {'added': [], 'changed': [], 'removed': []}
+    for item_id, is_present in present.items():
+        if existed[item_id] and is_present:
+            delta['changed'].append(item_id)
+        elif is_present:
+            delta['added'].append(item_id)
+        elif existed[item_id]:
+            delta['removed'].append(item_id)
+    return delta
+
 class Cache:
     def __init__(self):
         self.default_expiration = int(timedelta(hours=1).total_seconds())
 
+    @staticmethod
+    def tenant_scope(credentials: Dict[str, Any]) -> str:
+        """
+        Short hashed scope for a cache entry. Credentials resolved from a handle carry
+        org_id/user_id and are scoped to the tenant; inline credentials fall back to a
+        hash of the credentials themselves.
+        """
+        if credentials.get('org_id') and credentials.get('user_id'):
+            scope = f"{credentials['org_id']}:{credentials['user_id']}"
+        else:
+            # Sort credentials to ensure consistent key generation
+            scope = json.dumps(credentials, sort_keys=True)
+        return hashlib.sha256(scope.encode()).hexdigest()[:16]
+
     def _generate_key(self, integration_type: str, credentials: Dict[str, Any]) -> str:
-        """Generate a unique cache key based on integration type and credentials"""
-        # Sort credentials to ensure consistent key generation
-        cred_str = json.dumps(credentials, sort_keys=True)
-        return f"integration:{integration_type}:{cred_str}"
+        """
+        Generate a short cache key based on integration type and tenant. The scope is a
+        {hash tag}, so a tenant's entries, stats and tag sets share one Redis Cluster slot.
+        """
+        return f"integration:{integration_type}:{{{self.tenant_scope(credentials)}}}"
+
+    @staticmethod
+    def _stats_key(key: str) -> str:
+        return f"cache_ttl:{key}"
+
+    async def _adapt_ttl(self, key: str, dataset: str, etag: bytes, adapt: bool = True) -> int:
+        """
+        Choose the TTL for a fresh write by comparing its content hash with the previous
+        fetch: unchanged data grows the TTL, changed data shrinks it, within bounds.
+        With adapt=False the previous TTL is kept as is.
+        """
+        previous_etag, previous_ttl = await redis_breaker.call(redis_client.hmget(self._stats_key(key), 'etag', 'ttl'))
+        ttl = int(previous_ttl) if previous_ttl else self.default_expiration
+        if adapt and previous_etag is not None:
+            changed = previous_etag != etag
+            ttl = ttl * (CACHE_TTL_SHRINK if changed else CACHE_TTL_GROWTH)
+            CACHE_REFRESHES.labels(dataset, str(changed).lower()).inc()
+        ttl = int(min(CACHE_MAX_TTL, max(CACHE_MIN_TTL, ttl)))
+        CACHE_TTL_SECONDS.labels(dataset).observe(ttl)
+        return ttl
+
+    async def get_ttl(self, integration_type: str, credentials: Dict[str, Any]) -> Optional[int]:
+        """TTL chosen for the dataset on its last write"""
+        try:
+            ttl = await redis_breaker.call(
+                redis_client.hget(self._stats_key(self._generate_key(integration_type, credentials)), 'ttl')
+            )
+        except RedisUnavailable:
+            return None
+        return int(ttl) if ttl else None
+
+    @staticmethod
+    def _delta_key(key: str) -> str:
+        return f"delta:{key}"
+
+    @staticmethod
+    def _delta_log_key(key: str) -> str:
+        return f"delta_log:{key}"
+
+    async def _next_version(self, key: str, hashes: Optional[Dict[str, str]]) -> tuple:
+        """
+        Compare a fresh write's item hashes with the previous write's. Returns the dataset
+        version to store and the change record for the version, which is None when
+        nothing changed. Datasets that cannot be diffed get a 'reset' record.
+        """
+        version, previous_hashes = await redis_breaker.call(
+            redis_client.hmget(self._delta_key(key), 'version', 'hashes')
+        )
+        version = int(version) if version else 0
+        previous_hashes = json.loads(previous_hashes) if previous_hashes else None
+        if hashes is None or previous_hashes is None:
+            return version + 1, {'version': version + 1, 'reset': True}
+
+        change = {
+            'added': [item_id for item_id in hashes if item_id not in previous_hashes],
+            'changed': [
+                item_id for item_id, item_hash in hashes.items()
+                if item_id in previous_hashes and previous_hashes[item_id] != item_hash
+            ],
+            'removed': [item_id for item_id in previous_hashes if item_id not in hashes],
+        }
+        if not any(change.values()):
+            return version, None
+        return version + 1, {'version': version + 1, **change}
+
+    async def get_changes(self, integration_type: str, credentials: Dict[str, Any], since_version: int) -> Optional[List[Dict]]:
+        """
+        Change records for every version after since_version, oldest first.
+        Returns None if part of that history is gone or a version cannot be diffed.
+        """
+        key = self._generate_key(integration_type, credentials)
+        try:
+            records = await redis_breaker.call(redis_client.lrange(self._delta_log_key(key), 0, -1))
+        except RedisUnavailable:
+            return None
+        changes = [change for change in map(json.loads, records) if change['version'] > since_version]
+        if not changes or changes[0]['version'] != since_version + 1 or any(change.get('reset') for change in changes):
+            return None
+        return changes
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"cache_tag:{tag}"
+
+    @classmethod
+    def integration_tag(cls, credentials: Dict[str, Any], integration: str) -> str:
+        """Tag shared by every entry of one integration for one tenant"""
+        return f"integration:{{{cls.tenant_scope(credentials)}}}:{integration}"
+
+    @classmethod
+    def api_type_tag(cls, credentials: Dict[str, Any], integration: str, api_type: str) -> str:
+        """Tag of one api_type variant (e.g. HubSpot deals) of an integration for one tenant"""
+        return f"api_type:{{{cls.tenant_scope(credentials)}}}:{integration}:{api_type}"
+
+    @classmethod
+    def tags_for(cls, credentials: Dict[str, Any], integration: str, api_type: Optional[str] = None) -> List[str]:
+        """Tags an entry is filed under: its tenant, tenant + integration and tenant + api_type"""
+        scope = cls.tenant_scope(credentials)
+        tags = [f"tenant:{{{scope}}}", cls.integration_tag(credentials, integration)]
+        if api_type:
+            tags.append(cls.api_type_tag(credentials, integration, api_type))
+        return tags
 
     async def get_data(self, integration_type: str, credentials: Dict[str, Any]) -> Optional[Dict]:
         """
         Retrieve data from cache
         Returns None if key doesn't exist
         """
+        entry = await self.get_entry(integration_type, credentials)
+        return json.loads(await self.read_body(entry)) if entry else None
+
+    @staticmethod
+    def is_stale(entry: Dict[str, bytes]) -> bool:
+        return 'fresh_until' in entry and float(entry['fresh_until']) <= time.time()
+
+    @staticmethod
+    def is_chunked(entry: Dict[str, bytes]) -> bool:
+        """Whether the entry is a manifest whose items are stored in separate chunk keys"""
+        return 'chunks' in entry
+
+    @staticmethod
+    def _chunk_key(scope: str, digest: str) -> str:
+        # The scope is the entry's {hash tag}, so chunks share its cluster slot
+        return f"cache_chunk:{scope}:{digest}"
+
+    def _chunk_keys(self, entry: Dict[str, bytes]) -> List[Tuple[str, int]]:
+        """(chunk key, item count) of each chunk of a manifest, in order"""
+        scope = entry['chunk_scope'].decode('utf-8')
+        return [(self._chunk_key(scope, digest), count) for digest, count in json.loads(entry['chunks'])]
+
+    async def _read_chunks(self, keys: List[str]) -> AsyncIterator[bytes]:
+        for start in range(0, len(keys), CACHE_CHUNK_BATCH):
+            chunks = await redis_breaker.call(redis_client.mget(keys[start:start + CACHE_CHUNK_BATCH]))
+            for key, chunk in zip(keys[start:start + CACHE_CHUNK_BATCH], chunks):
+                if chunk is None:
+                    CACHE_CHUNKS.labels('missing').inc()
+                    raise CacheChunkMissing(key)
+                yield chunk
+
+    async def iter_body(self, entry: Dict[str, bytes]) -> AsyncIterator[bytes]:
+        """The entry's JSON body in pieces, reading a chunked entry a few chunks at a time"""
+        if not self.is_chunked(entry):
+            yield entry['body']
+            return
+        yield entry['head']
+        separator = b''
+        async for chunk in self._read_chunks([key for key, _ in self._chunk_keys(entry)]):
+            yield separator + chunk
+            separator = b', '
+        yield entry['tail']
+
+    async def read_body(self, entry: Dict[str, bytes]) -> bytes:
+        """The entry's whole JSON body; prefer iter_body or iter_items for chunked entries"""
+        if not self.is_chunked(entry):
+            return entry['body']
+        return b''.join([part async for part in self.iter_body(entry)])
+
+    async def iter_items(self, entry: Dict[str, bytes], start: int = 0, stop: Optional[int] = None) -> AsyncIterator[Any]:
+        """Items start to stop of the entry's dataset; of a chunked entry only the chunks holding them are read"""
+        if not self.is_chunked(entry):
+            for item in (_items_of(json.loads(entry['body'])) or [])[start:stop]:
+                yield item
+            return
+        keys, position, offset = [], None, 0
+        for key, count in self._chunk_keys(entry):
+            if offset + count > start and (stop is None or offset < stop):
+                keys.append(key)
+                position = offset if position is None else position
+            offset += count
+        async for chunk in self._read_chunks(keys):
+            for item in json.loads(b'[' + chunk + b']'):
+                if position >= start and (stop is None or position < stop):
+                    yield item
+                position += 1
+
+    def envelope(self, entry: Dict[str, bytes]) -> Dict[str, Any]:
+        """The dataset's fields other than its items, e.g. total or complete; {} for a bare list"""
+        if self.is_chunked(entry):
+            data = json.loads(entry['head'] + entry['tail'])
+        else:
+            data = json.loads(entry['body'])
+        if not isinstance(data, dict):
+            return {}
+        return {field: value for field, value in data.items() if field != 'items'}
+
+    def item_count(self, entry: Dict[str, bytes]) -> int:
+        if self.is_chunked(entry):
+            return int(entry['count'])
+        return len(_items_of(json.loads(entry['body'])) or [])
+
+    async def has_chunks(self, entry: Dict[str, bytes]) -> bool:
+        """Whether every chunk a manifest lists is still in Redis; always True for plain entries"""
+        if not self.is_chunked(entry):
+            return True
+        keys = [key for key, _ in self._chunk_keys(entry)]
+        if await redis_breaker.call(redis_client.exists(*keys)) < len(keys):
+            CACHE_CHUNKS.labels('missing').inc()
+            return False
+        return True
+
+    async def get_entry(
+        self,
+        integration_type: str,
+        credentials: Dict[str, Any],
+        allow_stale: bool = False
+    ) -> Optional[Dict[str, bytes]]:
+        """
+        Retrieve the stored entry (body, etag and compressed variants) without decoding it
+        Returns None if key doesn't exist, or if it has expired unless allow_stale is set
+        """
         try:
             key = self._generate_key(integration_type, credentials)
-            data = await get_value_redis(key)
-            return json.loads(data) if data else None
+            try:
+                entry = await redis_breaker.call(redis_client.hgetall(key))
+            except RedisUnavailable:
+                entry = local_store.get(key)
+                if entry is None or (not allow_stale and self.is_stale(entry)):
+                    return None
+                return entry
+            if not entry:
+                return None
+            entry = {field.decode('utf-8'): value for field, value in entry.items()}
+            if not allow_stale and self.is_stale(entry):
+                return None
+            # A chunk evicted under memory pressure makes the whole entry a miss
+            return entry if await self.has_chunks(entry) else None
         except Exception as e:
-            print(f"Cache get error: {str(e)}")
+            logger.error("Cache get error: %s", e)
             return None
 
-    async def set_data(self, integration_type: str, credentials: Dict[str, Any], data: Any) -> bool:
+    async def set_data(
+        self,
+        integration_type: str,
+        credentials: Dict[str, Any],
+        data: Any,
+        tags: Optional[List[str]] = None
+    ) -> bool:
         """
-        Store data in cache with expiration
+        Store data in cache with expiration, recording the key under each tag
         Returns True if successful, False otherwise
         """
         try:
-            key = self._generate_key(integration_type, credentials)
-            # Add debug logging
-            print(f"Attempting to serialize data: {data}")
-            json_data = json.dumps(data, cls=CustomJSONEncoder)
-            await add_key_value_redis(
-                key=key,
-                value=json_data,
-                expire=self.default_expiration
-            )
-            return True
+            return await self.set_entry(integration_type, credentials, encode_entry(data), tags) is not None
         except Exception as e:
-            print(f"Cache set error: {str(e)}")
-            print(f"Data type: {type(data)}")
-            if isinstance(data, (list, tuple)):
-                print(f"First item type: {type(data[0]) if data else None}")
+            first_item = data[0] if isinstance(data, (list, tuple)) and data else None
+            logger.error("Cache set error: %s (data type: %s, first item type: %s)", e, type(data).__name__, type(first_item).__name__)
             return False
 
+    async def set_entry(
+        self,
+        integration_type: str,
+        credentials: Dict[str, Any],
+        entry: Dict[str, bytes],
+        tags: Optional[List[str]] = None,
+        adapt_ttl: bool = True
+    ) -> Optional[Dict[str, bytes]]:
+        """
+        Store an entry built by encode_entry, replacing the previous one atomically.
+        The entry's TTL adapts to how often the dataset actually changes; pass
+        adapt_ttl=False for pushed updates, which say nothing about the poll rate needed.
+        The dataset version is bumped when items changed and stored in entry['version'].
+        Returns the entry as stored, which for large bodies is the chunk manifest rather
+        than the body, or None if it could not be stored
+        """
+        try:
+            key = self._generate_key(integration_type, credentials)
+            ttl = await self._adapt_ttl(key, integration_type, entry['etag'], adapt=adapt_ttl)
+            data = json.loads(entry['body'])
+            items = _items_of(data)
+            hashes = _item_hashes(items)
+            version, change = await self._next_version(key, hashes)
+            entry['version'] = str(version).encode('utf-8')
+            stored = entry
+            if items and len(entry['body']) >= CACHE_CHUNK_THRESHOLD:
+                stored = await self._write_chunks(key, entry, data, items, ttl)
+            # Encoded the way Redis hands it back, so callers can use it like a read entry
+            stored = {
+                field: value if isinstance(value, bytes) else str(value).encode('utf-8')
+                for field, value in {**stored, 'fresh_until': time.time() + ttl}.items()
+            }
+            # The manifest or body replaces the previous one in a single transaction, so
+            # readers see either the old chunk list or the new one, never a mix
+            async with transaction_pipeline() as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=stored)
+                pipe.expire(key, ttl + CACHE_STALE_SECONDS)
+                pipe.hset(self._stats_key(key), mapping={'etag': entry['etag'], 'ttl': ttl})
+                pipe.expire(self._stats_key(key), CACHE_STATS_EXPIRATION)
+                pipe.hset(self._delta_key(key), mapping={'version': version, 'hashes': json.dumps(hashes)})
+                pipe.expire(self._delta_key(key), CACHE_STATS_EXPIRATION)
+                if change is not None:
+                    pipe.rpush(self._delta_log_key(key), json.dumps(change))
+                    pipe.ltrim(self._delta_log_key(key), -DELTA_HISTORY, -1)
+                    pipe.expire(self._delta_log_key(key), CACHE_STATS_EXPIRATION)
+                for tag in tags or []:
+                    pipe.sadd(self._tag_key(tag), key)
+                    # Tag sets must outlive the longest-lived entry filed under them, stale period included
+                    pipe.expire(self._tag_key(tag), CACHE_MAX_TTL + CACHE_STALE_SECONDS)
+                await redis_breaker.call(pipe.execute())
+            local_store.delete(key)
+            return stored
+        except RedisUnavailable:
+            # Keep caching on this node until Redis is back
+            return self._set_local(key, entry, tags)
+        except Exception as e:
+            logger.error("Cache set error: %s", e)
+            return None
+
+    async def _write_chunks(self, key: str, entry: Dict[str, bytes], data: Any, items: list, ttl: int) -> Dict[str, Any]:
+        """
+        Store a large dataset's items as content-addressed chunks and return the manifest
+        listing them. Chunks already in Redis from an earlier write only get their expiry
+        refreshed, so a refresh writes just the chunks whose items changed.
+        """
+        scope = key.rpartition(':')[2]
+        head, tail, encoded_items = split_items(data, items)
+        chunks = [
+            (hashlib.sha256(chunk).hexdigest()[:32], chunk, count)
+            for chunk, count in chunk_items(encoded_items)
+        ]
+        chunk_ttl = ttl + CACHE_STALE_SECONDS + CACHE_CHUNK_GRACE_SECONDS
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for digest, _, _ in chunks:
+                pipe.expire(self._chunk_key(scope, digest), chunk_ttl)
+            existing = await redis_breaker.call(pipe.execute())
+        # A dict, since a dataset can repeat a chunk
+        missing = list({digest: chunk for (digest, chunk, _), exists in zip(chunks, existing) if not exists}.items())
+        # Small batches keep each round trip from holding Redis up
+        for start in range(0, len(missing), CACHE_CHUNK_BATCH):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for digest, chunk in missing[start:start + CACHE_CHUNK_BATCH]:
+                    pipe.set(self._chunk_key(scope, digest), chunk, ex=chunk_ttl)
+                await redis_breaker.call(pipe.execute())
+        CACHE_CHUNKS.labels('written').inc(len(missing))
+        CACHE_CHUNKS.labels('reused').inc(len(chunks) - len(missing))
+        logger.debug("Stored %s as %s chunks, %s rewritten", key, len(chunks), len(missing))
+
+        return {
+            'etag': entry['etag'],
+            'version': entry['version'],
+            'head': head,
+            'tail': tail,
+            'chunks': json.dumps([[digest, count] for digest, _, count in chunks]),
+            'chunk_scope': scope,
+            'count': len(items),
+            'size': len(entry['body']),
+        }
+
+    def _set_local(self, key: str, entry: Dict[str, bytes], tags: Optional[List[str]]) -> Dict[str, bytes]:
+        """
+        Store an entry in the node-local fallback store, filed under its tags like in Redis,
+        and return it. Without the delta history a changed entry is versioned with the time
+        in milliseconds, which no Redis version counter reaches, so clients never mistake it
+        for a version they hold.
+        """
+        previous = local_store.get(key) or {}
+        if 'version' in previous and previous.get('etag') == entry['etag']:
+            version = previous['version']
+        else:
+            version = str(int(time.time() * 1000)).encode('utf-8')
+        entry = {
+            **entry,
+            'version': version,
+            'fresh_until': str(time.time() + self.default_expiration).encode('utf-8'),
+        }
+        local_store.set(key, entry, self.default_expiration + CACHE_STALE_SECONDS)
+        for tag in tags or []:
+            keys = local_store.get(self._tag_key(tag)) or set()
+            keys.add(key)
+            local_store.set(self._tag_key(tag), keys, CACHE_MAX_TTL + CACHE_STALE_SECONDS)
+        return entry
+
     async def delete_data(self, integration_type: str, credentials: Dict[str, Any]) -> bool:
         """
         Delete data from cache
@@ -72,10 +555,81 @@ class Cache:
             await delete_key_redis(key)
             return True
         except Exception as e:
-            print(f"Cache delete error: {str(e)}")
+            logger.error("Cache delete error: %s", e)
+            return False
+
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        """
+        Delete every entry filed under any of the tags, along with the tag sets themselves.
+        Returns the number of entries evicted, or -1 on error.
+        """
+        try:
+            tag_keys = [self._tag_key(tag) for tag in tags]
+            # Entries cached locally during an outage are evicted too
+            local_keys = set().union(*(local_store.get(tag_key) or set() for tag_key in tag_keys))
+            try:
+                # One SMEMBERS per tag rather than SUNION, since tags of different tenants
+                # live in different cluster slots
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for tag_key in tag_keys:
+                        pipe.smembers(tag_key)
+                    members = await redis_breaker.call(pipe.execute())
+            except RedisUnavailable:
+                members = []
+            keys = {key.decode('utf-8') for tag_members in members for key in tag_members} | local_keys
+            await delete_keys_redis(list(keys) + tag_keys)
+            return len(keys)
+        except Exception as e:
+            logger.error("Cache invalidate error: %s", e)
+            return -1
+
+class SchemaCache:
+    """
+    Long-lived cache for provider schemas that rarely change (e.g. Airtable bases and tables).
+    Entries are keyed by object id, live much longer than the data cache and are
+    only dropped on explicit invalidation or when a change check fails.
+    """
+    def __init__(self, namespace: str, expiration: timedelta = timedelta(days=7)):
+        self.namespace = namespace
+        self.expiration = int(expiration.total_seconds())
+
+    def _generate_key(self, object_id: str) -> str:
+        return f"schema:{self.namespace}:{object_id}"
+
+    async def get_many(self, object_ids: List[str]) -> Dict[str, Any]:
+        """Fetch cached schemas in one round trip; missing ids are left out"""
+        try:
+            values = await get_values_redis([self._generate_key(object_id) for object_id in object_ids])
+            return {
+                object_id: json.loads(value)
+                for object_id, value in zip(object_ids, values)
+                if value
+            }
+        except Exception as e:
+            logger.error("Schema cache get error: %s", e)
+            return {}
+
+    async def set(self, object_id: str, schema: Any) -> bool:
+        try:
+            await add_key_value_redis(
+                key=self._generate_key(object_id),
+                value=json.dumps(schema),
+                expire=self.expiration
+            )
+            return True
+        except Exception as e:
+            logger.error("Schema cache set error: %s", e)
+            return False
+
+    async def invalidate(self, object_ids: List[str]) -> bool:
+        try:
+            await delete_keys_redis([self._generate_key(object_id) for object_id in object_ids])
+            return True
+        except Exception as e:
+            logger.error("Schema cache delete error: %s", e)
             return False
 
 # Create a global cache instance
 cache = Cache()
 
-__all__ = ['cache'] 
\ No newline at end of file
+__all__ = ['cache', 'SchemaCache', 'CacheChunkMissing', 'encode_entry', 'merge_changes'] 
\ No newline at end of file
@@ -0,0 +1,93 @@
+import json
+import secrets
+from typing import Dict, Optional
+from cachetools import TTLCache
+from fastapi import HTTPException
+from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+
+# Per-worker cache of resolved credentials; kept short so disconnects propagate quickly
+LOCAL_CACHE_TTL_SECONDS = 60
+LOCAL_CACHE_SIZE = 1024
+
+# Token fields that are safe to show the browser; tokens themselves never leave the server
+PUBLIC_CREDENTIAL_FIELDS = ('token_type', 'scope', 'expires_in', 'workspace_id', 'workspace_name', 'workspace_icon', 'bot_id')
+
+
+class CredentialStore:
+    """
+    Keeps integration credentials server-side, keyed by org/user/integration.
+    Clients reference them with an opaque handle instead of posting tokens on every load.
+    """
+    def __init__(self):
+        self._local = TTLCache(maxsize=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL_SECONDS)
+
+    def _credentials_key(self, integration: str, org_id: str, user_id: str) -> str:
+        return f'{integration}_credentials:{org_id}:{user_id}'
+
+    def _handle_key(self, integration: str, org_id: str, user_id: str) -> str:
+        return f'{integration}_handle:{org_id}:{user_id}'
+
+    async def save(self, integration: str, org_id: str, user_id: str, credentials: Dict) -> str:
+        """Store credentials for a tenant and return the handle that references them"""
+        integration = integration.lower()
+        handle = await get_value_redis(self._handle_key(integration, org_id, user_id))
+        handle = handle.decode() if isinstance(handle, bytes) else handle
+        if not handle:
+            handle = secrets.token_urlsafe(24)
+            await add_key_value_redis(self._handle_key(integration, org_id, user_id), handle)
+            await add_key_value_redis(
+                f'credential_handle:{handle}',
+                json.dumps({'integration': integration, 'org_id': org_id, 'user_id': user_id})
+            )
+        await add_key_value_redis(self._credentials_key(integration, org_id, user_id), json.dumps(credentials))
+        self._local.pop(handle, None)
+        return handle
+
+    async def get_handle(self, integration: str, org_id: str, user_id: str) -> Optional[str]:
+        handle = await get_value_redis(self._handle_key(integration.lower(), org_id, user_id))
+        return handle.decode() if isinstance(handle, bytes) else handle
+
+    def describe(self, credentials: Dict, handle: str) -> Dict:
+        """What the browser gets for a connection: the handle plus non-secret token metadata"""
+        return {
+            **{field: credentials[field] for field in PUBLIC_CREDENTIAL_FIELDS if field in credentials},
+            'handle': handle,
+        }
+
+    async def resolve(self, handle: str) -> Dict:
+        """
+        Return the credentials a handle references, tagged with integration, org_id and user_id.
+        Raises a 401 if the handle is unknown or the tenant has disconnected.
+        """
+        if handle in self._local:
+            return self._local[handle]
+
+        tenant = await get_value_redis(f'credential_handle:{handle}')
+        if not tenant:
+            raise HTTPException(status_code=401, detail='Unknown credentials handle.')
+        tenant = json.loads(tenant)
+
+        credentials = await get_value_redis(
+            self._credentials_key(tenant['integration'], tenant['org_id'], tenant['user_id'])
+        )
+        if not credentials:
+            raise HTTPException(status_code=401, detail='No credentials found, please re-authorize.')
+
+        resolved = {**json.loads(credentials), **tenant}
+        self._local[handle] = resolved
+        return resolved
+
+    async def delete(self, integration: str, org_id: str, user_id: str):
+        """Forget a tenant's credentials and handle"""
+        integration = integration.lower()
+        handle = await self.get_handle(integration, org_id, user_id)
+        if handle:
+            await delete_key_redis(f'credential_handle:{handle}')
+            self._local.pop(handle, None)
+        await delete_key_redis(self._handle_key(integration, org_id, user_id))
+        await delete_key_redis(self._credentials_key(integration, org_id, user_id))
+
+
+credential_store = CredentialStore()
+
+__all__ = ['credential_store', 'CredentialStore']
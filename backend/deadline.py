@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Awaitable, Optional
+
+# Server default when the client does not send a deadline
+DEFAULT_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '25'))
+MAX_DEADLINE_SECONDS = float(os.getenv('MAX_REQUEST_DEADLINE_SECONDS', '120'))
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the awaited work finished"""
+
+
+class PartialResult(Exception):
+    """
+    Raised by a fetcher whose deadline expired after it had collected some items.
+    `data` has the same shape as a complete result; `cursor` resumes the crawl.
+    """
+    def __init__(self, data: Any, cursor: Optional[str]):
+        super().__init__('Deadline exceeded, returning partial result')
+        self.data = data
+        self.cursor = cursor
+
+
+def set_deadline(seconds: Optional[float] = None) -> contextvars.Token:
+    """Start the deadline for the current request; returns a token for reset_deadline"""
+    seconds = DEFAULT_DEADLINE_SECONDS if seconds is None else min(seconds, MAX_DEADLINE_SECONDS)
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None when no deadline is set (e.g. background jobs)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def within_deadline(awaitable: Awaitable) -> Any:
+    """
+    Await with the remaining budget as a timeout. The awaited work is cancelled when the
+    deadline passes, and DeadlineExceeded is raised in its place.
+    """
+    budget = remaining()
+    if budget is None:
+        return await awaitable
+    if budget <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded()
+
+
+__all__ = [
+    'DeadlineExceeded',
+    'PartialResult',
+    'set_deadline',
+    'reset_deadline',
+    'remaining',
+    'within_deadline',
+]
@@ -0,0 +1,149 @@
+import io
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+from integrations.json_stream import JsonRecordStream, CHUNK_SIZE
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # exports are unavailable without pyarrow; everything else works
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Items converted into one record batch (and one Parquet row group)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def flatten_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One export row per item, laid out like the table in the UI: provider properties
+    become top-level columns, children are dropped and other nested values are JSON.
+    """
+    row = {key: value for key, value in item.items() if key not in ('children', 'properties')}
+    row.update(item.get('properties') or {})
+    return {
+        key: json.dumps(value) if isinstance(value, (dict, list)) else value
+        for key, value in row.items()
+    }
+
+
+async def _body_chunks(body: bytes) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+async def iter_cached_items(body: bytes) -> AsyncIterator[Dict[str, Any]]:
+    """Items of a cached JSON body, parsed one at a time; bodies are a list or {'items': [...]}"""
+    array_key = None if body.lstrip()[:1] == b'[' else 'items'
+    async for item in JsonRecordStream(_body_chunks(body), array_key):
+        yield item
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet footers record absolute offsets, so this must count drained bytes too
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def _infer_schema(rows: List[Dict[str, Any]], fields: Optional[List[str]]) -> 'pa.Schema':
+    """Columns come from `fields` or the first batch; types are inferred, all-null columns are strings"""
+    if not fields:
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+    columns = []
+    for name in fields:
+        try:
+            column_type = pa.array([row.get(name) for row in rows]).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            column_type = pa.string()
+        columns.append(pa.field(name, pa.string() if pa.types.is_null(column_type) else column_type))
+    return pa.schema(columns)
+
+
+def _to_batch(rows: List[Dict[str, Any]], schema: 'pa.Schema') -> 'pa.RecordBatch':
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if pa.types.is_string(field.type):
+                arrays.append(pa.array([None if value is None else str(value) for value in values], type=field.type))
+            else:
+                # The column's type was fixed by the first batch; values that do not fit are dropped
+                logger.warning("Export column %s has values that are not %s, writing nulls", field.name, field.type)
+                arrays.append(pa.array([None] * len(values), type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_writer(export_format: str, sink: _ChunkSink, schema: 'pa.Schema'):
+    if export_format == 'parquet':
+        return pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='snappy')
+    return pa_csv.CSVWriter(pa.PythonFile(sink, mode='w'), schema)
+
+
+async def export_items(
+    items: AsyncIterator[Dict[str, Any]],
+    export_format: str,
+    fields: Optional[List[str]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Convert items to CSV or Parquet in batches of EXPORT_BATCH_SIZE, yielding bytes as
+    each batch is written. Only one batch of rows is held in memory at a time.
+    """
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    rows: List[Dict[str, Any]] = []
+
+    def write(rows: List[Dict[str, Any]]) -> bytes:
+        nonlocal writer, schema
+        if writer is None:
+            schema = _infer_schema(rows, fields)
+            writer = _open_writer(export_format, sink, schema)
+        batch = _to_batch(rows, schema)
+        if export_format == 'parquet':
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        return sink.drain()
+
+    async for item in items:
+        rows.append(flatten_item(item))
+        if len(rows) >= EXPORT_BATCH_SIZE:
+            yield write(rows)
+            rows = []
+
+    if rows or writer is None:
+        yield write(rows)
+    writer.close()
+    yield sink.drain()
+
+
+__all__ = ['EXPORT_FORMATS', 'export_items', 'iter_cached_items', 'flatten_item']
@@ -0,0 +1,61 @@
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import aiohttp
+import httpx
+
+# Outbound connections per worker, per client library
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+
+
+class HttpPools:
+    """
+    Provider connection pools shared by every load on a worker, so TLS connections to a
+    provider are reused across loads instead of being set up per load. The pools are
+    opened and closed by the application lifespan; outside it (scripts, one-off calls)
+    each use gets a short-lived client of its own.
+    """
+    def __init__(self):
+        self._httpx = None
+        self._aiohttp = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._httpx is not None and not self._httpx.is_closed and not self._aiohttp.closed
+
+    async def open(self):
+        self._httpx = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ))
+        self._aiohttp = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=HTTP_MAX_CONNECTIONS))
+
+    async def close(self):
+        if self._httpx is not None:
+            await self._httpx.aclose()
+            self._httpx = None
+        if self._aiohttp is not None:
+            await self._aiohttp.close()
+            self._aiohttp = None
+
+    @asynccontextmanager
+    async def httpx_client(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._httpx is not None:
+            yield self._httpx
+            return
+        async with httpx.AsyncClient() as client:
+            yield client
+
+    @asynccontextmanager
+    async def aiohttp_session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        if self._aiohttp is not None:
+            yield self._aiohttp
+            return
+        async with aiohttp.ClientSession() as session:
+            yield session
+
+
+http_pools = HttpPools()
+
+__all__ = ['http_pools', 'HttpPools']
@@ -5,22 +5,31 @@ from fastapi.responses import HTMLResponse
 import httpx
 import asyncio
 import base64
-from integrations.integration_item import IntegrationItem
 from datetime import datetime, timezone
-import aiohttp
+import logging
 import os
-from dotenv import load_dotenv
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional
 
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from token_manager import token_manager, TokenRevoked
+from jobs import report_progress
+from webhooks import register_webhook_tenant
+from deadline import DeadlineExceeded, PartialResult, within_deadline
+from scheduler import scheduler
+from usage import usage_meter
+from http_pool import http_pools
+from log import payload
+from integrations.json_stream import JsonRecordStream, CHUNK_SIZE
+from integrations.rate_limit import RateLimiter
+from integrations.request_policy import RequestPolicy, TransientError, TRANSIENT_STATUSES, retry_after_seconds
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()  # Add router
 
-load_dotenv()  # Load environment variables
-
 CLIENT_ID = os.getenv('HUBSPOT_CLIENT_ID')
 CLIENT_SECRET = os.getenv('HUBSPOT_CLIENT_SECRET')
-if not CLIENT_ID or not CLIENT_SECRET:
-    raise ValueError("HUBSPOT_CLIENT_ID and HUBSPOT_CLIENT_SECRET must be set in environment variables")
 
 encoded_client_id_secret = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
 REDIRECT_URI = 'http://localhost:8000/integrations/hubspot/oauth2callback'
@@ -32,8 +41,11 @@ AUTHORIZATION_URL = (
     '&scope=oauth'  # Updated to match your HubSpot app configuration
 )
 
+def require_client_credentials():
+    """The OAuth flow needs the app credentials; loading with stored tokens does not"""
+    if not CLIENT_ID or not CLIENT_SECRET:
+        raise ValueError("HUBSPOT_CLIENT_ID and HUBSPOT_CLIENT_SECRET must be set in environment variables")
 
-print(f"Check - AUTHORIZATION_URL: {AUTHORIZATION_URL}")
 # Add router endpoints
 @router.post("/disconnect/hubspot")
 async def disconnect_hubspot(request: Request):
@@ -48,13 +60,14 @@ async def disconnect_hubspot(request: Request):
         await delete_key_redis(f'hubspot_credentials:{org_id}:{user_id}')
         await delete_key_redis(f'hubspot_connection:{org_id}:{user_id}')
         
-        print(f"✅ Successfully disconnected Hubspot for user {user_id} in org {org_id}")
+        logger.info("✅ Successfully disconnected Hubspot for user %s in org %s", user_id, org_id)
         return {"status": "success", "message": "Disconnected successfully"}
     except Exception as e:
-        print(f"❌ Error disconnecting Hubspot: {str(e)}")
+        logger.error("❌ Error disconnecting Hubspot: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 async def authorize_hubspot(user_id, org_id):
+    require_client_credentials()
     state_data = {
         'state': secrets.token_urlsafe(32),
         'user_id': user_id,
@@ -64,12 +77,12 @@ async def authorize_hubspot(user_id, org_id):
     await add_key_value_redis(f'hubspot_state:{org_id}:{user_id}', encoded_state, expire=600)
     
     auth_url = f'{AUTHORIZATION_URL}&state={encoded_state}'
-    print(f"🔄 HubSpot OAuth: Redirecting to {auth_url}")
+    logger.info("🔄 HubSpot OAuth: Redirecting user %s, org %s to authorize", user_id, org_id)
     return auth_url
 
 async def oauth2callback_hubspot(request: Request):
     if request.query_params.get('error'):
-        print(f"❌ HubSpot OAuth Error: {request.query_params.get('error')}")
+        logger.warning("❌ HubSpot OAuth Error: %s", request.query_params.get('error'))
         raise HTTPException(status_code=400, detail=request.query_params.get('error'))
     
     code = request.query_params.get('code')
@@ -80,12 +93,12 @@ async def oauth2callback_hubspot(request: Request):
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
 
-    print(f"✅ HubSpot OAuth: Received code for user {user_id}, org {org_id}")
+    logger.info("✅ HubSpot OAuth: Received code for user %s, org %s", user_id, org_id)
 
     saved_state = await get_value_redis(f'hubspot_state:{org_id}:{user_id}')
 
     if not saved_state or original_state != json.loads(saved_state).get('state'):
-        print("❌ HubSpot OAuth: State mismatch error")
+        logger.warning("❌ HubSpot OAuth: State mismatch error")
         raise HTTPException(status_code=400, detail='State does not match.')
 
     async with httpx.AsyncClient() as client:
@@ -104,7 +117,7 @@ async def oauth2callback_hubspot(request: Request):
         )
 
     if response.status_code == 200:
-        print("✅ HubSpot OAuth: Successfully obtained access token")
+        logger.info("✅ HubSpot OAuth: Successfully obtained access token")
         token_data = response.json()
         
         # Get current time in ISO format
@@ -113,8 +126,7 @@ async def oauth2callback_hubspot(request: Request):
         connection_info = {
             'integration': 'hubspot',
             'connected_at': current_time,
-            'connected': True,
-            'credentials': token_data
+            'connected': True
         }
 
         # Store both credentials and connection info
@@ -128,6 +140,15 @@ async def oauth2callback_hubspot(request: Request):
             json.dumps(connection_info)
         )
 
+        # Keep the refresh token server-side so loads never die on expiry
+        await token_manager.store_tokens('hubspot', org_id, user_id, token_data)
+
+        # Route CRM webhook events for this portal to the tenant's cache
+        async with httpx.AsyncClient() as client:
+            token_info = await client.get(f"https://api.hubapi.com/oauth/v1/access-tokens/{token_data.get('access_token')}")
+        if token_info.status_code == 200 and token_info.json().get('hub_id'):
+            await register_webhook_tenant('hubspot', token_info.json()['hub_id'], org_id, user_id)
+
         close_window_script = """
         <html>
             <body>
@@ -141,8 +162,7 @@ async def oauth2callback_hubspot(request: Request):
         """
         return HTMLResponse(content=close_window_script)
     else:
-        print(f"❌ HubSpot OAuth: Token exchange failed with status {response.status_code}")
-        print(f"Response: {response.text}")
+        logger.error("❌ HubSpot OAuth: Token exchange failed with status %s: %s", response.status_code, payload(response.text))
         
         error_script = """
         <html>
@@ -168,98 +188,439 @@ async def get_hubspot_credentials(user_id, org_id):
 
     return credentials
 
-async def get_items_hubspot(credentials: str, api_type: str):
-    """Get items from HubSpot based on API type"""
+async def refresh_hubspot_token(refresh_token: str) -> dict:
+    """Exchange a refresh token for a new HubSpot access token"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            'https://api.hubapi.com/oauth/v1/token',
+            data={
+                'grant_type': 'refresh_token',
+                'client_id': CLIENT_ID,
+                'client_secret': CLIENT_SECRET,
+                'refresh_token': refresh_token
+            }
+        )
+    # HubSpot reports a revoked or unknown refresh token as BAD_REFRESH_TOKEN
+    if response.status_code == 400 and ('invalid_grant' in response.text or 'BAD_REFRESH_TOKEN' in response.text):
+        raise TokenRevoked('HubSpot refresh token was revoked, please re-authorize.')
+    if response.status_code != 200:
+        logger.error("❌ HubSpot token refresh failed with status %s", response.status_code)
+        raise HTTPException(status_code=401, detail=f"HubSpot token refresh failed: {response.text}")
+    return response.json()
+
+# Upper bound on pages fetched per load (100 items per page)
+HUBSPOT_MAX_PAGES = int(os.getenv('HUBSPOT_MAX_PAGES', '100'))
+
+# CRM object types served, with the properties fetched for full loads
+HUBSPOT_OBJECTS = {
+    "contacts": {
+        "endpoint": "/crm/v3/objects/contacts",
+        "properties": ["firstname", "lastname", "email", "phone"]
+    },
+    "companies": {
+        "endpoint": "/crm/v3/objects/companies",
+        "properties": ["name", "domain", "industry"]
+    },
+    "deals": {
+        "endpoint": "/crm/v3/objects/deals",
+        "properties": ["dealname", "amount", "dealstage"]
+    },
+    "tickets": {
+        "endpoint": "/crm/v3/objects/tickets",
+        "properties": ["subject", "content", "status"]
+    }
+}
+# Returned for every object whatever properties are asked for
+HUBSPOT_DEFAULT_PROPERTIES = ("hs_object_id", "createdate", "lastmodifieddate")
+
+# Other API calls are limited per account: 100 requests per 10 seconds for OAuth apps
+HUBSPOT_REQUESTS_PER_TEN_SECONDS = 100
+HUBSPOT_RATE_LIMIT_BACKOFF = 10
+# The Search API has its own, lower limit: 5 requests per second per token
+HUBSPOT_SEARCH_REQUESTS_PER_SECOND = 5
+HUBSPOT_SEARCH_RATE_LIMIT_BACKOFF = 10
+HUBSPOT_SEARCH_PAGE_SIZE = 200
+# Search cannot page past this many results; larger result sets need a full load
+HUBSPOT_SEARCH_MAX_RESULTS = 10000
+HUBSPOT_SEARCH_MAX_FILTER_GROUPS = 5
+HUBSPOT_SEARCH_MAX_FILTERS = 18
+HUBSPOT_SEARCH_OPERATORS = frozenset({
+    'EQ', 'NEQ', 'LT', 'LTE', 'GT', 'GTE', 'BETWEEN', 'IN', 'NOT_IN',
+    'HAS_PROPERTY', 'NOT_HAS_PROPERTY', 'CONTAINS_TOKEN', 'NOT_CONTAINS_TOKEN',
+})
+
+crm_rate_limiter = RateLimiter(HUBSPOT_REQUESTS_PER_TEN_SECONDS, 10.0)
+hubspot_crm_policy = RequestPolicy('hubspot_crm', crm_rate_limiter, HUBSPOT_RATE_LIMIT_BACKOFF)
+search_rate_limiter = RateLimiter(HUBSPOT_SEARCH_REQUESTS_PER_SECOND, 1.0)
+# Searches are POSTs but only read, so they are retried and hedged like other reads
+hubspot_search_policy = RequestPolicy('hubspot_search', search_rate_limiter, HUBSPOT_SEARCH_RATE_LIMIT_BACKOFF)
+
+async def fetch_hubspot_page(
+    session,
+    url: str,
+    params: dict,
+    get_access_token,
+    can_refresh: bool,
+    search: Optional[dict] = None,
+    rate_key: str = 'default'
+):
+    """
+    Fetch one page of CRM objects. The body is parsed incrementally, so the raw page
+    is never held alongside its records, but the page's records are collected and
+    returned together: retries and hedging replay whole pages, and the outbound slot
+    is released before the caller sees them. With `search`, the page is fetched by
+    POSTing it as a Search API request to `url`.
+    An expired token is refreshed once instead of failing the load; rate limits and
+    provider errors are retried, and slow pages hedged, by the endpoint's policy.
+    Returns (records, envelope) where envelope holds the paging cursor.
+    """
+    endpoint = 'crm_search' if search is not None else 'crm_objects'
+
+    async def attempt():
+        for force_refresh in (False, True):
+            headers = {
+                "Authorization": f"Bearer {await get_access_token(force_refresh)}",
+                "Content-Type": "application/json"
+            }
+            if search is not None:
+                request = session.post(url, headers=headers, json=search)
+            else:
+                request = session.get(url, headers=headers, params=params)
+            async with scheduler.slot(), request as response:
+                if response.status == 401 and not force_refresh and can_refresh:
+                    usage_meter.record('hubspot', endpoint, response.status)
+                    continue
+                if response.status != 200:
+                    error_text = await response.text()
+                    usage_meter.record('hubspot', endpoint, response.status, len(error_text.encode('utf-8')))
+                    logger.warning("❌ HubSpot API error %s: %s", response.status, payload(error_text))
+                    if response.status in TRANSIENT_STATUSES:
+                        raise TransientError(
+                            response.status,
+                            f"HubSpot API error: {error_text}",
+                            retry_after_seconds(response.headers)
+                        )
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"HubSpot API error: {error_text}"
+                    )
+                stream = JsonRecordStream(response.content.iter_chunked(CHUNK_SIZE), 'results')
+                records = [record async for record in stream]
+                usage_meter.record('hubspot', endpoint, response.status, stream.bytes_read)
+                if not stream.found:
+                    logger.error("⚠️ Unexpected HubSpot response format: %s", payload(stream.envelope))
+                    raise HTTPException(
+                        status_code=500,
+                        detail="Invalid response format from HubSpot"
+                    )
+                return records, stream.envelope
+
+    if search is not None:
+        return await hubspot_search_policy.run(attempt, rate_key=rate_key)
+    return await hubspot_crm_policy.run(attempt, rate_key=rate_key)
+
+def hubspot_token_getter(creds: dict):
+    """Access token source for a load: the token manager for stored tenants, else the inline token"""
+    org_id = creds.get('org_id')
+    user_id = creds.get('user_id')
+
+    async def get_access_token(force_refresh: bool = False):
+        # Tenants with server-side tokens always get a valid token from the token manager
+        if org_id and user_id:
+            if force_refresh:
+                return await token_manager.refresh('hubspot', org_id, user_id, force=True)
+            return await token_manager.get_access_token('hubspot', org_id, user_id)
+        return creds.get('access_token')
+
+    return get_access_token
+
+def hubspot_rate_key(creds: dict) -> str:
+    """Rate limits apply per connected account; inline tokens share one budget"""
+    return f"{creds.get('org_id')}:{creds.get('user_id')}" if creds.get('org_id') else 'default'
+
+async def get_items_hubspot(credentials: str, api_type: str, cursor: str = None):
+    """
+    Get items from HubSpot based on API type, starting after `cursor` if given.
+    Raises PartialResult with the items collected so far if the request deadline passes.
+    """
     try:
         creds = json.loads(credentials)
-        access_token = creds.get('access_token')
-        
-        if not access_token:
+        org_id = creds.get('org_id')
+        user_id = creds.get('user_id')
+        get_access_token = hubspot_token_getter(creds)
+
+        if not await get_access_token():
             raise ValueError("Access token is required")
 
         base_url = "https://api.hubapi.com"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
 
-        # Map API types to their endpoints and properties
-        api_config = {
-            "contacts": {
-                "endpoint": "/crm/v3/objects/contacts",
-                "properties": ["firstname", "lastname", "email", "phone"]
-            },
-            "companies": {
-                "endpoint": "/crm/v3/objects/companies",
-                "properties": ["name", "domain", "industry"]
-            },
-            "deals": {
-                "endpoint": "/crm/v3/objects/deals",
-                "properties": ["dealname", "amount", "dealstage"]
-            },
-            "tickets": {
-                "endpoint": "/crm/v3/objects/tickets",
-                "properties": ["subject", "content", "status"]
-            }
-        }
-
-        if api_type not in api_config:
+        if api_type not in HUBSPOT_OBJECTS:
             raise ValueError(f"Invalid API type: {api_type}")
 
-        config = api_config[api_type]
+        config = HUBSPOT_OBJECTS[api_type]
         params = {
             'limit': 100,
-            'properties': config['properties']
+            'properties': ','.join(config['properties'])
         }
-
-        print(f"🔄 Fetching HubSpot {api_type} with params: {params}")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{base_url}{config['endpoint']}", 
-                headers=headers,
-                params=params
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    print(f"❌ HubSpot API error: {error_text}")
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail=f"HubSpot API error: {error_text}"
-                    )
-                
-                data = await response.json()
-                
-                if not data or 'results' not in data:
-                    print(f"⚠️ Unexpected HubSpot response format: {data}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Invalid response format from HubSpot"
+        if cursor:
+            params['after'] = cursor
+
+        logger.debug("🔄 Fetching HubSpot %s with params: %s", api_type, payload(params))
+
+        results = []
+        # Whether every object was fetched; false when HUBSPOT_MAX_PAGES cut the load short
+        complete = False
+        async with http_pools.aiohttp_session() as session:
+            for _ in range(HUBSPOT_MAX_PAGES):
+                try:
+                    page, envelope = await within_deadline(fetch_hubspot_page(
+                        session,
+                        f"{base_url}{config['endpoint']}",
+                        params,
+                        get_access_token,
+                        can_refresh=bool(org_id and user_id),
+                        rate_key=hubspot_rate_key(creds)
+                    ))
+                except DeadlineExceeded:
+                    # Only whole pages are kept, so the cursor resumes exactly where they end
+                    logger.info("⏱️ Deadline exceeded after %d HubSpot %s", len(results), api_type)
+                    raise PartialResult(
+                        {'items': results, 'total': len(results), 'type': api_type},
+                        params.get('after')
                     )
 
-                print(f"✅ Successfully fetched {len(data['results'])} {api_type} from HubSpot")
-                return {
-                    'items': data['results'],
-                    'total': data.get('total', len(data['results'])),
-                    'type': api_type
-                }
+                results.extend(page)
+                report_progress(pages=1, items=len(page))
+                after = envelope.get('paging', {}).get('next', {}).get('after')
+                if not after:
+                    # A load resumed from a cursor only holds the objects after it
+                    complete = cursor is None
+                    break
+                params['after'] = after
+
+        if not complete and not cursor:
+            logger.warning("⚠️ HubSpot %s load stopped at %d pages (%d objects)", api_type, HUBSPOT_MAX_PAGES, len(results))
+        logger.info("✅ Successfully fetched %d %s from HubSpot", len(results), api_type)
+        return {
+            'items': results,
+            'total': len(results),
+            'type': api_type,
+            'complete': complete
+        }
 
+    except PartialResult:
+        raise
     except json.JSONDecodeError as e:
-        print(f"❌ Invalid credentials format: {str(e)}")
+        logger.error("❌ Invalid credentials format: %s", e)
         raise ValueError(f"Invalid credentials format: {str(e)}")
     except Exception as e:
-        print(f"❌ Error in get_items_hubspot: {str(e)}")
+        logger.error("❌ Error in get_items_hubspot: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to fetch {api_type} from HubSpot: {str(e)}"
         )
 
+def build_search_request(
+    filter_groups: List[List[Dict[str, Any]]],
+    sorts: Optional[List[Dict[str, str]]],
+    properties: List[str],
+    limit: int
+) -> dict:
+    """
+    Translate filters into a Search API request body. Filters within a group are ANDed
+    and groups are ORed. Each filter is {'property', 'operator', 'value' | 'values' |
+    'high_value'} with HubSpot's operators; sorts are {'property', 'direction'}.
+    """
+    if len(filter_groups) > HUBSPOT_SEARCH_MAX_FILTER_GROUPS:
+        raise HTTPException(status_code=400, detail=f"At most {HUBSPOT_SEARCH_MAX_FILTER_GROUPS} filter groups are supported")
+    if sum(len(group) for group in filter_groups) > HUBSPOT_SEARCH_MAX_FILTERS:
+        raise HTTPException(status_code=400, detail=f"At most {HUBSPOT_SEARCH_MAX_FILTERS} filters are supported")
+
+    groups = []
+    for group in filter_groups:
+        filters = []
+        for search_filter in group:
+            operator = str(search_filter.get('operator', 'EQ')).upper()
+            if operator not in HUBSPOT_SEARCH_OPERATORS:
+                raise HTTPException(status_code=400, detail=f"Unsupported HubSpot filter operator: {operator}")
+            translated = {'propertyName': search_filter['property'], 'operator': operator}
+            if search_filter.get('values') is not None:
+                translated['values'] = [str(value) for value in search_filter['values']]
+            if search_filter.get('value') is not None:
+                translated['value'] = str(search_filter['value'])
+            if search_filter.get('high_value') is not None:
+                translated['highValue'] = str(search_filter['high_value'])
+            filters.append(translated)
+        groups.append({'filters': filters})
+
+    return {
+        'filterGroups': groups,
+        'sorts': [
+            {'propertyName': sort['property'], 'direction': str(sort.get('direction', 'ASCENDING')).upper()}
+            for sort in sorts or []
+        ],
+        'properties': properties,
+        'limit': min(limit, HUBSPOT_SEARCH_PAGE_SIZE),
+    }
+
+def search_properties(api_type: str, properties: Optional[List[str]]) -> List[str]:
+    if api_type not in HUBSPOT_OBJECTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported HubSpot API type: {api_type}")
+    return list(properties) if properties else list(HUBSPOT_OBJECTS[api_type]['properties'])
+
+async def search_items_hubspot(
+    credentials,
+    api_type: str,
+    filter_groups: List[List[Dict[str, Any]]],
+    sorts: Optional[List[Dict[str, str]]] = None,
+    properties: Optional[List[str]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> dict:
+    """
+    Objects of one type matching the filters, fetched through the Search API a page at
+    a time until `limit` are collected. The returned cursor resumes after the last one.
+    """
+    creds = json.loads(credentials) if isinstance(credentials, str) else credentials
+    get_access_token = hubspot_token_getter(creds)
+    if not await get_access_token():
+        raise HTTPException(status_code=400, detail="Access token is required")
+    properties = search_properties(api_type, properties)
+    request = build_search_request(filter_groups, sorts, properties, limit)
+    url = f"https://api.hubapi.com{HUBSPOT_OBJECTS[api_type]['endpoint']}/search"
+    rate_key = hubspot_rate_key(creds)
+
+    results, total, after = [], None, cursor
+    async with http_pools.aiohttp_session() as session:
+        while len(results) < limit:
+            page_request = {**request, 'limit': min(request['limit'], limit - len(results))}
+            if after:
+                page_request['after'] = after
+            page, envelope = await fetch_hubspot_page(
+                session, url, None, get_access_token,
+                can_refresh=bool(creds.get('org_id') and creds.get('user_id')),
+                search=page_request,
+                rate_key=rate_key
+            )
+            results.extend(page)
+            report_progress(pages=1, items=len(page))
+            total = envelope.get('total', total)
+            after = envelope.get('paging', {}).get('next', {}).get('after')
+            if not after or not page or (after.isdigit() and int(after) >= HUBSPOT_SEARCH_MAX_RESULTS):
+                after = None
+                break
+
+    logger.info("🔎 HubSpot %s search returned %d of %s", api_type, len(results), total)
+    return {'items': results, 'total': total, 'type': api_type, 'cursor': after}
+
+def _as_number(raw: Any) -> Optional[float]:
+    """Numeric value of a property; ISO dates become epoch milliseconds, as HubSpot's date filters use"""
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(raw).replace('Z', '+00:00')).timestamp() * 1000
+    except ValueError:
+        return None
+
+def _comparable(value: Any, other: Any) -> tuple:
+    """
+    Make an item's property value and a filter value comparable the way HubSpot compares
+    them: as numbers when both are numeric, otherwise as case-insensitive strings.
+    """
+    numbers = _as_number(value), _as_number(other)
+    if None not in numbers:
+        return numbers
+    return str(value).casefold(), str(other).casefold()
+
+def _sort_key(value: Any) -> tuple:
+    number = _as_number(value)
+    return (0, number, '') if number is not None else (1, 0, str(value).casefold())
+
+def snapshot_filter_matches(item: dict, search_filter: Dict[str, Any]) -> bool:
+    value = (item.get('properties') or {}).get(search_filter['property'])
+    operator = str(search_filter.get('operator', 'EQ')).upper()
+    present = value not in (None, '')
+    if operator in ('HAS_PROPERTY', 'NOT_HAS_PROPERTY'):
+        return present == (operator == 'HAS_PROPERTY')
+    if operator in ('IN', 'NOT_IN'):
+        found = present and any(
+            item_value == filter_value
+            for item_value, filter_value in (_comparable(value, other) for other in search_filter.get('values') or [])
+        )
+        return found == (operator == 'IN')
+    if operator in ('CONTAINS_TOKEN', 'NOT_CONTAINS_TOKEN'):
+        token = str(search_filter.get('value', '')).casefold()
+        words = str(value or '').casefold().split()
+        found = any(fnmatch(word, token) for word in words) if '*' in token else token in words
+        return found == (operator == 'CONTAINS_TOKEN')
+    if not present:
+        return operator == 'NEQ'
+    item_value, filter_value = _comparable(value, search_filter.get('value'))
+    if operator == 'BETWEEN':
+        item_high_value, high_value = _comparable(value, search_filter.get('high_value'))
+        return filter_value <= item_value and item_high_value <= high_value
+    return {
+        'EQ': item_value == filter_value,
+        'NEQ': item_value != filter_value,
+        'LT': item_value < filter_value,
+        'LTE': item_value <= filter_value,
+        'GT': item_value > filter_value,
+        'GTE': item_value >= filter_value,
+    }[operator]
+
+def search_snapshot_hubspot(
+    snapshot_items: List[dict],
+    api_type: str,
+    filter_groups: List[List[Dict[str, Any]]],
+    sorts: Optional[List[Dict[str, str]]] = None,
+    properties: Optional[List[str]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Answer a search from a cached full load instead of the Search API, with the same
+    filter semantics and result shape. The load must hold every object of the type
+    (see `complete` in get_items_hubspot). Returns None if the snapshot lacks a property
+    the search filters, sorts or returns on.
+    """
+    properties = search_properties(api_type, properties)
+    build_search_request(filter_groups, sorts, properties, limit)
+    needed = set(properties)
+    needed.update(search_filter['property'] for group in filter_groups for search_filter in group)
+    needed.update(sort['property'] for sort in sorts or [])
+    if not needed <= set(HUBSPOT_OBJECTS[api_type]['properties']) | set(HUBSPOT_DEFAULT_PROPERTIES):
+        return None
+
+    matches = [
+        item for item in snapshot_items
+        if not filter_groups or any(all(snapshot_filter_matches(item, f) for f in group) for group in filter_groups)
+    ]
+    # Stable sorts applied last key first; missing values sort last like in HubSpot
+    for sort in reversed(sorts or []):
+        descending = str(sort.get('direction', 'ASCENDING')).upper() == 'DESCENDING'
+        present = [item for item in matches if (item.get('properties') or {}).get(sort['property']) not in (None, '')]
+        missing = [item for item in matches if (item.get('properties') or {}).get(sort['property']) in (None, '')]
+        present.sort(key=lambda item: _sort_key(item['properties'][sort['property']]), reverse=descending)
+        matches = present + missing
+
+    start = int(cursor or 0)
+    page = matches[start:start + limit]
+    keep = set(properties) | set(HUBSPOT_DEFAULT_PROPERTIES)
+    items = [
+        {**item, 'properties': {name: value for name, value in (item.get('properties') or {}).items() if name in keep}}
+        for item in page
+    ]
+    after = str(start + limit) if start + limit < len(matches) else None
+    return {'items': items, 'total': len(matches), 'type': api_type, 'cursor': after}
+
 async def get_hubspot_contacts(org_id: str, user_id: str):
     try:
         # Get credentials from Redis
         credentials = await get_value_redis(f'hubspot_credentials:{org_id}:{user_id}')
         if not credentials:
-            print("❌ No HubSpot credentials found")
+            logger.warning("❌ No HubSpot credentials found")
             raise HTTPException(status_code=401, detail="No HubSpot credentials found")
         
         credentials = json.loads(credentials)
@@ -278,15 +639,15 @@ async def get_hubspot_contacts(org_id: str, user_id: str):
                     'properties': ['firstname', 'lastname', 'email', 'phone']  # Add/remove properties as needed
                 }
             )
+            usage_meter.record('hubspot', 'crm_objects', response.status_code, len(response.content), tenant_id=org_id)
             
             if response.status_code == 200:
-                print("✅ Successfully fetched HubSpot contacts")
+                logger.info("✅ Successfully fetched HubSpot contacts")
                 return response.json()
             else:
-                print(f"❌ Failed to fetch HubSpot contacts: {response.status_code}")
-                print(f"Response: {response.text}")
+                logger.error("❌ Failed to fetch HubSpot contacts: %s: %s", response.status_code, payload(response.text))
                 raise HTTPException(status_code=response.status_code, detail="Failed to fetch HubSpot contacts")
 
     except Exception as e:
-        print(f"❌ Error fetching HubSpot contacts: {str(e)}")
+        logger.error("❌ Error fetching HubSpot contacts: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,128 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Bytes requested from the provider response per read
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+# Characters that may follow a complete value; anything else means it continues in the next chunk
+_VALUE_TERMINATORS = _WHITESPACE + ',:]}'
+_decoder = json.JSONDecoder()
+
+
+class JsonRecordStream:
+    """
+    Incrementally parses a JSON object body read as a stream of byte chunks, yielding
+    the elements of one top-level array (e.g. "results" or "records") one at a time.
+    Every other top-level field (paging cursors, offsets, totals) is collected in
+    `envelope` and is complete once iteration finishes.
+
+    Only the record being decoded and the unread part of the current chunk are held
+    by the parser, so the raw page is never held as a whole; callers that collect the
+    records still hold every parsed record of the page.
+
+    With array_key=None the body itself must be an array, whose elements are yielded.
+    """
+    def __init__(self, chunks: AsyncIterator[bytes], array_key: Optional[str]):
+        self.chunks = chunks.__aiter__()
+        self.array_key = array_key
+        self.envelope: Dict[str, Any] = {}
+        self.found = False
+        # Raw body bytes read so far, for usage accounting
+        self.bytes_read = 0
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        """Read the next chunk into the buffer; returns False at end of body"""
+        if self._eof:
+            return False
+        # Drop what has been consumed so the buffer never grows past one record plus one chunk
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            self._buffer += self._text_decoder.decode(b'', final=True)
+            return False
+        self.bytes_read += len(chunk)
+        self._buffer += self._text_decoder.decode(chunk)
+        return True
+
+    async def _peek(self) -> str:
+        """Skip whitespace and return the next significant character without consuming it"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                raise ValueError('Unexpected end of JSON body')
+
+    async def _expect(self, char: str):
+        if await self._peek() != char:
+            raise ValueError(f'Expected {char!r} at position {self._pos} of JSON body')
+        self._pos += 1
+
+    async def _value(self) -> Any:
+        """Decode the next complete JSON value, reading more chunks until it is complete"""
+        await self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+                # A number cut off by the chunk boundary (e.g. "-15" of "-1500.0") decodes
+                # successfully, so only accept values followed by a terminator
+                if self._eof or (end < len(self._buffer) and self._buffer[end] in _VALUE_TERMINATORS):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            await self._fill()
+
+    async def _elements(self):
+        """Yield the elements of the array starting at the current position"""
+        self.found = True
+        await self._expect('[')
+        if await self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield await self._value()
+            if await self._peek() == ',':
+                self._pos += 1
+                continue
+            await self._expect(']')
+            return
+
+    async def __aiter__(self):
+        if self.array_key is None:
+            async for element in self._elements():
+                yield element
+            return
+
+        await self._expect('{')
+        if await self._peek() == '}':
+            return
+        while True:
+            key = await self._value()
+            await self._expect(':')
+
+            if key == self.array_key and await self._peek() == '[':
+                async for element in self._elements():
+                    yield element
+            else:
+                self.envelope[key] = await self._value()
+
+            if await self._peek() == ',':
+                self._pos += 1
+                continue
+            await self._expect('}')
+            return
+
+
+__all__ = ['JsonRecordStream', 'CHUNK_SIZE']
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Iterable
+
+Source = Callable[[], AsyncIterator[Any]]
+
+
+async def merge_streams(sources: Iterable[Source], max_concurrent: int, buffer_size: int) -> AsyncIterator[Any]:
+    """
+    Yields the items of several async iterators as they arrive, running at most
+    `max_concurrent` of them at a time; each source is a function returning one, called
+    once its turn comes. Items are handed over through a queue of `buffer_size`, so a
+    slow consumer holds the producers back instead of letting them buffer without bound.
+    The first producer error is raised to the consumer and the other producers are
+    cancelled, as they are when the consumer stops early.
+    """
+    queue = asyncio.Queue(maxsize=buffer_size)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    done = object()
+
+    async def produce(source: Source):
+        try:
+            async with semaphore:
+                async for item in source():
+                    # Wrapped, so an item is never mistaken for the done marker or an error
+                    await queue.put((item,))
+            await queue.put(done)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    tasks = [asyncio.create_task(produce(source)) for source in sources]
+    try:
+        producing = len(tasks)
+        while producing:
+            entry = await queue.get()
+            if entry is done:
+                producing -= 1
+                continue
+            if isinstance(entry, Exception):
+                raise entry
+            yield entry[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+__all__ = ['merge_streams']
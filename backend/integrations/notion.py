@@ -5,30 +5,53 @@ import secrets
 from fastapi import Request, HTTPException, APIRouter
 from fastapi.responses import HTMLResponse
 import httpx
-import asyncio
+from contextlib import aclosing
 import base64
+import logging
 import requests
 from integrations.integration_item import IntegrationItem
+from integrations.rate_limit import RateLimiter
 from datetime import datetime, timezone
 import os
-from dotenv import load_dotenv
 
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from jobs import report_progress
+from webhooks import register_webhook_tenant
+from integrations.json_stream import JsonRecordStream, CHUNK_SIZE
+from integrations.merge import merge_streams
+from deadline import DeadlineExceeded, PartialResult, within_deadline
+from scheduler import scheduler
+from usage import usage_meter
+from http_pool import http_pools
+from integrations.request_policy import RequestPolicy, TransientError, TRANSIENT_STATUSES, retry_after_seconds
 
-load_dotenv()  # Load environment variables
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 CLIENT_ID = os.getenv('NOTION_CLIENT_ID')
 CLIENT_SECRET = os.getenv('NOTION_CLIENT_SECRET')
-if not CLIENT_ID or not CLIENT_SECRET:
-    raise ValueError("NOTION_CLIENT_ID and NOTION_CLIENT_SECRET must be set in environment variables")
+NOTION_PAGE_SIZE = 100
+NOTION_MAX_PAGES = int(os.getenv('NOTION_MAX_PAGES', '100'))
+NOTION_VERSION = '2022-06-28'
+# Notion allows an average of 3 requests per second per integration token
+NOTION_REQUESTS_PER_SECOND = 3
+NOTION_RATE_LIMIT_BACKOFF = 30  # seconds to wait after a 429 that carries no Retry-After
+NOTION_MAX_CONCURRENT_DATABASES = 4
+# Rows buffered between the database queries and the consumer
+NOTION_ROW_BUFFER_SIZE = 500
 encoded_client_id_secret = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
 
 REDIRECT_URI = 'http://localhost:8000/integrations/notion/oauth2callback'
 authorization_url = f'https://api.notion.com/v1/oauth/authorize?client_id={CLIENT_ID}&response_type=code&owner=user&redirect_uri=http%3A%2F%2Flocalhost%3A8000%2Fintegrations%2Fnotion%2Foauth2callback'
 
+def require_client_credentials():
+    """The OAuth flow needs the app credentials; loading with stored tokens does not"""
+    if not CLIENT_ID or not CLIENT_SECRET:
+        raise ValueError("NOTION_CLIENT_ID and NOTION_CLIENT_SECRET must be set in environment variables")
+
 async def authorize_notion(user_id, org_id):
+    require_client_credentials()
     state_data = {
         'state': secrets.token_urlsafe(32),
         'user_id': user_id,
@@ -78,12 +101,10 @@ async def oauth2callback_notion(request: Request):
         connection_info = {
             'integration': 'notion',
             'connected_at': current_time,
-            'connected': True,
-            'credentials': token_data
+            'connected': True
         }
 
-        print(f"📝 Storing UTC time: {current_time}")
-        print(f"🔑 For user: {user_id}, org: {org_id}")
+        logger.info("📝 Storing Notion connection for user %s, org %s at %s", user_id, org_id, current_time)
 
         # Store both in Redis
         await add_key_value_redis(
@@ -96,6 +117,10 @@ async def oauth2callback_notion(request: Request):
             json.dumps(connection_info)
         )
 
+        # Route webhook events for this workspace to the tenant's cache
+        if token_data.get('workspace_id'):
+            await register_webhook_tenant('notion', token_data['workspace_id'], org_id, user_id)
+
         close_window_script = """
         <html>
             <body>
@@ -184,30 +209,223 @@ def create_integration_item_metadata_object(
 
     return integration_item_metadata
 
-async def get_items_notion(credentials) -> list[IntegrationItem]:
-    """Aggregates all metadata relevant for a notion integration"""
-    credentials = json.loads(credentials)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            'https://api.notion.com/v1/search',
-            headers={
-                'Authorization': f'Bearer {credentials.get("access_token")}',
-                'Notion-Version': '2022-06-28',
-            },
-        )
+# Searches and database queries share the per-token limit
+notion_rate_limiter = RateLimiter(NOTION_REQUESTS_PER_SECOND, 1.0)
+notion_search_policy = RequestPolicy('notion_search', notion_rate_limiter, NOTION_RATE_LIMIT_BACKOFF)
+
+def notion_rate_key(credentials: dict) -> str:
+    # Notion's rate limit applies per integration token, i.e. per connected workspace
+    return credentials.get('bot_id') or credentials.get('workspace_id') or 'default'
 
+async def fetch_notion_page(client: httpx.AsyncClient, headers: dict, start_cursor: str = None, rate_key: str = 'default'):
+    """Fetch one page of search results; returns (items, envelope) where envelope holds the cursor"""
+    body = {'page_size': NOTION_PAGE_SIZE}
+    if start_cursor:
+        body['start_cursor'] = start_cursor
+
+    async def attempt():
+        items = []
+        async with scheduler.slot(), client.stream('POST', 'https://api.notion.com/v1/search', headers=headers, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                usage_meter.record('notion', 'search', response.status_code, len(response.content))
+                detail = f'Notion API error: {response.text}'
+                if response.status_code in TRANSIENT_STATUSES:
+                    raise TransientError(response.status_code, detail, retry_after_seconds(response.headers))
+                raise HTTPException(status_code=response.status_code, detail=detail)
+            # Convert results as they are parsed, so the raw page is never held alongside them
+            stream = JsonRecordStream(response.aiter_bytes(CHUNK_SIZE), 'results')
+            async for result in stream:
+                items.append(create_integration_item_metadata_object(result))
+            usage_meter.record('notion', 'search', response.status_code, stream.bytes_read)
+        return items, stream.envelope
+
+    return await notion_search_policy.run(attempt, rate_key=rate_key)
+
+# Database queries are POSTs but only read, so they are retried and hedged like other reads
+database_query_policy = RequestPolicy('notion_database_query', notion_rate_limiter, NOTION_RATE_LIMIT_BACKOFF)
+
+async def get_items_notion(credentials, cursor: str = None) -> list[IntegrationItem]:
+    """
+    Aggregates all metadata relevant for a notion integration, starting at `cursor` if given.
+    Raises PartialResult with the items collected so far if the request deadline passes.
+    """
+    credentials = json.loads(credentials)
     list_of_integration_item_metadata = []
-    if response.status_code == 200:
-        results = response.json()['results']
-        for result in results:
-            list_of_integration_item_metadata.append(
-                create_integration_item_metadata_object(result)
-            )
-        print('--------------------------------')
-        print(list_of_integration_item_metadata)
-    
+    headers = {
+        'Authorization': f'Bearer {credentials.get("access_token")}',
+        'Notion-Version': NOTION_VERSION,
+    }
+    async with http_pools.httpx_client() as client:
+        for _ in range(NOTION_MAX_PAGES):
+            try:
+                items, envelope = await within_deadline(fetch_notion_page(client, headers, cursor, notion_rate_key(credentials)))
+            except DeadlineExceeded:
+                logger.info("⏱️ Deadline exceeded after %d Notion items", len(list_of_integration_item_metadata))
+                raise PartialResult(list_of_integration_item_metadata, cursor)
+
+            list_of_integration_item_metadata.extend(items)
+            report_progress(pages=1, items=len(items))
+            cursor = envelope.get('next_cursor')
+            if not envelope.get('has_more') or not cursor:
+                break
+
     return list_of_integration_item_metadata
 
+def notion_property_value(prop: dict):
+    """Plain value of a Notion page property: text, number, bool, date string, or a list of names/ids"""
+    prop_type = prop.get('type')
+    value = prop.get(prop_type)
+    if prop_type in ('title', 'rich_text'):
+        return ''.join(part.get('plain_text', '') for part in value or [])
+    if prop_type in ('select', 'status'):
+        return value.get('name') if value else None
+    if prop_type == 'multi_select':
+        return [option.get('name') for option in value or []]
+    if prop_type == 'date':
+        if not value:
+            return None
+        # Ranges as an ISO 8601 interval
+        return f"{value['start']}/{value['end']}" if value.get('end') else value.get('start')
+    if prop_type in ('people', 'created_by', 'last_edited_by'):
+        users = value if isinstance(value, list) else [value]
+        names = [user.get('name') or user.get('id') for user in users if user]
+        return names if prop_type == 'people' else next(iter(names), None)
+    if prop_type == 'relation':
+        return [page.get('id') for page in value or []]
+    if prop_type == 'files':
+        return [file.get('name') or (file.get(file.get('type')) or {}).get('url') for file in value or []]
+    if prop_type in ('formula', 'rollup') and value:
+        if value.get('type') == 'array':
+            return [notion_property_value(element) for element in value.get('array') or []]
+        return notion_property_value(value)
+    if prop_type == 'unique_id' and value:
+        return f"{value['prefix']}-{value['number']}" if value.get('prefix') else value.get('number')
+    return value
+
+def create_integration_item_from_row(row: dict, database_id: str) -> IntegrationItem:
+    properties = {name: notion_property_value(prop) for name, prop in row.get('properties', {}).items()}
+    title = next(
+        (properties[name] for name, prop in row.get('properties', {}).items() if prop.get('type') == 'title'),
+        None
+    )
+    return IntegrationItem(
+        id=row.get('id'),
+        type='Row',
+        name=title or row.get('id'),
+        parent_id=database_id,
+        creation_time=row.get('created_time'),
+        last_modified_time=row.get('last_edited_time'),
+        url=row.get('url'),
+        properties=properties,
+    )
+
+def parse_database_reference(database, filter=None, sorts=None) -> tuple:
+    """
+    Accepts database ids or {'database_id', 'filter', 'sorts'} dicts, whose own filter
+    and sorts win over the ones given for all databases
+    """
+    if isinstance(database, dict):
+        database_id = database.get('database_id')
+        filter = database.get('filter', filter)
+        sorts = database.get('sorts', sorts)
+    else:
+        database_id = str(database)
+    if not database_id:
+        raise HTTPException(status_code=400, detail=f'Invalid Notion database reference: {database}')
+    return database_id, filter, sorts
+
+async def fetch_database_page(
+    client: httpx.AsyncClient,
+    headers: dict,
+    database_id: str,
+    body: dict,
+    rate_key: str
+):
+    """Fetch one page of a database query; returns (rows, envelope) where envelope holds the cursor"""
+    url = f'https://api.notion.com/v1/databases/{database_id}/query'
+
+    async def attempt():
+        rows = []
+        async with scheduler.slot(), client.stream('POST', url, headers=headers, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                usage_meter.record('notion', 'database_query', response.status_code, len(response.content))
+                detail = f'Notion API error for database {database_id}: {response.text}'
+                if response.status_code in TRANSIENT_STATUSES:
+                    raise TransientError(response.status_code, detail, retry_after_seconds(response.headers))
+                raise HTTPException(status_code=response.status_code, detail=detail)
+            stream = JsonRecordStream(response.aiter_bytes(CHUNK_SIZE), 'results')
+            async for row in stream:
+                rows.append(row)
+            usage_meter.record('notion', 'database_query', response.status_code, stream.bytes_read)
+        return rows, stream.envelope
+
+    return await database_query_policy.run(attempt, rate_key=rate_key)
+
+async def fetch_database_rows(
+    client: httpx.AsyncClient,
+    credentials: dict,
+    database_id: str,
+    filter=None,
+    sorts=None,
+):
+    """
+    Yields the rows of one database matching `filter`, in `sorts` order, following
+    next_cursor until exhausted. Filtering and sorting are done by Notion.
+    """
+    headers = {
+        'Authorization': f'Bearer {credentials.get("access_token")}',
+        'Notion-Version': NOTION_VERSION,
+    }
+    body = {'page_size': NOTION_PAGE_SIZE}
+    if filter:
+        body['filter'] = filter
+    if sorts:
+        body['sorts'] = sorts
+    rate_key = notion_rate_key(credentials)
+
+    cursor = None
+    while True:
+        page_body = {**body, 'start_cursor': cursor} if cursor else body
+        rows, envelope = await fetch_database_page(client, headers, database_id, page_body, rate_key)
+        for row in rows:
+            yield row
+        report_progress(pages=1, items=len(rows))
+        cursor = envelope.get('next_cursor')
+        if not envelope.get('has_more') or not cursor:
+            return
+
+async def stream_database_rows_notion(
+    credentials,
+    databases: list,
+    filter=None,
+    sorts=None,
+    raw: bool = False,
+):
+    """
+    Streams the rows of the selected databases, querying several databases concurrently
+    within the workspace's rate limit. Rows are handed over through a bounded queue as
+    pages arrive, so memory stays bounded no matter how large the databases are.
+    """
+    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
+    queries = [parse_database_reference(database, filter, sorts) for database in databases]
+
+    async with http_pools.httpx_client() as client:
+        def query_database(database_id, database_filter, database_sorts):
+            async def rows():
+                async for row in fetch_database_rows(client, credentials, database_id, database_filter, database_sorts):
+                    yield database_id, row
+            return rows
+
+        sources = [query_database(*query) for query in queries]
+        async with aclosing(merge_streams(sources, NOTION_MAX_CONCURRENT_DATABASES, NOTION_ROW_BUFFER_SIZE)) as merged:
+            async for database_id, row in merged:
+                if raw:
+                    yield {'database_id': database_id, **row}
+                else:
+                    yield create_integration_item_from_row(row, database_id)
+
 @router.post("/disconnect/notion")
 async def disconnect_notion(request: Request):
     user_id = request.query_params.get('user_id')
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+
+
+class RateLimiter:
+    """Sliding-window limiter allowing `rate` acquisitions per `period` seconds for each key"""
+
+    def __init__(self, rate: int, period: float = 1.0):
+        self.rate = rate
+        self.period = period
+        self._calls = defaultdict(deque)
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def acquire(self, key: str = 'default'):
+        """Wait until a call for `key` is allowed, then record it"""
+        async with self._locks[key]:
+            calls = self._calls[key]
+            while True:
+                now = time.monotonic()
+                while calls and now - calls[0] >= self.period:
+                    calls.popleft()
+                if len(calls) < self.rate:
+                    calls.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - calls[0]))
+
+    def penalize(self, key: str, seconds: float):
+        """Push every recorded call for `key` forward so no new call is allowed for `seconds`"""
+        resume_at = time.monotonic() + seconds - self.period
+        calls = self._calls[key]
+        calls.clear()
+        calls.extend([resume_at] * self.rate)
+
+    def try_acquire(self, key: str = 'default') -> bool:
+        """Record a call for `key` only if one is allowed right now; never waits"""
+        if self._locks[key].locked():
+            return False
+        calls = self._calls[key]
+        now = time.monotonic()
+        while calls and now - calls[0] >= self.period:
+            calls.popleft()
+        if len(calls) < self.rate:
+            calls.append(now)
+            return True
+        return False
@@ -0,0 +1,121 @@
+import importlib
+from typing import Any, Callable, Dict, Iterable, Optional
+from fastapi import HTTPException
+from token_manager import token_manager
+
+
+class Integration:
+    """
+    A provider's hooks, declared by module path and function name. The provider module
+    is only imported the first time one of its hooks is called, so workers that never
+    touch a provider never pay for importing it.
+
+    Hooks: 'load' (credentials, cursor[, api_type]), 'credentials' (user_id, org_id),
+    'authorize' (user_id, org_id), 'oauth_callback' (request) and optionally
+    'refresh_token' (refresh_token), plus any provider-specific extras.
+    """
+    def __init__(
+        self,
+        name: str,
+        module: str,
+        hooks: Dict[str, str],
+        capabilities: Iterable[str] = (),
+        api_types: Optional[Iterable[str]] = None
+    ):
+        self.name = name
+        self.module_path = module
+        self.hooks = hooks
+        self.capabilities = frozenset(capabilities)
+        self.api_types = tuple(api_types) if api_types else ()
+
+    @property
+    def module(self):
+        return importlib.import_module(self.module_path)
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def hook(self, name: str) -> Callable:
+        if name not in self.hooks:
+            raise HTTPException(status_code=400, detail=f"{self.name} does not support {name}")
+        return getattr(self.module, self.hooks[name])
+
+    def lazy_hook(self, name: str) -> Callable:
+        """A coroutine function that imports the provider on its first call"""
+        async def call(*args, **kwargs):
+            return await self.hook(name)(*args, **kwargs)
+        return call
+
+    async def load(self, credentials: str, api_type: Optional[str] = None, cursor: Optional[str] = None) -> Any:
+        """Run the loader, validating api_type for providers that serve several object types"""
+        if not self.api_types:
+            return await self.hook('load')(credentials, cursor=cursor)
+        if not api_type:
+            raise HTTPException(status_code=400, detail=f"API type is required for {self.name} integration")
+        if api_type not in self.api_types:
+            raise HTTPException(status_code=400, detail=f"Unsupported {self.name} API type: {api_type}")
+        return await self.hook('load')(credentials, api_type, cursor=cursor)
+
+
+INTEGRATIONS: Dict[str, Integration] = {}
+
+
+def register_integration(integration: Integration) -> Integration:
+    INTEGRATIONS[integration.name] = integration
+    if 'refresh_token' in integration.hooks:
+        token_manager.register_refresher(integration.name, integration.lazy_hook('refresh_token'))
+    return integration
+
+
+def get_integration(name: str) -> Integration:
+    integration = INTEGRATIONS.get(name.lower())
+    if integration is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported integration type: {name}")
+    return integration
+
+
+register_integration(Integration(
+    'airtable',
+    'integrations.airtable',
+    hooks={
+        'load': 'get_items_airtable',
+        'credentials': 'get_airtable_credentials',
+        'authorize': 'authorize_airtable',
+        'oauth_callback': 'oauth2callback_airtable',
+        'refresh_token': 'refresh_airtable_token',
+        'stream_records': 'stream_records_airtable',
+        'invalidate_schemas': 'invalidate_airtable_schemas',
+    },
+    capabilities={'partial_results', 'records', 'webhooks'},
+))
+
+register_integration(Integration(
+    'notion',
+    'integrations.notion',
+    hooks={
+        'load': 'get_items_notion',
+        'credentials': 'get_notion_credentials',
+        'authorize': 'authorize_notion',
+        'oauth_callback': 'oauth2callback_notion',
+        'stream_database_rows': 'stream_database_rows_notion',
+    },
+    capabilities={'partial_results', 'databases', 'webhooks'},
+))
+
+register_integration(Integration(
+    'hubspot',
+    'integrations.hubspot',
+    hooks={
+        'load': 'get_items_hubspot',
+        'credentials': 'get_hubspot_credentials',
+        'authorize': 'authorize_hubspot',
+        'oauth_callback': 'oauth2callback_hubspot',
+        'refresh_token': 'refresh_hubspot_token',
+        'search': 'search_items_hubspot',
+        'search_snapshot': 'search_snapshot_hubspot',
+    },
+    capabilities={'partial_results', 'webhooks'},
+    api_types=('contacts', 'companies', 'deals', 'tickets'),
+))
+
+__all__ = ['Integration', 'INTEGRATIONS', 'register_integration', 'get_integration']
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import aiohttp
+import httpx
+from fastapi import HTTPException
+from deadline import remaining
+from integrations.rate_limit import RateLimiter
+from metrics import PROVIDER_REQUEST_SECONDS, PROVIDER_RETRIES, PROVIDER_HEDGES
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limiting and provider-side failures
+TRANSIENT_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+PROVIDER_MAX_ATTEMPTS = int(os.getenv('PROVIDER_MAX_ATTEMPTS', '3'))
+# A hedge is sent once the first attempt is slower than this latency percentile
+PROVIDER_HEDGE_PERCENTILE = float(os.getenv('PROVIDER_HEDGE_PERCENTILE', '0.95'))
+# Hedges allowed per request sent, so hedging adds at most ~10% extra load
+PROVIDER_HEDGE_BUDGET = float(os.getenv('PROVIDER_HEDGE_BUDGET', '0.1'))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 8.0
+
+
+class TransientError(HTTPException):
+    """A provider response worth retrying; surfaces as an HTTP error if retries run out"""
+    def __init__(self, status_code: int, detail: str = '', retry_after: Optional[float] = None):
+        super().__init__(status_code=status_code, detail=detail)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Seconds from a numeric Retry-After header, if the provider sent one"""
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestPolicy:
+    """
+    Retries and hedging for idempotent provider reads on one endpoint.
+
+    Transient failures are retried with full-jitter exponential backoff, as long as the
+    request's deadline leaves time for the wait. While an attempt is slower than the
+    endpoint's recent latency percentile, one duplicate is sent and whichever answers
+    first wins. Hedges draw on a small budget and, when the endpoint is rate limited,
+    are only sent if the limiter has a free slot right now, so they never queue
+    behind or exceed the provider's quota.
+    """
+    def __init__(
+        self,
+        endpoint: str,
+        rate_limiter: Optional[RateLimiter] = None,
+        rate_limit_backoff: float = 30,
+        max_attempts: int = PROVIDER_MAX_ATTEMPTS,
+        hedge: bool = True
+    ):
+        self.endpoint = endpoint
+        self.rate_limiter = rate_limiter
+        self.rate_limit_backoff = rate_limit_backoff
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._hedge_tokens = 1.0
+
+    def hedge_delay(self) -> Optional[float]:
+        """The configured latency percentile of recent successful attempts"""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * PROVIDER_HEDGE_PERCENTILE))]
+
+    async def _attempt(self, request: Callable[[], Awaitable]):
+        started = time.monotonic()
+        outcome = 'error'
+        try:
+            result = await request()
+            outcome = 'ok'
+            self._latencies.append(time.monotonic() - started)
+            return result
+        except TransientError:
+            outcome = 'transient'
+            raise
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        finally:
+            PROVIDER_REQUEST_SECONDS.labels(self.endpoint, outcome).observe(time.monotonic() - started)
+
+    def _may_hedge(self, rate_key: str) -> bool:
+        if self._hedge_tokens < 1:
+            return False
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire(rate_key):
+            return False
+        self._hedge_tokens -= 1
+        return True
+
+    async def _hedged(self, request: Callable[[], Awaitable], rate_key: str):
+        tasks = [asyncio.create_task(self._attempt(request))]
+        try:
+            delay = self.hedge_delay() if self.hedge else None
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._may_hedge(rate_key):
+                    tasks.append(asyncio.create_task(self._attempt(request)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            PROVIDER_HEDGES.labels(self.endpoint, str(task is tasks[1]).lower()).inc()
+                        return task.result()
+            # Every attempt failed; report the first one's error
+            raise tasks[0].exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, request: Callable[[], Awaitable], rate_key: str = 'default'):
+        """
+        Run `request` (a coroutine function making one attempt) under the policy. It
+        should raise TransientError for retryable responses.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(rate_key)
+            self._hedge_tokens = min(1.0, self._hedge_tokens + PROVIDER_HEDGE_BUDGET)
+            try:
+                return await self._hedged(request, rate_key)
+            except (TransientError, httpx.TransportError, aiohttp.ClientError) as e:
+                retry_after = getattr(e, 'retry_after', None)
+                if getattr(e, 'status_code', None) == 429 and self.rate_limiter is not None:
+                    # The limiter holds back every caller of this key, including the retry below
+                    self.rate_limiter.penalize(rate_key, retry_after or self.rate_limit_backoff)
+                    delay = 0.0
+                else:
+                    delay = retry_after or random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+                budget = remaining()
+                if attempt == self.max_attempts or (budget is not None and budget <= delay):
+                    raise
+                PROVIDER_RETRIES.labels(self.endpoint).inc()
+                logger.info("🔁 Retrying %s after %s (%d/%d) in %.2fs", self.endpoint, type(e).__name__, attempt, self.max_attempts, delay)
+                await asyncio.sleep(delay)
+
+
+__all__ = ['RequestPolicy', 'TransientError', 'TRANSIENT_STATUSES', 'retry_after_seconds']
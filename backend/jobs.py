@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import logging
+import os
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+from cache import cache
+from redis_client import redis_client, transaction_pipeline, redis_breaker, local_store, RedisUnavailable
+from scheduler import BACKGROUND, set_priority, reset_priority
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL_SECONDS = 3600
+LOAD_JOB_WORKERS = int(os.getenv('LOAD_JOB_WORKERS', '4'))
+LOAD_JOB_QUEUE_SIZE = int(os.getenv('LOAD_JOB_QUEUE_SIZE', '100'))
+# Progress is written to Redis at most this often per job
+PROGRESS_FLUSH_INTERVAL = 0.5
+
+TERMINAL_STATUSES = ('done', 'failed')
+
+_current_job = contextvars.ContextVar('current_load_job', default=None)
+
+
+def report_progress(pages: int = 0, items: int = 0, total: Optional[int] = None):
+    """
+    Called by integration fetchers as they page through a provider.
+    Does nothing when the load is not running as a job.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.advance(pages, items, total)
+
+
+class LoadJob:
+    def __init__(self, job_id: str, run: Callable[[], Awaitable[Dict[str, bytes]]]):
+        self.id = job_id
+        self.run = run
+        self.pages = 0
+        self.items = 0
+        self.total = None
+        self.started_at = None
+        self._last_flush = 0.0
+        self._flush_task = None
+
+    @property
+    def key(self) -> str:
+        return job_key(self.id)
+
+    def progress(self) -> Dict[str, str]:
+        progress = {'pages': self.pages, 'items': self.items, 'total': self.total or '', 'eta_seconds': ''}
+        if self.total and self.items and self.started_at:
+            elapsed = time.time() - self.started_at
+            progress['eta_seconds'] = round(elapsed * (self.total - self.items) / self.items, 1)
+        return {field: str(value) for field, value in progress.items()}
+
+    def advance(self, pages: int, items: int, total: Optional[int]):
+        self.pages += pages
+        self.items += items
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if now - self._last_flush >= PROGRESS_FLUSH_INTERVAL and (self._flush_task is None or self._flush_task.done()):
+            self._last_flush = now
+            self._flush_task = asyncio.create_task(self._flush_progress())
+
+    async def _flush_progress(self):
+        # Progress is best effort; a failed write must not surface as an unretrieved task error
+        try:
+            await write_job_state({self.key: self.progress()})
+        except Exception as e:
+            logger.warning("⚠️ Could not record progress of load job %s: %s", self.id, e)
+
+
+def job_key(job_id: str) -> str:
+    # The id is a {hash tag} so a job's state and result share one Redis Cluster slot
+    return f'load_job:{{{job_id}}}'
+
+
+def job_result_key(job_id: str) -> str:
+    return f'load_job:{{{job_id}}}:result'
+
+
+def _encode(mapping: Dict) -> Dict[str, bytes]:
+    # Match what Redis hands back, so callers see bytes from either store
+    return {field: value if isinstance(value, bytes) else str(value).encode('utf-8') for field, value in mapping.items()}
+
+
+async def write_job_state(writes: Dict[str, Dict]):
+    """
+    Write fields to job hashes ({key: mapping}) in one transaction, each expiring after
+    JOB_TTL_SECONDS. While Redis is down they go to this node's fallback store, like the cache.
+    """
+    try:
+        async with transaction_pipeline() as pipe:
+            for key, mapping in writes.items():
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, JOB_TTL_SECONDS)
+            await redis_breaker.call(pipe.execute())
+    except RedisUnavailable:
+        for key, mapping in writes.items():
+            local_store.set(key, {**(local_store.get(key) or {}), **_encode(mapping)}, JOB_TTL_SECONDS)
+
+
+async def read_job_state(key: str) -> Dict[str, bytes]:
+    """A job hash from Redis, or from this node's fallback store if it was written during an outage"""
+    try:
+        state = await redis_breaker.call(redis_client.hgetall(key))
+    except RedisUnavailable:
+        state = {}
+    # Fields written to Redis after it came back win over those kept locally
+    return {**(local_store.get(key) or {}), **{field.decode('utf-8'): value for field, value in state.items()}}
+
+
+class JobRunner:
+    """
+    Runs load jobs on a bounded pool of asyncio workers. Job state, progress and
+    results live in Redis, so any worker can answer status and result requests.
+    """
+    def __init__(self, workers: int = LOAD_JOB_WORKERS, queue_size: int = LOAD_JOB_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self.draining = False
+
+    async def submit(self, run: Callable[[], Awaitable[Dict[str, bytes]]], **meta: str) -> str:
+        """Queue a coroutine that produces a cache entry and return the job id"""
+        if self.draining:
+            raise HTTPException(status_code=503, detail='Shutting down, submit the load to another worker.')
+        if self._queue.full():
+            raise HTTPException(status_code=503, detail='Too many load jobs queued, try again later.')
+        job = LoadJob(secrets.token_urlsafe(12), run)
+        state = {'status': 'queued', 'created_at': str(time.time()), **meta, **job.progress()}
+        await write_job_state({job.key: state})
+        self._queue.put_nowait(job)
+        return job.id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, str]]:
+        state = await read_job_state(job_key(job_id))
+        if not state:
+            return None
+        return {field: value.decode('utf-8') for field, value in state.items()}
+
+    async def get_result(self, job_id: str) -> Optional[Dict[str, bytes]]:
+        """
+        The cache entry a finished job produced. Large results are kept as the cache's
+        chunk manifest, so they are gone once the chunks it refers to have expired.
+        """
+        entry = await read_job_state(job_result_key(job_id))
+        if not entry:
+            return None
+        try:
+            return entry if await cache.has_chunks(entry) else None
+        except RedisUnavailable:
+            raise HTTPException(status_code=503, detail='Cache is unavailable, try again shortly.')
+
+    async def _execute(self, job: LoadJob):
+        job.started_at = time.time()
+        token = _current_job.set(job)
+        # Jobs yield outbound slots to requests a user is waiting on
+        priority_token = set_priority(BACKGROUND)
+        try:
+            await write_job_state({job.key: {'status': 'running', 'started_at': str(job.started_at)}})
+            entry = await job.run()
+            if job._flush_task is not None:
+                await job._flush_task
+            # A chunked entry is stored as its manifest, a reference to the cached chunks
+            await write_job_state({
+                job_result_key(job.id): entry,
+                job.key: {'status': 'done', 'finished_at': str(time.time()), **job.progress()},
+            })
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error("❌ Load job %s failed: %s", job.id, detail)
+            await write_job_state({job.key: {
+                'status': 'failed',
+                'error': str(detail),
+                'finished_at': str(time.time()),
+                **job.progress()
+            }})
+        finally:
+            reset_priority(priority_token)
+            _current_job.reset(token)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._execute(job)
+            except Exception as e:
+                # Recording the outcome failed too; the worker must outlive it
+                logger.error("❌ Load job %s could not be recorded: %s", job.id, e)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def drain(self, timeout: float):
+        """Stop taking jobs and give queued and running ones up to `timeout` seconds to finish"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Load jobs still running after %ss, cancelling them", timeout)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_runner = JobRunner()
+
+__all__ = ['job_runner', 'JobRunner', 'report_progress', 'TERMINAL_STATUSES']
@@ -0,0 +1,202 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from fnmatch import fnmatch
+from typing import Any, List, Optional, Tuple
+from metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# json for log shippers, text for reading in a terminal
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+# Records waiting for the writer thread; when it falls behind, new records are dropped rather than waited on
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Longest rendering of a payload() argument (bodies, params, envelopes)
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '512'))
+# Share of requests whose debug and info records are kept; warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+# Per-path overrides as path_glob=rate, first match wins
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '/healthz=0,/readyz=0,/metrics=0')
+
+# Libraries that log every outbound request at INFO
+QUIET_LOGGERS = ('httpx', 'httpcore')
+
+SECRET_KEYS = frozenset({
+    'access_token', 'refresh_token', 'id_token', 'token', 'client_secret', 'secret',
+    'password', 'api_key', 'authorization', 'code', 'credentials',
+})
+REDACTED = '[redacted]'
+_BEARER = re.compile(r'(?i)(bearer\s+)[^\s"\',]+')
+# Containers are only walked this far; payloads are previews, not dumps
+_MAX_ITEMS = 10
+_MAX_DEPTH = 4
+
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+_route = contextvars.ContextVar('log_route', default=None)
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Copy of `value` with secret fields masked, trimmed to a preview of long or deep containers"""
+    if depth >= _MAX_DEPTH and isinstance(value, (dict, list, tuple)):
+        return f'<{type(value).__name__} of {len(value)}>'
+    if isinstance(value, dict):
+        preview = {
+            key: REDACTED if str(key).lower() in SECRET_KEYS else redact(item, depth + 1)
+            for key, item in list(value.items())[:_MAX_ITEMS]
+        }
+        if len(value) > _MAX_ITEMS:
+            preview['…'] = f'{len(value) - _MAX_ITEMS} more keys'
+        return preview
+    if isinstance(value, (list, tuple)):
+        preview = [redact(item, depth + 1) for item in value[:_MAX_ITEMS]]
+        if len(value) > _MAX_ITEMS:
+            preview.append(f'… {len(value) - _MAX_ITEMS} more items')
+        return preview
+    if isinstance(value, str):
+        return _BEARER.sub(r'\1' + REDACTED, value)
+    return value
+
+
+class payload:
+    """
+    Log argument for data that may be large or hold secrets, e.g.
+    logger.debug("HubSpot page %s", payload(envelope)). It is only rendered if the
+    record is emitted, with secrets masked and the text capped at `limit` characters.
+    """
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = LOG_PAYLOAD_MAX_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        size = None
+        if isinstance(value, (bytes, bytearray)):
+            # Only decode what can be shown
+            size = len(value)
+            value = bytes(value[:self.limit * 2]).decode('utf-8', 'replace')
+        if isinstance(value, str):
+            text = redact(value)
+        else:
+            text = json.dumps(redact(value), default=str, ensure_ascii=False)
+        if len(text) > self.limit:
+            return f'{text[:self.limit]}… ({size or len(text)} chars)'
+        return text
+
+    __repr__ = __str__
+
+
+def _parse_rates(rates: str) -> List[Tuple[str, float]]:
+    parsed = []
+    for pair in filter(None, (pair.strip() for pair in rates.split(','))):
+        pattern, _, rate = pair.rpartition('=')
+        parsed.append((pattern, float(rate)))
+    return parsed
+
+
+class LogSamplingMiddleware:
+    """
+    Decides once per request whether its debug and info records are kept, at the rate
+    configured for its path, so a busy route can log a representative sample instead
+    of every call. Records also carry the request path.
+    """
+    def __init__(self, app, rates: Optional[List[Tuple[str, float]]] = None, default_rate: float = LOG_SAMPLE_RATE):
+        self.app = app
+        self.rates = rates if rates is not None else _parse_rates(LOG_SAMPLE_RATES)
+        self.default_rate = default_rate
+
+    def rate_for(self, path: str) -> float:
+        for pattern, rate in self.rates:
+            if fnmatch(path, pattern):
+                return rate
+        return self.default_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        rate = self.rate_for(scope['path'])
+        route_token = _route.set(scope['path'])
+        sampled_token = _sampled.set(rate >= 1 or random.random() < rate)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sampled.reset(sampled_token)
+            _route.reset(route_token)
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.route = _route.get()
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without ever blocking the event loop"""
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_RECORD_FIELDS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra={...}` fields become top-level keys"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS and value is not None
+        )
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_listener = None
+
+
+def configure_logging():
+    """
+    Route all records through a bounded queue to a writer thread, so serialising
+    records and writing them to stdout happen off the event loop. Messages are still
+    interpolated by the caller, and only for records that pass the level and sampling
+    checks. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(records)
+    handler.addFilter(_SamplingFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+__all__ = ['configure_logging', 'payload', 'redact', 'LogSamplingMiddleware', 'JsonFormatter']
@@ -1,30 +1,76 @@
-from fastapi import FastAPI, Form, Request, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-import redis.exceptions
-from redis_client import redis_client, add_key_value_redis, get_value_redis
+from dotenv import load_dotenv
+
+# Load environment variables once, before any module reads its configuration
+load_dotenv()
+
+from log import configure_logging, payload, LogSamplingMiddleware
+
+# Before the other imports, so records logged while they load go through the queue too
+configure_logging()
+
+from redis_client import redis_client, redis_breaker, close_redis_client, RedisUnavailable, add_key_value_redis, get_value_redis
+from http_pool import http_pools
 from routes import integrations  # Import the router
-from integrations.middleware import track_integration_connection
+from routes import jobs
+from routes import webhooks
+from token_manager import token_manager
+from jobs import job_runner
+from webhooks import webhook_processor
+from metrics import render_metrics
+from usage import usage_meter
+import asyncio
 import json
 import datetime
+import os
 import logging
-import sys
-
-from integrations.airtable import authorize_airtable, get_items_airtable, oauth2callback_airtable, get_airtable_credentials
-from integrations.notion import authorize_notion, get_items_notion, oauth2callback_notion, get_notion_credentials
-from integrations.hubspot import authorize_hubspot, get_hubspot_credentials, oauth2callback_hubspot
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Log to stdout
-    ]
-)
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Seconds a stopping worker waits for queued and running load jobs
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '25'))
+# Whether /readyz fails while Redis is down; set to false to keep serving from the local fallback store
+READYZ_REQUIRES_REDIS = os.getenv('READYZ_REQUIRES_REDIS', 'true').lower() == 'true'
+READYZ_REDIS_TIMEOUT = 0.5
+
+draining = False
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker resources: pools are opened before the first request and closed after
+    the last, once running loads have drained, so deploys neither drop loads nor leak
+    connections.
+    """
+    global draining
+    try:
+        await redis_breaker.call(redis_client.ping())
+    except RedisUnavailable:
+        logger.warning("Could not connect to Redis. Caching falls back to this node's local store.")
+    await http_pools.open()
+    token_manager.start()
+    job_runner.start()
+    usage_meter.start()
+    logger.info("Application startup")
+    try:
+        yield
+    finally:
+        # Uvicorn has stopped accepting connections and finished open requests by now;
+        # what is left are background load jobs, which get a bounded time to finish
+        draining = True
+        await job_runner.drain(SHUTDOWN_DRAIN_SECONDS)
+        await job_runner.stop()
+        await webhook_processor.stop()
+        await token_manager.stop()
+        await usage_meter.stop()
+        await http_pools.close()
+        await redis_breaker.stop()
+        await close_redis_client()
+        logger.info("Application shutdown")
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  # React app address
@@ -36,16 +82,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Data-Version", "X-Data-Stale"],
 )
-
-@app.on_event("startup")
-async def startup_event():
-    """Check Redis connection on startup"""
-    try:
-        await redis_client.ping()
-    except redis.exceptions.ConnectionError:
-        print("WARNING: Could not connect to Redis. Caching will be disabled.")
-    logger.info("Application startup")
+app.add_middleware(LogSamplingMiddleware)
 
 # Include the integrations router
 app.include_router(
@@ -54,56 +93,62 @@ app.include_router(
     tags=["integrations"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+app.include_router(
+    webhooks.router,
+    prefix="/webhooks",
+    tags=["webhooks"]
+)
+
 @app.get('/')
 def read_root():
     return {'Ping': 'Pong'}
 
+@app.get('/healthz')
+def healthz():
+    """Liveness: the worker's event loop is answering"""
+    return {'status': 'ok'}
 
-# Airtable
-@app.post('/integrations/airtable/authorize')
-async def authorize_airtable_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await authorize_airtable(user_id, org_id)
-
-@app.get('/integrations/airtable/oauth2callback')
-async def oauth2callback_airtable_integration(request: Request):
-    return await oauth2callback_airtable(request)
-
-@app.post('/integrations/airtable/credentials')
-async def get_airtable_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await get_airtable_credentials(user_id, org_id)
-
-@app.post('/integrations/airtable/load')
-async def get_airtable_items(credentials: str = Form(...)):
-    return await get_items_airtable(credentials)
-
-
-# Notion
-@app.post('/integrations/notion/authorize')
-@track_integration_connection('notion')
-async def authorize_notion_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await authorize_notion(user_id, org_id)
-
-@app.get('/integrations/notion/oauth2callback')
-async def oauth2callback_notion_integration(request: Request):
-    return await oauth2callback_notion(request)
-
-@app.post('/integrations/notion/credentials')
-async def get_notion_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await get_notion_credentials(user_id, org_id)
-
-# HubSpot
-@app.post('/integrations/hubspot/authorize')
-@track_integration_connection('hubspot')
-async def hubspot_authorize(user_id: str = Form(...), org_id: str = Form(...)):
-    return await authorize_hubspot(user_id, org_id)
-
-@app.get('/integrations/hubspot/oauth2callback')
-async def hubspot_callback(request: Request):
-    return await oauth2callback_hubspot(request)
-
-@app.post('/integrations/hubspot/credentials')
-async def get_hubspot_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await get_hubspot_credentials(user_id, org_id)
+@app.get('/readyz')
+async def readyz():
+    """Readiness: the worker is not shutting down and its Redis and HTTP pools are usable"""
+    checks = {'accepting': not draining, 'http_pools': http_pools.is_open}
+    try:
+        await asyncio.wait_for(redis_breaker.call(redis_client.ping()), READYZ_REDIS_TIMEOUT)
+        checks['redis'] = True
+    except (RedisUnavailable, asyncio.TimeoutError):
+        checks['redis'] = False
+    required = [name for name in checks if name != 'redis' or READYZ_REQUIRES_REDIS]
+    ready = all(checks[name] for name in required)
+    return Response(
+        content=json.dumps({'status': 'ready' if ready else 'unavailable', 'checks': checks}),
+        media_type='application/json',
+        status_code=200 if ready else 503
+    )
+
+@app.get('/metrics')
+def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@app.get('/usage/{org_id}')
+async def get_usage(org_id: str, day: str = Query(None, description="UTC day as YYYY-MM-DD, today by default")):
+    """Provider requests, bytes, 429s and cache hits of an org, per integration and endpoint"""
+    try:
+        usage = await usage_meter.get_usage(org_id, day)
+    except RedisUnavailable:
+        raise HTTPException(status_code=503, detail="Usage data is unavailable while Redis is down")
+    return {
+        'org_id': org_id,
+        'requests_today': usage_meter.requests_today(org_id),
+        'budget': usage_meter.budget_for(org_id) or None,
+        'usage': usage,
+    }
 
 # Add a general endpoint to get connection info for any integration
 @app.get('/integrations/connection-info/{integration_name}')
@@ -113,35 +158,34 @@ async def get_integration_connection_info(
     org_id: str = Query(...)
 ):
     try:
-        print(f"🔍 Checking connection info for {integration_name}")
-        print(f"👤 User: {user_id}, Org: {org_id}")
+        logger.debug("🔍 Checking connection info for %s (user %s, org %s)", integration_name, user_id, org_id)
         
         # Check for credentials
         credentials_key = f'{integration_name}_credentials:{org_id}:{user_id}'
         credentials = await get_value_redis(credentials_key)
-        print(f"💾 Credentials found: {bool(credentials)}")
+        logger.debug("💾 Credentials found: %s", bool(credentials))
         
         # Check for connection info
         connection_key = f'integration_connection:{integration_name}:{org_id}:{user_id}'
         connection_info = await get_value_redis(connection_key)
-        print(f"🔌 Connection info found: {bool(connection_info)}")
+        logger.debug("🔌 Connection info found: %s", bool(connection_info))
         
         if connection_info:
             info = json.loads(connection_info)
-            print(f"ℹ️ Returning connection info: {info}")
+            # Older entries embedded the provider tokens; those never go back to the browser
+            info.pop('credentials', None)
+            logger.debug("ℹ️ Returning connection info: %s", payload(info))
             return info
             
         if credentials:
             # If we have credentials but no connection info, create it
-            credentials_data = json.loads(credentials)
             connection_info = {
                 'integration': integration_name,
                 'connected_at': datetime.datetime.utcnow().isoformat(),
-                'connected': True,
-                'credentials': credentials_data
+                'connected': True
             }
             
-            print(f"🆕 Creating new connection info: {connection_info}")
+            logger.info("🆕 Creating connection info for %s", integration_name)
             
             await add_key_value_redis(
                 connection_key,
@@ -150,13 +194,14 @@ async def get_integration_connection_info(
             
             return connection_info
 
-        print("❌ No connection found")
+        logger.debug("❌ No connection found")
         return {"connected": False}
         
     except Exception as e:
-        print(f"❌ Error getting connection info: {str(e)}")
+        logger.error("❌ Error getting connection info: %s", e)
         return {"connected": False, "error": str(e)}
 
 if __name__ == "__main__":
+    # Single-process development server; production runs serve.py
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,90 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+CACHE_TTL_SECONDS = Histogram(
+    'cache_ttl_seconds',
+    'TTL chosen for a cached dataset when it is written',
+    ['dataset'],
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400, 172800, 604800)
+)
+CACHE_REFRESHES = Counter(
+    'cache_refreshes_total',
+    'Refreshes of a cached dataset, by whether the content changed',
+    ['dataset', 'changed']
+)
+CACHE_CHUNKS = Counter(
+    'cache_chunks_total',
+    'Chunks of large cached datasets: written, reused from an earlier write, or missing on read',
+    ['outcome']
+)
+
+SCHEDULER_QUEUE_WAIT = Histogram(
+    'scheduler_queue_wait_seconds',
+    'Time a provider request waited for an outbound slot',
+    ['tenant', 'priority'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+SCHEDULER_QUEUED = Gauge(
+    'scheduler_queued_requests',
+    'Provider requests waiting for an outbound slot',
+    ['priority']
+)
+SCHEDULER_IN_FLIGHT = Gauge(
+    'scheduler_in_flight_requests',
+    'Provider requests holding an outbound slot'
+)
+
+PROVIDER_REQUEST_SECONDS = Histogram(
+    'provider_request_seconds',
+    'Latency of single provider request attempts',
+    ['endpoint', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+)
+PROVIDER_RETRIES = Counter(
+    'provider_retries_total',
+    'Provider requests retried after a transient error',
+    ['endpoint']
+)
+PROVIDER_HEDGES = Counter(
+    'provider_hedges_total',
+    'Hedged duplicate provider requests, by whether the hedge answered first',
+    ['endpoint', 'won']
+)
+
+USAGE_DOWNGRADES = Counter(
+    'usage_budget_downgrades_total',
+    'Loads served from cached or stale data because the org was over its request budget',
+    ['integration']
+)
+
+ANALYTICS_QUERY_SECONDS = Histogram(
+    'analytics_query_seconds',
+    'Time to answer an analytics query, memoized or computed over a dataset frame',
+    ['outcome'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Log records dropped because the log writer queue was full'
+)
+
+
+def render_metrics():
+    """Prometheus exposition payload and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+__all__ = [
+    'CACHE_TTL_SECONDS',
+    'CACHE_REFRESHES',
+    'CACHE_CHUNKS',
+    'SCHEDULER_QUEUE_WAIT',
+    'SCHEDULER_QUEUED',
+    'SCHEDULER_IN_FLIGHT',
+    'PROVIDER_REQUEST_SECONDS',
+    'PROVIDER_RETRIES',
+    'PROVIDER_HEDGES',
+    'USAGE_DOWNGRADES',
+    'LOG_RECORDS_DROPPED',
+    'ANALYTICS_QUERY_SECONDS',
+    'render_metrics',
+]
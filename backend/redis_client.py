@@ -1,17 +1,255 @@
+import asyncio
+import logging
 import os
+import time
+from collections import OrderedDict
 import redis.asyncio as redis
+from redis.asyncio.cluster import RedisCluster, ClusterNode
+from redis.asyncio.connection import DefaultParser
+from redis.asyncio.sentinel import Sentinel
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from redis.utils import HIREDIS_AVAILABLE
 from kombu.utils.url import safequote
 
+# standalone, sentinel or cluster
+REDIS_MODE = os.environ.get('REDIS_MODE', 'standalone').lower()
+REDIS_PORT = int(os.environ.get('REDIS_PORT', '6379'))
+REDIS_DB = int(os.environ.get('REDIS_DB', '0'))
+REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD') or None
+# Comma-separated host:port lists for sentinel and cluster modes
+REDIS_SENTINELS = os.environ.get('REDIS_SENTINELS', '')
+REDIS_SENTINEL_SERVICE = os.environ.get('REDIS_SENTINEL_SERVICE', 'mymaster')
+REDIS_CLUSTER_NODES = os.environ.get('REDIS_CLUSTER_NODES', '')
+# Connections per pool (per node in cluster mode)
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', '50'))
+# Short timeouts so an unreachable Redis costs milliseconds, not the OS connect timeout
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', '0.5'))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '1.0'))
+REDIS_SOCKET_KEEPALIVE = os.environ.get('REDIS_SOCKET_KEEPALIVE', 'true').lower() == 'true'
+# Idle pooled connections are pinged before reuse after this many seconds
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+# Consecutive failures that open the breaker, and how often it then probes for recovery
+REDIS_BREAKER_FAILURES = int(os.environ.get('REDIS_BREAKER_FAILURES', '3'))
+REDIS_BREAKER_PROBE_SECONDS = float(os.environ.get('REDIS_BREAKER_PROBE_SECONDS', '5'))
+# Keys kept by the per-node fallback store while Redis is down
+REDIS_FALLBACK_MAX_KEYS = int(os.environ.get('REDIS_FALLBACK_MAX_KEYS', '10000'))
+
+REDIS_CLUSTER = REDIS_MODE == 'cluster'
+
+logger = logging.getLogger(__name__)
+
 redis_host = safequote(os.environ.get('REDIS_HOST', 'localhost'))
-redis_client = redis.Redis(host=redis_host, port=6379, db=0)
+
+
+def _parse_nodes(nodes: str) -> list:
+    """'host1:6379,host2:6380' -> [('host1', 6379), ('host2', 6380)]"""
+    parsed = []
+    for node in filter(None, (node.strip() for node in nodes.split(','))):
+        host, _, port = node.rpartition(':')
+        parsed.append((host, int(port)) if host else (port, REDIS_PORT))
+    return parsed
+
+
+def create_redis_client():
+    """Build the Redis client for REDIS_MODE; hiredis parses replies whenever it is installed"""
+    connection_kwargs = {
+        'password': REDIS_PASSWORD,
+        'socket_connect_timeout': REDIS_CONNECT_TIMEOUT,
+        'socket_timeout': REDIS_SOCKET_TIMEOUT,
+        'socket_keepalive': REDIS_SOCKET_KEEPALIVE,
+        'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+    }
+    if not HIREDIS_AVAILABLE:
+        logger.warning("⚠️ hiredis is not installed, Redis replies are parsed in pure Python")
+
+    if REDIS_MODE == 'cluster':
+        nodes = _parse_nodes(REDIS_CLUSTER_NODES) or [(redis_host, REDIS_PORT)]
+        return RedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in nodes],
+            max_connections=REDIS_MAX_CONNECTIONS,
+            **connection_kwargs
+        )
+
+    if REDIS_MODE == 'sentinel':
+        sentinel = Sentinel(
+            _parse_nodes(REDIS_SENTINELS) or [(redis_host, 26379)],
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+        )
+        return sentinel.master_for(
+            REDIS_SENTINEL_SERVICE,
+            db=REDIS_DB,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            **connection_kwargs
+        )
+
+    if REDIS_MODE != 'standalone':
+        raise ValueError(f"Unsupported REDIS_MODE: {REDIS_MODE}")
+    pool = redis.ConnectionPool(
+        host=redis_host,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        parser_class=DefaultParser,
+        **connection_kwargs
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+redis_client = create_redis_client()
+
+
+def transaction_pipeline():
+    """
+    Pipeline that runs as MULTI/EXEC where the deployment supports it. Redis Cluster has
+    no cross-command transactions, so there it is a plain pipeline; keys that belong
+    together share a {hash tag} so the pipeline still lands on a single node.
+    """
+    return redis_client.pipeline(transaction=not REDIS_CLUSTER)
+
+
+async def close_redis_client():
+    """Disconnect every pooled connection; called once per worker at shutdown"""
+    if REDIS_CLUSTER:
+        await redis_client.close()
+    else:
+        await redis_client.close(close_connection_pool=True)
+
+
+class RedisUnavailable(RedisConnectionError):
+    """Redis is down or the circuit breaker is open; callers should use the local fallback"""
+
+
+class CircuitBreaker:
+    """
+    Fails Redis calls fast once Redis looks unhealthy. After `failure_threshold`
+    consecutive connection errors the breaker opens: calls raise RedisUnavailable
+    immediately while a background task pings Redis until it answers again.
+    """
+    def __init__(self, client, failure_threshold: int = REDIS_BREAKER_FAILURES,
+                 probe_interval: float = REDIS_BREAKER_PROBE_SECONDS):
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.failures = 0
+        self.opened_at = None
+        self._probe_task = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    async def call(self, awaitable):
+        if self.is_open:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise RedisUnavailable('Redis circuit breaker is open')
+        try:
+            result = await awaitable
+        except (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError) as e:
+            self._record_failure()
+            raise RedisUnavailable(str(e)) from e
+        self.failures = 0
+        return result
+
+    def _record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold and not self.is_open:
+            self.opened_at = time.monotonic()
+            logger.warning("⚠️ Redis unavailable after %d failures, using local fallback store", self.failures)
+            self._probe_task = asyncio.create_task(self._probe())
+
+    async def _probe(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.client.ping()
+            except Exception:
+                continue
+            logger.info("✅ Redis recovered after %.1fs", time.monotonic() - self.opened_at)
+            self.failures = 0
+            self.opened_at = None
+            return
+
+    async def stop(self):
+        if self._probe_task is not None and not self._probe_task.done():
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+
+
+class LocalStore:
+    """
+    Bounded in-memory key-value store with per-key expiry, used on this node while
+    Redis is unavailable. Least recently used keys are evicted first.
+    """
+    def __init__(self, max_keys: int = REDIS_FALLBACK_MAX_KEYS):
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expire=None):
+        self._data[key] = (value, time.monotonic() + expire if expire else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+
+redis_breaker = CircuitBreaker(redis_client)
+local_store = LocalStore()
+
+
+def _encode(value):
+    # Match what Redis hands back, so callers see bytes from either store
+    return value if isinstance(value, bytes) else str(value).encode('utf-8')
 
 async def add_key_value_redis(key, value, expire=None):
-    await redis_client.set(key, value)
-    if expire:
-        await redis_client.expire(key, expire)
+    try:
+        await redis_breaker.call(redis_client.set(key, value, ex=expire))
+        local_store.delete(key)
+    except RedisUnavailable:
+        local_store.set(key, _encode(value), expire)
 
 async def get_value_redis(key):
-    return await redis_client.get(key)
+    try:
+        value = await redis_breaker.call(redis_client.get(key))
+    except RedisUnavailable:
+        return local_store.get(key)
+    # Keys written during an outage stay readable until they expire
+    return value if value is not None else local_store.get(key)
+
+async def get_values_redis(keys):
+    if not keys:
+        return []
+    try:
+        # MGET must not span hash slots in cluster mode; the non-atomic variant splits it per node
+        mget = redis_client.mget_nonatomic if REDIS_CLUSTER else redis_client.mget
+        values = await redis_breaker.call(mget(keys))
+    except RedisUnavailable:
+        values = [None] * len(keys)
+    return [value if value is not None else local_store.get(key) for key, value in zip(keys, values)]
 
 async def delete_key_redis(key):
-    await redis_client.delete(key)
+    await delete_keys_redis([key])
+
+async def delete_keys_redis(keys):
+    if not keys:
+        return
+    for key in keys:
+        local_store.delete(key)
+    try:
+        await redis_breaker.call(redis_client.delete(*keys))
+    except RedisUnavailable:
+        logger.warning("⚠️ Redis unavailable, %d keys deleted from the local fallback store only", len(keys))
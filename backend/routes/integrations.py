@@ -1,23 +1,193 @@
-from fastapi import APIRouter, HTTPException, Request, Form
-from typing import Dict, Any
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request, Form, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, Any, List, Optional, Union
+from pydantic import BaseModel, Field
+import hashlib
 import logging
 import json
-from cache import cache, Cache
-from integrations.hubspot import get_items_hubspot, authorize_hubspot, get_hubspot_credentials
-from integrations.notion import get_items_notion, authorize_notion, get_notion_credentials
-from integrations.airtable import get_items_airtable, authorize_airtable, get_airtable_credentials
+from cache import cache, Cache, CustomJSONEncoder, encode_entry, merge_changes
+from integrations.registry import get_integration
+from integrations.middleware import track_integration_connection
+import export
+from analytics import dataset_analytics
+from scheduler import set_tenant, reset_tenant
+from usage import usage_meter
 from redis_client import delete_key_redis, get_value_redis, add_key_value_redis
-from datetime import datetime
+from token_manager import token_manager
+from credential_store import credential_store
+from webhooks import unregister_webhook_tenant
+from datetime import datetime, timedelta, timezone
+from deadline import DeadlineExceeded, PartialResult, set_deadline, reset_deadline, within_deadline
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# A delta touching more than this share of the dataset is sent as a full payload instead
+DELTA_MAX_CHANGED_FRACTION = 0.5
+
 class CredentialsModel(BaseModel):
-    credentials: Dict[str, Any]
+    # Loads reference server-side credentials by handle; inline credentials are still accepted
+    credentials: Optional[Dict[str, Any]] = None
+    handle: Optional[str] = None
+
+class AirtableRecordsModel(CredentialsModel):
+    tables: List[str]  # "baseId/tableId"
+    fields: Optional[List[str]] = None
+    filter_by_formula: Optional[str] = None
+    raw: bool = False
+
+class NotionDatabaseQueryModel(CredentialsModel):
+    databases: List[Union[str, Dict[str, Any]]]  # ids, or {"database_id", "filter", "sorts"}
+    filter: Optional[Dict[str, Any]] = None  # Notion filter object for every database
+    sorts: Optional[List[Dict[str, Any]]] = None
+    raw: bool = False
+
+class HubSpotFilterModel(BaseModel):
+    property: str
+    operator: str = "EQ"  # HubSpot's filter operators: EQ, GT, BETWEEN, IN, HAS_PROPERTY, ...
+    value: Optional[Any] = None
+    values: Optional[List[Any]] = None  # IN / NOT_IN
+    high_value: Optional[Any] = None  # BETWEEN
+
+class HubSpotSortModel(BaseModel):
+    property: str
+    direction: str = "ASCENDING"
+
+class HubSpotSearchModel(CredentialsModel):
+    filters: List[HubSpotFilterModel] = []  # All must match
+    filter_groups: Optional[List[List[HubSpotFilterModel]]] = None  # Any group must match; replaces filters
+    sorts: List[HubSpotSortModel] = []
+    properties: Optional[List[str]] = None  # The object type's default properties when omitted
+    limit: int = Field(100, ge=1, le=10000)
+    cursor: Optional[str] = None
+
+class AnalyticsMetricModel(BaseModel):
+    op: str = "count"  # count, sum, mean, min or max
+    field: Optional[str] = None  # Required except for a plain row count
+
+class AnalyticsHistogramModel(BaseModel):
+    field: str
+    bins: int = Field(10, ge=1, le=1000)
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class AnalyticsModel(CredentialsModel):
+    where: Optional[Dict[str, Any]] = None  # field: value or [values]
+    group_by: List[str] = []
+    metrics: List[AnalyticsMetricModel] = []
+    histogram: Optional[AnalyticsHistogramModel] = None
+    limit: int = Field(100, ge=1, le=10000)  # Groups returned, largest first
+
+class ExportModel(CredentialsModel):
+    fields: Optional[List[str]] = None  # Columns to export, in order; all columns by default
+
+class AirtableSchemaInvalidationModel(BaseModel):
+    base_ids: List[str]
+
+def cached_response(request: Request, entry: Dict[str, bytes]) -> Response:
+    """
+    Serve a cache entry with its ETag. A matching If-None-Match gets a bodyless 304,
+    otherwise the stored compressed variant is sent when the client accepts it.
+    Chunked entries are streamed from Redis a few chunks at a time.
+    """
+    etag = entry['etag'].decode('utf-8')
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if 'version' in entry:
+        headers["X-Data-Version"] = entry['version'].decode('utf-8')
+    if Cache.is_stale(entry):
+        headers["X-Data-Stale"] = "true"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers=headers)
+
+    if cache.is_chunked(entry):
+        return StreamingResponse(cache.iter_body(entry), media_type="application/json", headers=headers)
+    accept_encoding = request.headers.get("accept-encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in entry and encoding in accept_encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(entry[encoding], media_type="application/json", headers=headers)
+    return Response(entry['body'], media_type="application/json", headers=headers)
+
+async def delta_response(
+    request: Request,
+    integration_type: str,
+    api_type: Optional[str],
+    credentials: Dict[str, Any],
+    entry: Dict[str, bytes],
+    since_version: int
+) -> Response:
+    """
+    Answer a load from a client holding version since_version with just the items added
+    and changed since then plus the ids removed. Falls back to the full payload when the
+    history no longer reaches back that far or most of the dataset changed.
+    """
+    if 'version' not in entry:
+        return cached_response(request, entry)
+    version = int(entry['version'])
+    delta = {'added': [], 'changed': [], 'removed': []}
+    if since_version != version:
+        changes = await cache.get_changes(cache_key_for(integration_type, api_type), credentials, since_version)
+        if changes is None or changes[-1]['version'] != version:
+            return cached_response(request, entry)
+        delta = merge_changes(changes)
+
+    data = json.loads(await cache.read_body(entry)) if delta['added'] or delta['changed'] else {}
+    items = (data.get('items') if isinstance(data, dict) else data) or []
+    if len(delta['added']) + len(delta['changed']) > DELTA_MAX_CHANGED_FRACTION * max(len(items), 1):
+        return cached_response(request, entry)
+
+    by_id = {str(item['id']): item for item in items}
+    body = {
+        'delta': True,
+        'version': version,
+        'since_version': since_version,
+        'added': [by_id[item_id] for item_id in delta['added']],
+        'changed': [by_id[item_id] for item_id in delta['changed']],
+        'removed': delta['removed'],
+    }
+    return Response(json.dumps(body), media_type="application/json", headers={"X-Data-Version": str(version)})
+
+async def window_response(entry: Dict[str, bytes], offset: int, limit: Optional[int]) -> Response:
+    """
+    A page of a cached dataset's items with the total item count. Only the chunks
+    holding the page are read from a chunked entry.
+    """
+    stop = offset + limit if limit is not None else None
+    body = {
+        'items': [item async for item in cache.iter_items(entry, offset, stop)],
+        'offset': offset,
+        'total': cache.item_count(entry),
+    }
+    headers = {"ETag": entry['etag'].decode('utf-8')}
+    if 'version' in entry:
+        headers["X-Data-Version"] = entry['version'].decode('utf-8')
+    return Response(json.dumps(body), media_type="application/json", headers=headers)
+
+async def resolve_credentials(body: CredentialsModel) -> Dict[str, Any]:
+    """Credentials referenced by handle win over credentials posted inline"""
+    if body.handle:
+        return await credential_store.resolve(body.handle)
+    if body.credentials:
+        return body.credentials
+    raise HTTPException(status_code=400, detail="Either handle or credentials is required")
+
+def request_deadline_ms(request: Request, deadline_ms: Optional[int]) -> Optional[int]:
+    """The caller's deadline from deadline_ms or the X-Request-Deadline-Ms header, if any"""
+    deadline_ms = deadline_ms or request.headers.get("x-request-deadline-ms")
+    if deadline_ms is None:
+        return None
+    try:
+        deadline_ms = int(deadline_ms)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid deadline: {deadline_ms}")
+    if deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="The deadline must be a positive number of milliseconds")
+    return deadline_ms
 
 @router.post("/{integration_type}/load")
 async def load_integration_data(
@@ -25,67 +195,134 @@ async def load_integration_data(
     integration_type: str,
     credentials: CredentialsModel,
     force: bool = False,
-    api_type: str = None  # New parameter for HubSpot API type
+    api_type: str = None,  # New parameter for HubSpot API type
+    cursor: str = None,
+    deadline_ms: int = None,
+    since_version: int = None,
+    offset: int = Query(None, ge=0),
+    limit: int = Query(None, ge=1)
 ):
-    """Load integration data with caching"""
+    """
+    Load integration data with caching, within the caller's deadline (deadline_ms or the
+    X-Request-Deadline-Ms header). If the deadline passes mid-crawl, the items fetched so far
+    are returned uncached with partial=true and a cursor to resume from.
+    Clients that pass since_version (from the X-Data-Version header) get only what changed,
+    and clients that pass offset and/or limit get just that page of the items.
+    """
+    deadline_ms = request_deadline_ms(request, deadline_ms)
+    token = set_deadline(deadline_ms / 1000 if deadline_ms else None)
     try:
-        # Debug logs
-        logger.debug(f"Integration type: {integration_type}")
-        logger.debug(f"Force refresh: {force}")
-        logger.debug(f"API type: {api_type}")
-        logger.debug(f"Credentials received: {credentials.credentials}")
-        
-        # Convert credentials to JSON string for HubSpot
-        creds_str = json.dumps(credentials.credentials)
-        
-        # Create cache key that includes the API type for HubSpot
-        cache_key = f"{integration_type}_{api_type}" if integration_type == "hubspot" and api_type else integration_type
-        
+        logger.debug("Loading %s (api_type=%s, force=%s)", integration_type, api_type, force)
+        resolved_credentials = await resolve_credentials(credentials)
+
+        if cursor:
+            # Resumed crawls continue a partial result, which is never cached
+            data = await load_data_from_integration(integration_type, json.dumps(resolved_credentials), api_type, cursor)
+            return Response(json.dumps(data, cls=CustomJSONEncoder), media_type="application/json")
+
         # If not forcing refresh, try to get cached data first
         if not force:
-            cached_data = await cache.get_data(cache_key, credentials.credentials)
-            if cached_data:
+            try:
+                cached_entry = await within_deadline(
+                    cache.get_entry(cache_key_for(integration_type, api_type), resolved_credentials)
+                )
+            except DeadlineExceeded:
+                cached_entry = None
+            if cached_entry:
                 logger.debug("Returning cached data")
-                return cached_data
+                usage_meter.record_cache_hit(scheduler_tenant(resolved_credentials), integration_type)
+                if offset is not None or limit is not None:
+                    return await window_response(cached_entry, offset or 0, limit)
+                if since_version is not None:
+                    return await delta_response(
+                        request, integration_type, api_type, resolved_credentials, cached_entry, since_version
+                    )
+                return cached_response(request, cached_entry)
 
-        # Load fresh data from integration
-        logger.debug("Loading fresh data from integration")
-        data = await load_data_from_integration(integration_type, creds_str, api_type)  # Pass api_type
-        
-        # Cache the fresh data
-        logger.debug("Caching fresh data")
-        await cache.set_data(cache_key, credentials.credentials, data)
-        
-        return data
+        entry = await fetch_and_cache(integration_type, resolved_credentials, api_type)
+        if offset is not None or limit is not None:
+            return await window_response(entry, offset or 0, limit)
+        if since_version is not None:
+            return await delta_response(request, integration_type, api_type, resolved_credentials, entry, since_version)
+        return cached_response(request, entry)
+    except PartialResult as partial:
+        logger.info("Deadline exceeded loading %s, returning partial result", integration_type)
+        data = partial.data if isinstance(partial.data, dict) else {'items': partial.data}
+        body = {**data, 'partial': True, 'cursor': partial.cursor}
+        return Response(json.dumps(body, cls=CustomJSONEncoder), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in load_integration_data: {str(e)}")
+        logger.error("Error in load_integration_data: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        reset_deadline(token)
+
+def cache_key_for(integration_type: str, api_type: str = None) -> str:
+    """Create cache key that includes the API type for integrations that serve several object types"""
+    if api_type and get_integration(integration_type).api_types:
+        return f"{integration_type}_{api_type}"
+    return integration_type
+
+def budget_exceeded(tenant_id: str) -> HTTPException:
+    # Budgets are per UTC day, so the caller can retry at midnight
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return HTTPException(
+        status_code=429,
+        detail=f"Provider request budget exhausted for {tenant_id} today",
+        headers={"Retry-After": str(int((midnight - now).total_seconds()) + 1)}
+    )
+
+async def fetch_and_cache(integration_type: str, credentials: Dict[str, Any], api_type: str = None) -> Dict[str, bytes]:
+    """
+    Load fresh data from the integration and cache it, returning the cache entry as
+    stored, so a large dataset comes back as its chunk manifest rather than its body.
+    Orgs over their request budget get the cached entry instead, even a stale one.
+    """
+    tenant_id = scheduler_tenant(credentials)
+    if usage_meter.over_budget(tenant_id):
+        entry = await cache.get_entry(cache_key_for(integration_type, api_type), credentials, allow_stale=True)
+        if entry is None:
+            raise budget_exceeded(tenant_id)
+        logger.info("%s is over its request budget, serving cached %s data", tenant_id, integration_type)
+        usage_meter.record_downgrade(integration_type)
+        return entry
+
+    logger.debug("Loading fresh data from integration")
+    data = await load_data_from_integration(integration_type, json.dumps(credentials), api_type)
 
-async def load_data_from_integration(integration_type: str, credentials: str, api_type: str = None):
-    """Load fresh data from integration"""
+    # Cache the fresh data; the ETag and compressed bodies are computed once here
+    logger.debug("Caching fresh data")
+    entry = encode_entry(data)
+    stored = await cache.set_entry(
+        cache_key_for(integration_type, api_type),
+        credentials,
+        entry,
+        tags=Cache.tags_for(credentials, integration_type, api_type)
+    )
+    return stored or entry
+
+def scheduler_tenant(credentials: Dict[str, Any]) -> str:
+    """Provider requests are shared out fairly per org; inline credentials count as their own tenant"""
+    return credentials.get('org_id') or Cache.tenant_scope(credentials)
+
+async def load_data_from_integration(integration_type: str, credentials: str, api_type: str = None, cursor: str = None):
+    """Load fresh data from integration, resuming from `cursor` when given"""
+    tenant_id = scheduler_tenant(json.loads(credentials))
+    if usage_meter.over_budget(tenant_id):
+        raise budget_exceeded(tenant_id)
+    tenant_token = set_tenant(tenant_id)
     try:
-        logger.debug(f"Loading data for integration: {integration_type}")
-        logger.debug(f"Using credentials: {credentials}")
-        logger.debug(f"API type: {api_type}")
-        
-        if integration_type == "hubspot":
-            if not api_type:
-                raise HTTPException(status_code=400, detail="API type is required for HubSpot integration")
-            if api_type not in ["contacts", "companies", "deals", "tickets"]:
-                raise HTTPException(status_code=400, detail=f"Unsupported HubSpot API type: {api_type}")
-            return await get_items_hubspot(credentials, api_type)  # Pass api_type to HubSpot function
-        elif integration_type == "notion":
-            return await get_items_notion(credentials)
-        elif integration_type == "airtable":
-            return await get_items_airtable(credentials)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported integration type: {integration_type}"
-            )
+        logger.debug("Loading data for integration: %s (api_type=%s)", integration_type, api_type)
+        return await get_integration(integration_type).load(credentials, api_type, cursor)
+    except PartialResult:
+        raise
     except Exception as e:
-        logger.error(f"Error in load_data_from_integration: {str(e)}")
-        raise 
+        logger.error("Error in load_data_from_integration: %s", e)
+        raise
+    finally:
+        reset_tenant(tenant_token)
 
 @router.post("/notion/load")
 async def load_notion_data(credentials: str = Form(...)):
@@ -98,17 +335,268 @@ async def load_notion_data(credentials: str = Form(...)):
             logger.debug("Returning cached Notion data")
             return cached_data
 
-        logger.debug(f"Using credentials: {credentials}")
-        items = await get_items_notion(credentials)
+        items = await get_integration("notion").load(credentials)
         
         # Cache the results
-        await cache.set_data("notion", json.loads(credentials), items)
+        await cache.set_data("notion", json.loads(credentials), items, tags=Cache.tags_for(json.loads(credentials), "notion"))
         
         return items
     except Exception as e:
         logger.error("Error in load_notion_data:", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def records_within_deadline(records):
+    """Yield from `records`, waiting for each one only as long as the request deadline allows"""
+    try:
+        while True:
+            try:
+                yield await within_deadline(records.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        await records.aclose()
+
+def ndjson_response(records, tenant_id: str, deadline_ms: Optional[int], label: str) -> StreamingResponse:
+    """
+    Stream the rows `records()` yields as NDJSON, attributed to the tenant and bounded by
+    the caller's deadline if they sent one. A provider error or the deadline passing ends
+    the stream with an {"error", "status"} record, so it cannot pass for a complete result.
+    """
+    async def ndjson():
+        # Set here rather than in the handler, since the stream outlives it
+        tenant_token = set_tenant(tenant_id)
+        deadline_token = set_deadline(deadline_ms / 1000) if deadline_ms else None
+        try:
+            async for record in records():
+                yield json.dumps(record, cls=CustomJSONEncoder) + "\n"
+        except DeadlineExceeded:
+            logger.info("Deadline exceeded streaming %s", label)
+            yield json.dumps({"error": "Deadline exceeded", "status": 504}) + "\n"
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail, "status": e.status_code}) + "\n"
+        except Exception as e:
+            logger.error("Error streaming %s: %s", label, e)
+            yield json.dumps({"error": str(e), "status": 500}) + "\n"
+        finally:
+            if deadline_token is not None:
+                reset_deadline(deadline_token)
+            reset_tenant(tenant_token)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+async def collect_records(records, tenant_id: str, deadline_ms: Optional[int], label: str) -> list:
+    """Collect the rows `records()` yields within the request deadline, attributed to the tenant"""
+    tenant_token = set_tenant(tenant_id)
+    deadline_token = set_deadline(deadline_ms / 1000 if deadline_ms else None)
+    try:
+        return [record async for record in records()]
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail=f"Deadline exceeded loading {label}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error loading %s: %s", label, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        reset_deadline(deadline_token)
+        reset_tenant(tenant_token)
+
+@router.post("/airtable/records")
+async def load_airtable_records(
+    request: Request,
+    body: AirtableRecordsModel,
+    stream: bool = False,
+    deadline_ms: int = None
+):
+    """
+    Load records for the selected Airtable tables within the caller's deadline (deadline_ms
+    or the X-Request-Deadline-Ms header), optionally streamed as NDJSON. Streams are only
+    bounded by a deadline the caller sends, and end with an {"error", "status"} record
+    if the provider fails or the deadline passes mid-stream.
+    """
+    credentials = await resolve_credentials(body)
+    tenant_id = scheduler_tenant(credentials)
+    # Record loads are not cached, so there is nothing to fall back on over budget
+    if usage_meter.over_budget(tenant_id):
+        raise budget_exceeded(tenant_id)
+    deadline_ms = request_deadline_ms(request, deadline_ms)
+
+    def records():
+        return records_within_deadline(get_integration("airtable").hook("stream_records")(
+            credentials,
+            body.tables,
+            fields=body.fields,
+            filter_by_formula=body.filter_by_formula,
+            raw=body.raw,
+        ))
+
+    if stream:
+        return ndjson_response(records, tenant_id, deadline_ms, "Airtable records")
+    return await collect_records(records, tenant_id, deadline_ms, "Airtable records")
+
+@router.post("/notion/databases/query")
+async def query_notion_databases(
+    request: Request,
+    body: NotionDatabaseQueryModel,
+    stream: bool = False,
+    force: bool = False,
+    deadline_ms: int = None
+):
+    """
+    Load the rows of the selected Notion databases within the caller's deadline, optionally
+    streamed as NDJSON. Filters and sorts run in Notion. Buffered results are cached per
+    query like other loads; streamed ones are not, so rows are never held for the cache.
+    Streams end with an {"error", "status"} record like Airtable record streams.
+    """
+    credentials = await resolve_credentials(body)
+    tenant_id = scheduler_tenant(credentials)
+    deadline_ms = request_deadline_ms(request, deadline_ms)
+    query = json.dumps(body.dict(include={'databases', 'filter', 'sorts', 'raw'}), sort_keys=True)
+    dataset = f"notion_databases_{hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]}"
+
+    # Orgs over their request budget get the cached rows instead, even stale ones
+    over_budget = usage_meter.over_budget(tenant_id)
+    entry = None
+    if over_budget or not force:
+        entry = await cache.get_entry(dataset, credentials, allow_stale=over_budget)
+    if entry:
+        usage_meter.record_cache_hit(tenant_id, "notion")
+        if over_budget:
+            usage_meter.record_downgrade("notion")
+        if not stream:
+            return cached_response(request, entry)
+        async def cached_ndjson():
+            async for row in cache.iter_items(entry):
+                yield json.dumps(row) + "\n"
+        return StreamingResponse(cached_ndjson(), media_type="application/x-ndjson")
+    if over_budget:
+        raise budget_exceeded(tenant_id)
+
+    def rows():
+        return records_within_deadline(get_integration("notion").hook("stream_database_rows")(
+            credentials,
+            body.databases,
+            filter=body.filter,
+            sorts=body.sorts,
+            raw=body.raw,
+        ))
+
+    if stream:
+        return ndjson_response(rows, tenant_id, deadline_ms, "Notion database rows")
+
+    entry = encode_entry(await collect_records(rows, tenant_id, deadline_ms, "Notion database rows"))
+    await cache.set_entry(dataset, credentials, entry, tags=Cache.tags_for(credentials, "notion", "databases"))
+    return cached_response(request, entry)
+
+@router.post("/hubspot/search")
+async def search_hubspot(request: Request, api_type: str, body: HubSpotSearchModel, force: bool = False):
+    """
+    HubSpot objects of one type matching the filters, sorted and limited. A fresh cached
+    load of the type answers locally when it holds every object and every property
+    involved; otherwise the query is pushed down to HubSpot's Search API, which only
+    returns the matches.
+    """
+    hubspot = get_integration("hubspot")
+    if api_type not in hubspot.api_types:
+        raise HTTPException(status_code=400, detail=f"Unsupported HubSpot API type: {api_type}")
+    credentials = await resolve_credentials(body)
+    tenant_id = scheduler_tenant(credentials)
+    if body.filter_groups is not None:
+        filter_groups = [[search_filter.dict() for search_filter in group] for group in body.filter_groups]
+    else:
+        filter_groups = [[search_filter.dict() for search_filter in body.filters]] if body.filters else []
+    query = (api_type, filter_groups, [sort.dict() for sort in body.sorts], body.properties, body.limit, body.cursor)
+
+    # Orgs over their request budget are answered from the cached load, even a stale one
+    over_budget = usage_meter.over_budget(tenant_id)
+    if over_budget or not force:
+        entry = await cache.get_entry(cache_key_for("hubspot", api_type), credentials, allow_stale=over_budget)
+        # A load cut short by the page cap would silently miss matches
+        if entry and cache.envelope(entry).get('complete') is True:
+            items = [item async for item in cache.iter_items(entry)]
+            result = hubspot.hook("search_snapshot")(items, *query)
+            if result is not None:
+                usage_meter.record_cache_hit(tenant_id, "hubspot")
+                headers = {"X-Data-Source": "cache"}
+                if Cache.is_stale(entry):
+                    usage_meter.record_downgrade("hubspot")
+                    headers["X-Data-Stale"] = "true"
+                return Response(json.dumps(result), media_type="application/json", headers=headers)
+    if over_budget:
+        raise budget_exceeded(tenant_id)
+
+    tenant_token = set_tenant(tenant_id)
+    try:
+        result = await hubspot.hook("search")(credentials, *query)
+    finally:
+        reset_tenant(tenant_token)
+    return Response(json.dumps(result), media_type="application/json", headers={"X-Data-Source": "search"})
+
+@router.post("/airtable/schema/invalidate")
+async def invalidate_airtable_schema(body: AirtableSchemaInvalidationModel):
+    """Drop cached Airtable table schemas for the given bases"""
+    if not await get_integration("airtable").hook("invalidate_schemas")(body.base_ids):
+        raise HTTPException(status_code=500, detail="Failed to invalidate Airtable schemas")
+    logger.info("Invalidated Airtable schemas for %s bases", len(body.base_ids))
+    return {"status": "success", "invalidated": body.base_ids}
+
+@router.post("/{integration_type}/export")
+async def export_integration_data(
+    integration_type: str,
+    body: ExportModel,
+    export_format: str = Query("csv", alias="format"),
+    force: bool = False,
+    api_type: str = None
+):
+    """
+    Stream a dataset as CSV or Parquet. The cached snapshot is used when present,
+    otherwise the integration is crawled and cached first.
+    """
+    if export.pa is None:
+        raise HTTPException(status_code=501, detail="Exports require pyarrow")
+    if export_format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {export_format}")
+
+    resolved_credentials = await resolve_credentials(body)
+    entry = None if force else await cache.get_entry(cache_key_for(integration_type, api_type), resolved_credentials)
+    if not entry:
+        entry = await fetch_and_cache(integration_type, resolved_credentials, api_type)
+
+    media_type, extension = export.EXPORT_FORMATS[export_format]
+    filename = f"{cache_key_for(integration_type, api_type)}_{datetime.utcnow():%Y-%m-%d_%H-%M}.{extension}"
+    items = cache.iter_items(entry) if cache.is_chunked(entry) else export.iter_cached_items(entry['body'])
+    return StreamingResponse(
+        export.export_items(items, export_format, body.fields),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/{integration_type}/analytics")
+async def query_integration_analytics(integration_type: str, body: AnalyticsModel, api_type: str = None):
+    """
+    Group-by aggregates and histograms over the cached dataset, computed server-side so
+    no rows go to the client. The dataset is crawled and cached first if needed.
+    """
+    # Airtable records are streamed rather than cached, and the cached Airtable dataset is
+    # only base and table metadata, so there is nothing meaningful to aggregate
+    if integration_type.lower() == "airtable":
+        raise HTTPException(status_code=400, detail="Analytics are not available for Airtable records")
+    resolved_credentials = await resolve_credentials(body)
+    entry = await cache.get_entry(cache_key_for(integration_type, api_type), resolved_credentials)
+    if not entry:
+        entry = await fetch_and_cache(integration_type, resolved_credentials, api_type)
+
+    async def load_items():
+        return [item async for item in cache.iter_items(entry)]
+
+    # The ETag changes with the content, so each cached version gets its own frame
+    version = (Cache.tenant_scope(resolved_credentials), cache_key_for(integration_type, api_type), entry['etag'])
+    query = body.dict(include={'where', 'group_by', 'metrics', 'histogram', 'limit'})
+    result = await dataset_analytics.query(version, query, load_items)
+    headers = {"ETag": entry['etag'].decode('utf-8')}
+    if 'version' in entry:
+        headers["X-Data-Version"] = entry['version'].decode('utf-8')
+    return Response(json.dumps(result), media_type="application/json", headers=headers)
+
 @router.post("/disconnect/{integration_type}")
 async def disconnect_integration(integration_type: str, request: Request):
     user_id = request.query_params.get('user_id')
@@ -118,7 +606,7 @@ async def disconnect_integration(integration_type: str, request: Request):
         raise HTTPException(status_code=400, detail="Missing user_id or org_id")
     
     try:
-        logger.info(f"Starting disconnection process for {integration_type} (user: {user_id}, org: {org_id})")
+        logger.info("Starting disconnection process for %s (user: %s, org: %s)", integration_type, user_id, org_id)
         
         # Clear all related Redis keys
         keys_to_clear = [
@@ -126,47 +614,55 @@ async def disconnect_integration(integration_type: str, request: Request):
             f"{integration_type.lower()}_connection:{org_id}:{user_id}",
             f"{integration_type.lower()}_token:{org_id}:{user_id}",
             f"{integration_type.lower()}_refresh_token:{org_id}:{user_id}",
-            f"{integration_type.lower()}_connection_time:{org_id}:{user_id}"
+            f"{integration_type.lower()}_connection_time:{org_id}:{user_id}",
+            f"integration_connection:{integration_type.lower()}:{org_id}:{user_id}"
         ]
         
         for key in keys_to_clear:
             await delete_key_redis(key)
-            logger.info(f"Removed Redis key: {key}")
+            logger.info("Removed Redis key: %s", key)
+        await token_manager.forget(integration_type.lower(), org_id, user_id)
+        await credential_store.delete(integration_type, org_id, user_id)
+        await unregister_webhook_tenant(integration_type.lower(), org_id, user_id)
         
-        # Clear the cache for this integration
-        dummy_credentials = {"user_id": user_id, "org_id": org_id}
-        await cache.delete_data(integration_type.lower(), dummy_credentials)
-        logger.info(f"Cleared cache for {integration_type}")
+        # Evict every cached dataset of this integration for the tenant, including api_type variants
+        tenant = {"user_id": user_id, "org_id": org_id}
+        evicted = await cache.invalidate_tags([Cache.integration_tag(tenant, integration_type.lower())])
+        logger.info("Cleared %s cache entries for %s", evicted, integration_type)
         
-        logger.info(f"Successfully disconnected {integration_type}")
+        logger.info("Successfully disconnected %s", integration_type)
         return {"status": "success", "message": f"Disconnected {integration_type} successfully"}
     except Exception as e:
-        logger.error(f"Error during disconnection: {str(e)}")
+        logger.error("Error during disconnection: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) 
 
+@router.post("/{integration_type}/authorize")
+async def authorize_integration(integration_type: str, user_id: str = Form(...), org_id: str = Form(...)):
+    """Start the provider's OAuth flow and return the URL to open"""
+    authorize = get_integration(integration_type).hook("authorize")
+    return await track_integration_connection(integration_type.lower())(authorize)(user_id=user_id, org_id=org_id)
+
+@router.get("/{integration_type}/oauth2callback")
+async def oauth2callback_integration(integration_type: str, request: Request):
+    return await get_integration(integration_type).hook("oauth_callback")(request)
+
 @router.post("/{integration_type}/credentials")
 async def get_integration_credentials(
     integration_type: str,
     user_id: str = Form(...),
     org_id: str = Form(...)
 ):
-    logger.info(f"Getting {integration_type} credentials for user {user_id} in org {org_id}")
+    logger.info("Getting %s credentials for user %s in org %s", integration_type, user_id, org_id)
     
     try:
-        # Get credentials based on integration type
-        if integration_type.lower() == 'notion':
-            credentials = await get_notion_credentials(user_id, org_id)
-        elif integration_type.lower() == 'hubspot':
-            credentials = await get_hubspot_credentials(user_id, org_id)
-        elif integration_type.lower() == 'airtable':
-            credentials = await get_airtable_credentials(user_id, org_id)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid integration type")
+        credentials = await get_integration(integration_type).hook("credentials")(user_id, org_id)
 
         if credentials:
-            # Store credentials in Redis
-            credentials_key = f"{integration_type.lower()}_credentials:{org_id}:{user_id}"
-            await add_key_value_redis(credentials_key, json.dumps(credentials))
+            # Keep credentials server-side; loads reference them by handle
+            handle = await credential_store.save(integration_type, org_id, user_id, credentials)
+            # A re-auth may point at a different account, so drop anything cached for the old one
+            tenant = {"user_id": user_id, "org_id": org_id}
+            await cache.invalidate_tags([Cache.integration_tag(tenant, integration_type.lower())])
             
             # Store connection info with timestamp
             connection_info = {
@@ -178,19 +674,19 @@ async def get_integration_credentials(
             connection_key = f"{integration_type.lower()}_connection:{org_id}:{user_id}"
             await add_key_value_redis(connection_key, json.dumps(connection_info))
             
-            logger.info(f"✅ Stored {integration_type} credentials and connection info")
-            return credentials
+            logger.info("✅ Stored %s credentials and connection info", integration_type)
+            return credential_store.describe(credentials, handle)
         else:
             logger.error("❌ No credentials found")
             raise HTTPException(status_code=404, detail="No credentials found")
             
     except Exception as e:
-        logger.error(f"❌ Error getting credentials: {str(e)}")
+        logger.error("❌ Error getting credentials: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/connection-info/{integration_type}")
 async def get_connection_info(integration_type: str, user_id: str, org_id: str):
-    logger.info(f"🔍 Checking connection info for {integration_type}")
+    logger.debug("🔍 Checking connection info for %s", integration_type)
     
     try:
         # Check for credentials
@@ -201,30 +697,33 @@ async def get_connection_info(integration_type: str, user_id: str, org_id: str):
         connection_key = f"{integration_type.lower()}_connection:{org_id}:{user_id}"
         connection_data = await get_value_redis(connection_key)
         
-        logger.info(f"Checking keys - Credentials: {credentials_key}, Connection: {connection_key}")
+        logger.debug("Checking keys - Credentials: %s, Connection: %s", credentials_key, connection_key)
         
         if credentials_data:
             credentials = json.loads(credentials_data)
+            handle = await credential_store.get_handle(integration_type, org_id, user_id)
+            if not handle:
+                handle = await credential_store.save(integration_type, org_id, user_id, credentials)
             connection = json.loads(connection_data) if connection_data else {
                 "connected_at": datetime.utcnow().isoformat()
             }
             
-            logger.info(f"✅ Found valid connection for {integration_type}")
+            logger.info("✅ Found valid connection for %s", integration_type)
             return {
                 "integration": integration_type,
                 "connected": True,
                 "connected_at": connection.get("connected_at"),
-                "credentials": credentials
+                "credentials": credential_store.describe(credentials, handle)
             }
         
-        logger.info(f"❌ No valid connection found for {integration_type}")
+        logger.debug("❌ No valid connection found for %s", integration_type)
         return {
             "integration": integration_type,
             "connected": False
         }
             
     except Exception as e:
-        logger.error(f"❌ Error checking connection: {str(e)}")
+        logger.error("❌ Error checking connection: %s", e)
         return {
             "integration": integration_type,
             "connected": False
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import logging
+from cache import cache
+from jobs import job_runner, TERMINAL_STATUSES
+from usage import usage_meter
+from routes.integrations import CredentialsModel, resolve_credentials, cache_key_for, fetch_and_cache, cached_response, scheduler_tenant
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# How often the SSE stream polls job state
+EVENTS_POLL_INTERVAL = 0.5
+
+@router.post("/{integration_type}/load")
+async def submit_load_job(
+    integration_type: str,
+    credentials: CredentialsModel,
+    force: bool = False,
+    api_type: str = None
+):
+    """Queue a load and return its job id instead of crawling inline"""
+    resolved_credentials = await resolve_credentials(credentials)
+
+    async def run():
+        if not force:
+            cached_entry = await cache.get_entry(cache_key_for(integration_type, api_type), resolved_credentials)
+            if cached_entry:
+                usage_meter.record_cache_hit(scheduler_tenant(resolved_credentials), integration_type)
+                return cached_entry
+        return await fetch_and_cache(integration_type, resolved_credentials, api_type)
+
+    job_id = await job_runner.submit(run, integration=integration_type, api_type=api_type or '')
+    logger.info("Queued %s load job %s", integration_type, job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/{job_id}")
+async def get_load_job(job_id: str):
+    """Job status and progress (pages fetched, items converted, ETA)"""
+    state = await job_runner.get(job_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, **state}
+
+@router.get("/{job_id}/result")
+async def get_load_job_result(job_id: str, request: Request):
+    """Final payload of a finished job, streamed from the cache like a cached load"""
+    state = await job_runner.get(job_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if state['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=state.get('error'))
+    entry = await job_runner.get_result(job_id)
+    if not entry:
+        if state['status'] == 'done':
+            raise HTTPException(status_code=410, detail="Job result has expired, submit the load again")
+        raise HTTPException(status_code=409, detail=f"Job is {state['status']}")
+    return cached_response(request, entry)
+
+@router.get("/{job_id}/events")
+async def stream_load_job_events(job_id: str, request: Request):
+    """Server-sent events with the job state whenever it changes, until the job finishes"""
+    if not await job_runner.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_state = None
+        while not await request.is_disconnected():
+            state = await job_runner.get(job_id)
+            if state is None:
+                return
+            if state != last_state:
+                last_state = state
+                yield f"event: {state['status']}\ndata: {json.dumps({'job_id': job_id, **state})}\n\n"
+            if state['status'] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Request
+import json
+import logging
+from webhooks import (
+    webhook_processor, verify_hubspot_signature, verify_notion_signature, verify_airtable_signature,
+    get_airtable_webhook, public_url
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Webhook endpoints only verify and enqueue; events are applied in debounced batches
+
+@router.post("/hubspot")
+async def hubspot_webhook(request: Request):
+    body = await request.body()
+    if not verify_hubspot_signature(
+        request.method,
+        # HubSpot signs the URL it called, not the one a TLS-terminating proxy forwards to
+        public_url(request.url.path, request.url.query) or str(request.url),
+        body,
+        request.headers.get("x-hubspot-signature-v3"),
+        request.headers.get("x-hubspot-request-timestamp"),
+    ):
+        raise HTTPException(status_code=401, detail="Invalid HubSpot signature")
+    events = json.loads(body)
+    webhook_processor.enqueue("hubspot", events if isinstance(events, list) else [events])
+    return {"status": "accepted"}
+
+@router.post("/notion")
+async def notion_webhook(request: Request):
+    body = await request.body()
+    payload = json.loads(body)
+    # Notion sends an unsigned verification token once when the subscription is created
+    if "verification_token" in payload:
+        logger.info("Received Notion webhook verification token; set NOTION_WEBHOOK_VERIFICATION_TOKEN to it")
+        return {"status": "accepted"}
+    if not verify_notion_signature(body, request.headers.get("x-notion-signature")):
+        raise HTTPException(status_code=401, detail="Invalid Notion signature")
+    webhook_processor.enqueue("notion", [payload])
+    return {"status": "accepted"}
+
+@router.post("/airtable")
+async def airtable_webhook(request: Request):
+    body = await request.body()
+    try:
+        notification = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Airtable notification")
+    # Each base's webhook has its own MAC secret, handed out when the webhook was created
+    webhook = await get_airtable_webhook(notification.get("base", {}).get("id"))
+    if (
+        not webhook
+        or webhook["id"] != notification.get("webhook", {}).get("id")
+        or not verify_airtable_signature(body, request.headers.get("x-airtable-content-mac"), webhook["mac_secret"])
+    ):
+        raise HTTPException(status_code=401, detail="Invalid Airtable signature")
+    webhook_processor.enqueue("airtable", [notification])
+    return {"status": "accepted"}
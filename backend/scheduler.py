@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from metrics import SCHEDULER_QUEUE_WAIT, SCHEDULER_QUEUED, SCHEDULER_IN_FLIGHT
+
+# Provider requests in flight per worker, shared by all tenants
+OUTBOUND_CONCURRENCY = int(os.getenv('OUTBOUND_CONCURRENCY', '32'))
+# Optional per-tenant shares, e.g. "org_big=0.5,org_vip=2"; tenants default to 1
+SCHEDULER_TENANT_WEIGHTS = os.getenv('SCHEDULER_TENANT_WEIGHTS', '')
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+# Waiting interactive requests are always served before background ones
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+_tenant = contextvars.ContextVar('scheduler_tenant', default='anonymous')
+_priority = contextvars.ContextVar('scheduler_priority', default=INTERACTIVE)
+
+
+def set_tenant(tenant_id: str) -> contextvars.Token:
+    """Attribute provider requests made from the current task to a tenant"""
+    return _tenant.set(tenant_id)
+
+
+def reset_tenant(token: contextvars.Token):
+    _tenant.reset(token)
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+def set_priority(priority: str) -> contextvars.Token:
+    return _priority.set(priority)
+
+
+def reset_priority(token: contextvars.Token):
+    _priority.reset(token)
+
+
+def _parse_weights(weights: str) -> Dict[str, float]:
+    parsed = {}
+    for pair in filter(None, (pair.strip() for pair in weights.split(','))):
+        tenant_id, _, weight = pair.partition('=')
+        parsed[tenant_id] = float(weight)
+    return parsed
+
+
+class _TenantQueue:
+    __slots__ = ('waiters', 'finish_tag', 'weight')
+
+    def __init__(self, weight: float):
+        self.waiters = {priority: deque() for priority in PRIORITIES}
+        self.finish_tag = 0.0
+        self.weight = weight
+
+
+class FairScheduler:
+    """
+    Shares a fixed budget of outbound provider requests between tenants. Each tenant has
+    its own queue; when a slot frees up it goes to the waiting tenant with the lowest
+    virtual finish tag, which advances by 1/weight per granted request (weighted fair
+    queueing). A tenant crawling thousands of pages therefore takes turns with a tenant
+    that needs one, instead of queueing it behind its whole crawl.
+    """
+    def __init__(self, concurrency: int = OUTBOUND_CONCURRENCY, weights: Optional[Dict[str, float]] = None):
+        self.concurrency = concurrency
+        self.weights = weights if weights is not None else _parse_weights(SCHEDULER_TENANT_WEIGHTS)
+        self._tenants: Dict[str, _TenantQueue] = {}
+        self._in_flight = 0
+        self._waiting = 0
+        self._virtual_time = 0.0
+
+    def _queue(self, tenant_id: str) -> _TenantQueue:
+        queue = self._tenants.get(tenant_id)
+        if queue is None:
+            queue = self._tenants[tenant_id] = _TenantQueue(self.weights.get(tenant_id, 1.0))
+        return queue
+
+    def _grant(self, queue: _TenantQueue):
+        # Tenants returning from idle start at the current virtual time instead of spending saved-up credit
+        start = max(queue.finish_tag, self._virtual_time)
+        self._virtual_time = start
+        queue.finish_tag = start + 1 / queue.weight
+        self._in_flight += 1
+        SCHEDULER_IN_FLIGHT.set(self._in_flight)
+
+    def _next(self):
+        for priority in PRIORITIES:
+            candidates = [queue for queue in self._tenants.values() if queue.waiters[priority]]
+            if candidates:
+                queue = min(candidates, key=lambda queue: max(queue.finish_tag, self._virtual_time))
+                return queue, priority
+        return None, None
+
+    def _dispatch(self):
+        while self._in_flight < self.concurrency and self._waiting:
+            queue, priority = self._next()
+            if queue is None:
+                break
+            waiter = queue.waiters[priority].popleft()
+            self._waiting -= 1
+            SCHEDULER_QUEUED.labels(priority).dec()
+            self._grant(queue)
+            waiter.set_result(None)
+        # Forget idle tenants that have no credit left to carry
+        for tenant_id, queue in list(self._tenants.items()):
+            if queue.finish_tag <= self._virtual_time and not any(queue.waiters.values()):
+                del self._tenants[tenant_id]
+
+    async def _acquire(self, tenant_id: str, priority: str):
+        queue = self._queue(tenant_id)
+        if self._in_flight < self.concurrency and not self._waiting:
+            self._grant(queue)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters[priority].append(waiter)
+        self._waiting += 1
+        SCHEDULER_QUEUED.labels(priority).inc()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before the cancellation landed; hand the slot on
+                self._release()
+            else:
+                queue.waiters[priority].remove(waiter)
+                self._waiting -= 1
+                SCHEDULER_QUEUED.labels(priority).dec()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        SCHEDULER_IN_FLIGHT.set(self._in_flight)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one outbound request slot for the current tenant and priority"""
+        tenant_id, priority = _tenant.get(), _priority.get()
+        queued_at = time.monotonic()
+        await self._acquire(tenant_id, priority)
+        SCHEDULER_QUEUE_WAIT.labels(tenant_id, priority).observe(time.monotonic() - queued_at)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+scheduler = FairScheduler()
+
+__all__ = [
+    'scheduler',
+    'FairScheduler',
+    'INTERACTIVE',
+    'BACKGROUND',
+    'set_tenant',
+    'reset_tenant',
+    'current_tenant',
+    'set_priority',
+    'reset_priority',
+]
@@ -0,0 +1,55 @@
+"""
+Production entry point: `python serve.py` from the backend directory.
+
+Runs WEB_CONCURRENCY worker processes (one per core by default) on uvloop and
+httptools. Each worker opens its own Redis and HTTP pools in the application lifespan
+and drains running loads before closing them, so a SIGTERM during a deploy finishes
+in-flight work instead of dropping it.
+"""
+import logging
+import multiprocessing
+import os
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Worker processes; one per core by default
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8000'))
+# Idle keep-alive connections are closed after this many seconds; keep it above the load balancer's
+KEEP_ALIVE_SECONDS = int(os.getenv('KEEP_ALIVE_SECONDS', '75'))
+# Proxies whose X-Forwarded-* headers are trusted
+FORWARDED_ALLOW_IPS = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    # Both are pinned in requirements.txt; fall back rather than refuse to start without them
+    loop = 'uvloop' if _available('uvloop') else 'asyncio'
+    http = 'httptools' if _available('httptools') else 'h11'
+    if loop != 'uvloop' or http != 'httptools':
+        logger.warning("⚠️ Serving with %s and %s; install uvloop and httptools for production", loop, http)
+    uvicorn.run(
+        'main:app',
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        loop=loop,
+        http=http,
+        lifespan='on',
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+    )
+
+
+if __name__ == '__main__':
+    main()
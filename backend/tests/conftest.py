@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# Modules import each other from the backend directory, as when the app is served from it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """An in-memory Redis standing in for the shared client"""
+    fakeredis = pytest.importorskip('fakeredis')
+    import cache
+    import redis_client
+
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(redis_client, 'redis_client', client)
+    monkeypatch.setattr(cache, 'redis_client', client)
+    return client
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    """Redis unreachable: the breaker is open and writes land in an empty local store"""
+    import cache
+    import redis_client
+
+    store = redis_client.LocalStore()
+    monkeypatch.setattr(redis_client.redis_breaker, 'opened_at', 0.0)
+    monkeypatch.setattr(redis_client, 'local_store', store)
+    monkeypatch.setattr(cache, 'local_store', store)
+    return store
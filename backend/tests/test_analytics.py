@@ -0,0 +1,70 @@
+import pytest
+from fastapi import HTTPException
+
+pd = pytest.importorskip('pandas')
+
+from analytics import build_frame, run_query  # noqa: E402
+
+DEALS = [
+    {'id': '1', 'properties': {'dealstage': 'won', 'amount': '100', 'owner': 'ana'}},
+    {'id': '2', 'properties': {'dealstage': 'won', 'amount': '300', 'owner': 'ben'}},
+    {'id': '3', 'properties': {'dealstage': 'lost', 'amount': '50', 'owner': 'ana'}},
+    {'id': '4', 'properties': {'dealstage': 'open', 'amount': '', 'owner': 'ana'}},
+    {'id': '5', 'properties': {'dealstage': 'won', 'amount': '600', 'owner': 'ana'}},
+]
+
+
+@pytest.fixture
+def frame():
+    return build_frame(DEALS)
+
+
+def test_build_frame_types_columns(frame):
+    assert frame['amount'].dtype == 'float64'
+    assert pd.isna(frame['amount'][3])
+    assert frame['owner'].dtype == 'category'
+    # Ids are all distinct, so they stay plain values rather than categoricals
+    assert frame['id'].dtype != 'category'
+
+
+def test_group_by_orders_by_the_first_metric(frame):
+    result = run_query(frame, {
+        'group_by': ['dealstage'],
+        'metrics': [{'op': 'sum', 'field': 'amount'}, {'op': 'count'}],
+    })
+
+    assert result['rows'] == 5
+    assert result['group_count'] == 3
+    assert result['groups'] == [
+        {'dealstage': 'won', 'sum_amount': 1000.0, 'count': 3},
+        {'dealstage': 'lost', 'sum_amount': 50.0, 'count': 1},
+        {'dealstage': 'open', 'sum_amount': 0.0, 'count': 1},
+    ]
+
+
+def test_where_and_totals(frame):
+    result = run_query(frame, {
+        'where': {'owner': 'ana', 'amount': ['100', 600]},
+        'metrics': [{'op': 'mean', 'field': 'amount'}, {'op': 'max', 'field': 'amount'}],
+    })
+
+    assert result['rows'] == 2
+    assert result['totals'] == {'mean_amount': 350.0, 'max_amount': 600.0}
+
+
+def test_histogram_skips_missing_values(frame):
+    result = run_query(frame, {'histogram': {'field': 'amount', 'bins': 2, 'min': 0, 'max': 600}})
+
+    assert result['histogram']['edges'] == [0.0, 300.0, 600.0]
+    assert result['histogram']['counts'] == [2, 2]
+
+
+@pytest.mark.parametrize('query', [
+    {'group_by': ['missing']},
+    {'metrics': [{'op': 'median', 'field': 'amount'}]},
+    {'metrics': [{'op': 'sum', 'field': 'owner'}]},
+])
+def test_invalid_queries_are_rejected(frame, query):
+    with pytest.raises(HTTPException) as raised:
+        run_query(frame, query)
+    assert raised.value.status_code == 400
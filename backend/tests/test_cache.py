@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import cache as cache_module
+from cache import Cache, encode_entry, merge_changes
+
+TENANT = {'org_id': 'org1', 'user_id': 'user1'}
+
+
+def dataset(count: int, changed: int = None):
+    return {'items': [
+        {'id': str(i), 'name': f'item {i}', 'notes': 'x' * 200 + ('!' if i == changed else '')}
+        for i in range(count)
+    ], 'type': 'contacts'}
+
+
+def test_merge_changes_collapses_consecutive_versions():
+    changes = [
+        {'version': 2, 'added': ['a', 'b'], 'changed': ['c'], 'removed': ['d']},
+        {'version': 3, 'added': [], 'changed': ['a', 'e'], 'removed': ['b', 'c']},
+        {'version': 4, 'added': ['d'], 'changed': [], 'removed': []},
+    ]
+
+    delta = merge_changes(changes)
+
+    # Added then removed is a no-op; removed then re-added is a change for the client
+    assert sorted(delta['added']) == ['a']
+    assert sorted(delta['changed']) == ['d', 'e']
+    assert sorted(delta['removed']) == ['c']
+
+
+def test_merge_changes_of_nothing():
+    assert merge_changes([]) == {'added': [], 'changed': [], 'removed': []}
+
+
+@pytest.mark.anyio
+async def test_chunked_entry_round_trip(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_THRESHOLD', 4096)
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_MIN_BYTES', 1024)
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_MAX_BYTES', 2048)
+    cache = Cache()
+    data = dataset(100)
+
+    stored = await cache.set_entry('hubspot_contacts', TENANT, encode_entry(data))
+    entry = await cache.get_entry('hubspot_contacts', TENANT)
+
+    assert Cache.is_chunked(stored) and Cache.is_chunked(entry)
+    assert json.loads(await cache.read_body(entry)) == data
+    assert [item async for item in cache.iter_items(entry, 10, 13)] == data['items'][10:13]
+
+
+@pytest.mark.anyio
+async def test_chunked_entry_with_an_evicted_chunk_is_a_miss(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_THRESHOLD', 4096)
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_MIN_BYTES', 1024)
+    monkeypatch.setattr(cache_module, 'CACHE_CHUNK_MAX_BYTES', 2048)
+    cache = Cache()
+    await cache.set_entry('hubspot_contacts', TENANT, encode_entry(dataset(100)))
+
+    chunk_keys = [key async for key in fake_redis.scan_iter('cache_chunk:*')]
+    assert chunk_keys
+    await fake_redis.delete(chunk_keys[0])
+
+    assert await cache.get_entry('hubspot_contacts', TENANT) is None
+
+
+@pytest.mark.anyio
+async def test_versions_and_changes_follow_item_edits(fake_redis):
+    cache = Cache()
+
+    first = await cache.set_entry('hubspot_contacts', TENANT, encode_entry(dataset(5)))
+    unchanged = await cache.set_entry('hubspot_contacts', TENANT, encode_entry(dataset(5)))
+    edited = dataset(6, changed=2)
+    edited['items'].pop(0)
+    second = await cache.set_entry('hubspot_contacts', TENANT, encode_entry(edited))
+
+    assert first['version'] == unchanged['version'] == b'1'
+    assert second['version'] == b'2'
+    changes = await cache.get_changes('hubspot_contacts', TENANT, 1)
+    assert changes == [{'version': 2, 'added': ['5'], 'changed': ['2'], 'removed': ['0']}]
+    # The first version has no predecessor to diff against
+    assert await cache.get_changes('hubspot_contacts', TENANT, 0) is None
+
+
+@pytest.mark.anyio
+async def test_local_fallback_checks_freshness_and_versions(redis_down, monkeypatch):
+    cache = Cache()
+
+    stored = await cache.set_entry('notion', TENANT, encode_entry(dataset(3)))
+    again = await cache.set_entry('notion', TENANT, encode_entry(dataset(3)))
+
+    assert stored['version'] == again['version']
+    assert await cache.get_entry('notion', TENANT) == again
+
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(again['fresh_until']) + 1)
+    assert await cache.get_entry('notion', TENANT) is None
+    assert await cache.get_entry('notion', TENANT, allow_stale=True) == again
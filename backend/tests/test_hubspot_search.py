@@ -0,0 +1,85 @@
+import pytest
+from fastapi import HTTPException
+
+from integrations.hubspot import build_search_request, search_snapshot_hubspot
+
+CONTACTS = [
+    {'id': '1', 'properties': {'firstname': 'Ada', 'lastname': 'Lovelace', 'email': 'ada@example.com', 'createdate': '2024-01-03T00:00:00Z'}},
+    {'id': '2', 'properties': {'firstname': 'alan', 'lastname': 'Turing', 'email': '', 'createdate': '2024-01-01T00:00:00Z'}},
+    {'id': '3', 'properties': {'firstname': 'Grace', 'lastname': 'Hopper', 'email': 'grace@navy.mil', 'createdate': '2024-01-02T00:00:00Z'}},
+]
+DEALS = [
+    {'id': '10', 'properties': {'dealname': 'Small', 'amount': '900', 'dealstage': 'won'}},
+    {'id': '11', 'properties': {'dealname': 'Large', 'amount': '12000', 'dealstage': 'won'}},
+    {'id': '12', 'properties': {'dealname': 'Open', 'amount': None, 'dealstage': 'open'}},
+]
+
+
+def ids(result):
+    return [item['id'] for item in result['items']]
+
+
+def test_build_search_request_translates_filters_and_sorts():
+    request = build_search_request(
+        [[{'property': 'amount', 'operator': 'between', 'value': 10, 'high_value': 20}],
+         [{'property': 'dealstage', 'operator': 'IN', 'values': ['won', 'lost']}]],
+        [{'property': 'amount', 'direction': 'descending'}],
+        ['dealname'],
+        500,
+    )
+
+    assert request['filterGroups'] == [
+        {'filters': [{'propertyName': 'amount', 'operator': 'BETWEEN', 'value': '10', 'highValue': '20'}]},
+        {'filters': [{'propertyName': 'dealstage', 'operator': 'IN', 'values': ['won', 'lost']}]},
+    ]
+    assert request['sorts'] == [{'propertyName': 'amount', 'direction': 'DESCENDING'}]
+    assert request['properties'] == ['dealname']
+    assert request['limit'] == 200
+
+
+@pytest.mark.parametrize('filter_groups', [
+    [[{'property': 'email', 'operator': 'LIKE', 'value': 'x'}]],
+    [[{'property': 'email', 'operator': 'HAS_PROPERTY'}]] * 6,
+    [[{'property': 'email', 'operator': 'HAS_PROPERTY'}] * 19],
+])
+def test_build_search_request_rejects_what_hubspot_would(filter_groups):
+    with pytest.raises(HTTPException) as raised:
+        build_search_request(filter_groups, None, ['email'], 10)
+    assert raised.value.status_code == 400
+
+
+def test_snapshot_groups_are_ored_and_filters_anded():
+    result = search_snapshot_hubspot(CONTACTS, 'contacts', [
+        [{'property': 'firstname', 'operator': 'EQ', 'value': 'ALAN'}],
+        [{'property': 'email', 'operator': 'HAS_PROPERTY'}, {'property': 'lastname', 'operator': 'NEQ', 'value': 'hopper'}],
+    ])
+
+    assert sorted(ids(result)) == ['1', '2']
+    assert result['total'] == 2
+
+
+def test_snapshot_compares_numbers_and_sorts_missing_values_last():
+    result = search_snapshot_hubspot(
+        DEALS, 'deals',
+        [[{'property': 'dealstage', 'operator': 'IN', 'values': ['won', 'open']}]],
+        sorts=[{'property': 'amount', 'direction': 'DESCENDING'}],
+    )
+    assert ids(result) == ['11', '10', '12']
+
+    result = search_snapshot_hubspot(DEALS, 'deals', [[{'property': 'amount', 'operator': 'GT', 'value': '1000'}]])
+    assert ids(result) == ['11']
+
+
+def test_snapshot_pages_with_a_cursor_and_keeps_requested_properties():
+    sorts = [{'property': 'createdate', 'direction': 'ASCENDING'}]
+
+    first = search_snapshot_hubspot(CONTACTS, 'contacts', [], sorts=sorts, properties=['email'], limit=2)
+    second = search_snapshot_hubspot(CONTACTS, 'contacts', [], sorts=sorts, properties=['email'], limit=2, cursor=first['cursor'])
+
+    assert ids(first) == ['2', '3'] and first['cursor'] == '2'
+    assert ids(second) == ['1'] and second['cursor'] is None
+    assert set(second['items'][0]['properties']) == {'email', 'createdate'}
+
+
+def test_snapshot_defers_to_the_search_api_for_properties_it_lacks():
+    assert search_snapshot_hubspot(CONTACTS, 'contacts', [[{'property': 'jobtitle', 'operator': 'HAS_PROPERTY'}]]) is None
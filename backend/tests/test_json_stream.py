@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from integrations.json_stream import JsonRecordStream
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def parse(body: bytes, array_key, size: int):
+    stream = JsonRecordStream(chunked(body, size), array_key)
+    records = [record async for record in stream]
+    return records, stream
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, 1 << 16])
+async def test_yields_records_and_envelope_across_chunk_boundaries(size):
+    page = {
+        'offset': 'itr123',
+        'records': [
+            {'id': 'rec1', 'fields': {'Name': 'Ünïcode ✓', 'Amount': -1500.25}},
+            {'id': 'rec2', 'fields': {'Tags': ['a', 'b'], 'Done': True, 'Empty': None}},
+        ],
+        'total': 2,
+    }
+    body = json.dumps(page, ensure_ascii=False).encode('utf-8')
+
+    records, stream = await parse(body, 'records', size)
+
+    assert records == page['records']
+    assert stream.envelope == {'offset': 'itr123', 'total': 2}
+    assert stream.found
+    assert stream.bytes_read == len(body)
+
+
+@pytest.mark.parametrize('size', [1, 3])
+async def test_number_cut_by_a_chunk_boundary_is_not_truncated(size):
+    records, _ = await parse(b'{"results": [1500.0, -23, 4e10]}', 'results', size)
+
+    assert records == [1500.0, -23, 4e10]
+
+
+async def test_top_level_array():
+    records, stream = await parse(b' [ {"id": 1} , {"id": 2} ] ', None, 4)
+
+    assert records == [{'id': 1}, {'id': 2}]
+    assert stream.envelope == {}
+
+
+async def test_empty_array_and_missing_key():
+    records, stream = await parse(b'{"results": [], "has_more": false}', 'results', 5)
+    assert records == []
+    assert stream.found
+    assert stream.envelope == {'has_more': False}
+
+    records, stream = await parse(b'{"message": "rate limited"}', 'results', 5)
+    assert records == []
+    assert not stream.found
+    assert stream.envelope == {'message': 'rate limited'}
+
+
+async def test_truncated_body_raises():
+    with pytest.raises(ValueError):
+        await parse(b'{"records": [{"id": 1}, {"id"', 'records', 4)
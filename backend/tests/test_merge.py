@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from integrations.merge import merge_streams
+
+pytestmark = pytest.mark.anyio
+
+
+def source(name, count, log=None, fail_at=None):
+    async def items():
+        for i in range(count):
+            if i == fail_at:
+                raise RuntimeError(f'{name} failed')
+            if log is not None:
+                log.append(name)
+            await asyncio.sleep(0)
+            yield f'{name}{i}'
+    return items
+
+
+async def test_yields_every_item_of_every_source():
+    merged = [item async for item in merge_streams([source('a', 3), source('b', 2), source('c', 0)], 2, 4)]
+
+    assert sorted(merged) == ['a0', 'a1', 'a2', 'b0', 'b1']
+    assert [item for item in merged if item.startswith('a')] == ['a0', 'a1', 'a2']
+
+
+async def test_runs_at_most_max_concurrent_sources():
+    running, peak = 0, 0
+
+    def tracked(name):
+        async def items():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            yield name
+            running -= 1
+        return items
+
+    merged = [item async for item in merge_streams([tracked(str(i)) for i in range(6)], 2, 10)]
+
+    assert sorted(merged) == [str(i) for i in range(6)]
+    assert peak == 2
+
+
+async def test_first_error_is_raised():
+    with pytest.raises(RuntimeError, match='b failed'):
+        async for _ in merge_streams([source('a', 50), source('b', 5, fail_at=2)], 2, 1):
+            pass
+
+
+async def test_stopping_early_cancels_the_producers():
+    produced = []
+
+    async with aclosing(merge_streams([source('a', 1000, produced), source('b', 1000, produced)], 2, 2)) as merged:
+        async for item in merged:
+            if item == 'a3':
+                break
+    count = len(produced)
+    await asyncio.sleep(0.01)
+
+    # The bounded buffer held the producers back, and nothing runs once the merge is closed
+    assert len(produced) == count < 20
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+import integrations.request_policy as request_policy
+from deadline import reset_deadline, set_deadline
+from integrations.rate_limit import RateLimiter
+from integrations.request_policy import HEDGE_MIN_SAMPLES, RequestPolicy, TransientError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(request_policy.random, 'uniform', lambda low, high: 0.0)
+
+
+def flaky(failures, result='ok', status=503, retry_after=None):
+    """A request failing `failures` times with a transient status before succeeding"""
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        if len(calls) <= failures:
+            raise TransientError(status, 'try again', retry_after)
+        return result
+
+    return attempt, calls
+
+
+def warmed_up(policy: RequestPolicy, latency: float = 0.01) -> RequestPolicy:
+    policy._latencies.extend([latency] * HEDGE_MIN_SAMPLES)
+    return policy
+
+
+async def test_transient_errors_are_retried():
+    attempt, calls = flaky(2)
+
+    assert await RequestPolicy('test').run(attempt) == 'ok'
+    assert len(calls) == 3
+
+
+async def test_gives_up_after_max_attempts():
+    attempt, calls = flaky(5)
+
+    with pytest.raises(TransientError):
+        await RequestPolicy('test', max_attempts=3).run(attempt)
+    assert len(calls) == 3
+
+
+async def test_other_errors_are_not_retried():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise ValueError('bad response')
+
+    with pytest.raises(ValueError):
+        await RequestPolicy('test').run(attempt)
+    assert len(calls) == 1
+
+
+async def test_no_retry_when_the_wait_would_pass_the_deadline():
+    attempt, calls = flaky(1, retry_after=5)
+    token = set_deadline(1)
+    try:
+        with pytest.raises(TransientError):
+            await RequestPolicy('test').run(attempt)
+    finally:
+        reset_deadline(token)
+    assert len(calls) == 1
+
+
+async def test_rate_limited_response_holds_back_the_limiter():
+    limiter = RateLimiter(5, 1.0)
+    attempt, calls = flaky(1, status=429, retry_after=0.2)
+    loop = asyncio.get_running_loop()
+
+    started = loop.time()
+    assert await RequestPolicy('test', limiter).run(attempt, rate_key='base1') == 'ok'
+
+    # The retry waited out Retry-After in the limiter, which other keys do not share
+    assert len(calls) == 2
+    assert loop.time() - started >= 0.15
+    assert limiter.try_acquire('base2')
+
+
+async def test_slow_attempt_is_hedged_and_the_fast_one_wins():
+    policy = warmed_up(RequestPolicy('test'))
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+            return 'slow'
+        return 'hedge'
+
+    assert await asyncio.wait_for(policy.run(attempt), 1) == 'hedge'
+    assert len(calls) == 2
+
+
+async def test_no_hedge_without_rate_limit_headroom():
+    limiter = RateLimiter(1, 60.0)
+    policy = warmed_up(RequestPolicy('test', limiter))
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    assert await policy.run(attempt) == 'ok'
+    assert len(calls) == 1
+
+
+async def test_hedges_draw_on_a_budget():
+    policy = warmed_up(RequestPolicy('test'))
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        await asyncio.sleep(0.03)
+        return 'ok'
+
+    for _ in range(3):
+        await policy.run(attempt)
+
+    # Only the first request could hedge; the budget refills by a tenth per request
+    assert len(calls) == 4
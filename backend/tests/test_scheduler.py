@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from scheduler import BACKGROUND, FairScheduler, reset_priority, reset_tenant, set_priority, set_tenant
+
+pytestmark = pytest.mark.anyio
+
+
+async def grant_order(scheduler: FairScheduler, requests):
+    """Queue (tenant, priority) requests behind a held slot and return the order they are served in"""
+    order = []
+    release = asyncio.Event()
+
+    async def request(tenant_id, priority=None):
+        tenant_token = set_tenant(tenant_id)
+        priority_token = set_priority(priority) if priority else None
+        try:
+            async with scheduler.slot():
+                order.append(tenant_id if priority is None else f'{tenant_id}:{priority}')
+        finally:
+            if priority_token is not None:
+                reset_priority(priority_token)
+            reset_tenant(tenant_token)
+
+    async def hold():
+        async with scheduler.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for tenant_id, priority in requests:
+        tasks.append(asyncio.create_task(request(tenant_id, priority)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+async def test_tenants_take_turns():
+    scheduler = FairScheduler(concurrency=1, weights={})
+
+    order = await grant_order(scheduler, [('crawl', None)] * 4 + [('single', None)])
+
+    # The single request is served right after the crawl's first one, not behind all of them
+    assert order == ['crawl', 'single', 'crawl', 'crawl', 'crawl']
+
+
+async def test_weights_share_slots_proportionally():
+    scheduler = FairScheduler(concurrency=1, weights={'big': 2.0})
+
+    order = await grant_order(scheduler, [('big', None)] * 6 + [('small', None)] * 3)
+
+    assert order == ['big', 'small', 'big', 'big', 'small', 'big', 'big', 'small', 'big']
+
+
+async def test_interactive_requests_go_before_background_ones():
+    scheduler = FairScheduler(concurrency=1, weights={})
+
+    order = await grant_order(scheduler, [('sync', BACKGROUND), ('sync', BACKGROUND), ('user', None)])
+
+    assert order == ['user', 'sync:background', 'sync:background']
+
+
+async def test_cancelled_waiter_frees_its_place():
+    scheduler = FairScheduler(concurrency=1, weights={})
+    entered = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot():
+            entered.set()
+            await release.wait()
+
+    async def wait_for_slot():
+        async with scheduler.slot():
+            pass
+
+    holder = asyncio.create_task(hold())
+    await entered.wait()
+    waiter = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    release.set()
+    await holder
+
+    async with scheduler.slot():
+        assert scheduler._in_flight == 1
+    assert scheduler._in_flight == 0 and scheduler._waiting == 0
@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import hmac
+import time
+
+import pytest
+
+from webhooks import verify_airtable_signature, verify_hubspot_signature, verify_notion_signature
+
+BODY = b'{"events": [1, 2]}'
+
+
+def hubspot_signature(secret: str, method: str, uri: str, body: bytes, timestamp: str) -> str:
+    source = f'{method}{uri}'.encode('utf-8') + body + timestamp.encode('utf-8')
+    return base64.b64encode(hmac.new(secret.encode('utf-8'), source, hashlib.sha256).digest()).decode()
+
+
+@pytest.fixture
+def hubspot_secret(monkeypatch):
+    monkeypatch.setenv('HUBSPOT_CLIENT_SECRET', 'app-secret')
+    return 'app-secret'
+
+
+def test_hubspot_signature(hubspot_secret):
+    uri = 'https://api.example.com/webhooks/hubspot'
+    timestamp = str(int(time.time() * 1000))
+    signature = hubspot_signature(hubspot_secret, 'POST', uri, BODY, timestamp)
+
+    assert verify_hubspot_signature('POST', uri, BODY, signature, timestamp)
+    assert not verify_hubspot_signature('POST', uri, BODY + b' ', signature, timestamp)
+    assert not verify_hubspot_signature('POST', 'http://internal:8000/webhooks/hubspot', BODY, signature, timestamp)
+    assert not verify_hubspot_signature('POST', uri, BODY, None, timestamp)
+
+
+def test_hubspot_signature_rejects_replays(hubspot_secret):
+    uri = 'https://api.example.com/webhooks/hubspot'
+    timestamp = str(int(time.time() * 1000) - 10 * 60 * 1000)
+    signature = hubspot_signature(hubspot_secret, 'POST', uri, BODY, timestamp)
+
+    assert not verify_hubspot_signature('POST', uri, BODY, signature, timestamp)
+    assert not verify_hubspot_signature('POST', uri, BODY, signature, 'not-a-timestamp')
+
+
+def test_notion_signature(monkeypatch):
+    monkeypatch.setenv('NOTION_WEBHOOK_VERIFICATION_TOKEN', 'token')
+    signature = 'sha256=' + hmac.new(b'token', BODY, hashlib.sha256).hexdigest()
+
+    assert verify_notion_signature(BODY, signature)
+    assert not verify_notion_signature(BODY + b' ', signature)
+
+    monkeypatch.delenv('NOTION_WEBHOOK_VERIFICATION_TOKEN')
+    assert not verify_notion_signature(BODY, signature)
+
+
+def test_airtable_signature_uses_the_webhooks_own_secret():
+    secret = b'per-webhook-secret'
+    mac_secret = base64.b64encode(secret).decode()
+    signature = 'hmac-sha256=' + hmac.new(secret, BODY, hashlib.sha256).hexdigest()
+
+    assert verify_airtable_signature(BODY, signature, mac_secret)
+    assert not verify_airtable_signature(BODY, signature, base64.b64encode(b'another webhook').decode())
+    assert not verify_airtable_signature(BODY, signature, None)
+    assert not verify_airtable_signature(BODY, None, mac_secret)
@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from redis.exceptions import LockError
+from redis_client import redis_client, redis_breaker, local_store, RedisUnavailable, add_key_value_redis, get_value_redis, delete_key_redis
+
+logger = logging.getLogger(__name__)
+
+# Refresh tokens this long before they expire
+REFRESH_MARGIN_SECONDS = 300
+# How often the background refresher looks for tokens about to expire
+REFRESH_INTERVAL_SECONDS = 60
+DEFAULT_EXPIRES_IN = 21600
+
+EXPIRY_INDEX_KEY = 'token_expiry'
+
+Refresher = Callable[[str], Awaitable[Dict]]
+
+
+class TokenRevoked(HTTPException):
+    """Raised by refreshers when the provider rejects the refresh token for good (invalid_grant)"""
+    def __init__(self, detail: str):
+        super().__init__(status_code=401, detail=detail)
+
+
+class TokenManager:
+    """
+    Keeps OAuth tokens server-side and hands out access tokens that are valid for at
+    least REFRESH_MARGIN_SECONDS. Refreshes are serialised per tenant with a Redis lock,
+    and a background task refreshes tokens shortly before they expire.
+    """
+    def __init__(self):
+        self._refreshers: Dict[str, Refresher] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._local_locks: Dict[str, asyncio.Lock] = {}
+
+    def register_refresher(self, integration: str, refresher: Refresher):
+        """Register the coroutine that exchanges a refresh token for new token data"""
+        self._refreshers[integration] = refresher
+
+    def _token_key(self, integration: str, org_id: str, user_id: str) -> str:
+        return f'{integration}_token:{org_id}:{user_id}'
+
+    def _lock_key(self, integration: str, org_id: str, user_id: str) -> str:
+        return f'{integration}_token_lock:{org_id}:{user_id}'
+
+    async def store_tokens(self, integration: str, org_id: str, user_id: str, token_data: Dict) -> Dict:
+        """Store token data from an authorization or refresh response"""
+        key = self._token_key(integration, org_id, user_id)
+        existing = await self._load(key)
+        expires_in = int(token_data.get('expires_in') or DEFAULT_EXPIRES_IN)
+        tokens = {
+            'access_token': token_data.get('access_token'),
+            # Some providers only return a new refresh token when they rotate it
+            'refresh_token': token_data.get('refresh_token') or (existing or {}).get('refresh_token'),
+            'expires_at': time.time() + expires_in,
+        }
+        await add_key_value_redis(key, json.dumps(tokens))
+        if tokens['refresh_token'] and integration in self._refreshers:
+            await self._index(f'{integration}:{org_id}:{user_id}', tokens['expires_at'])
+        return tokens
+
+    async def forget(self, integration: str, org_id: str, user_id: str):
+        """Drop stored tokens, e.g. on disconnect"""
+        await delete_key_redis(self._token_key(integration, org_id, user_id))
+        await self._unindex(f'{integration}:{org_id}:{user_id}')
+
+    async def _index(self, tenant: str, expires_at: float):
+        # While Redis is down the expiry index is kept on this node, like the tokens themselves
+        local_index = local_store.get(EXPIRY_INDEX_KEY) or {}
+        try:
+            await redis_breaker.call(redis_client.zadd(EXPIRY_INDEX_KEY, {tenant: expires_at}))
+            local_index.pop(tenant, None)
+        except RedisUnavailable:
+            local_index[tenant] = expires_at
+        local_store.set(EXPIRY_INDEX_KEY, local_index)
+
+    async def _unindex(self, tenant: str):
+        local_index = local_store.get(EXPIRY_INDEX_KEY) or {}
+        local_index.pop(tenant, None)
+        local_store.set(EXPIRY_INDEX_KEY, local_index)
+        try:
+            await redis_breaker.call(redis_client.zrem(EXPIRY_INDEX_KEY, tenant))
+        except RedisUnavailable:
+            logger.warning("⚠️ Redis unavailable, %s dropped from the local expiry index only", tenant)
+
+    async def _due(self, until: float) -> List[str]:
+        """Tenants whose tokens expire before `until`, from Redis and this node's fallback index"""
+        try:
+            due = await redis_breaker.call(redis_client.zrangebyscore(EXPIRY_INDEX_KEY, '-inf', until))
+        except RedisUnavailable:
+            due = []
+        tenants = {member.decode() if isinstance(member, bytes) else member for member in due}
+        tenants.update(tenant for tenant, expires_at in (local_store.get(EXPIRY_INDEX_KEY) or {}).items() if expires_at <= until)
+        return sorted(tenants)
+
+    @contextlib.asynccontextmanager
+    async def _refresh_lock(self, name: str):
+        """Redis lock across workers; while Redis is down refreshes are only serialised on this node"""
+        lock = redis_client.lock(name, timeout=30, blocking_timeout=30)
+        try:
+            acquired = await redis_breaker.call(lock.acquire())
+        except RedisUnavailable:
+            async with self._local_locks.setdefault(name, asyncio.Lock()):
+                yield
+            return
+        if not acquired:
+            raise HTTPException(status_code=503, detail='Token refresh is taking too long, try again.')
+        try:
+            yield
+        finally:
+            try:
+                await redis_breaker.call(lock.release())
+            except (RedisUnavailable, LockError):
+                # The lock expires on its own after its timeout
+                pass
+
+    async def _load(self, key: str) -> Optional[Dict]:
+        value = await get_value_redis(key)
+        return json.loads(value) if value else None
+
+    def _is_fresh(self, tokens: Dict) -> bool:
+        return tokens.get('expires_at', 0) - time.time() > REFRESH_MARGIN_SECONDS
+
+    async def get_access_token(self, integration: str, org_id: str, user_id: str) -> str:
+        """Return an access token, refreshing it first if it is about to expire"""
+        tokens = await self._load(self._token_key(integration, org_id, user_id))
+        if not tokens:
+            raise HTTPException(status_code=401, detail=f'No {integration} tokens stored, please re-authorize.')
+        if self._is_fresh(tokens) or not tokens.get('refresh_token'):
+            return tokens['access_token']
+        return await self.refresh(integration, org_id, user_id)
+
+    async def refresh(self, integration: str, org_id: str, user_id: str, force: bool = False) -> str:
+        """
+        Refresh the tenant's access token. Concurrent callers wait on the same lock and
+        reuse the token the first caller obtained instead of refreshing again.
+        """
+        refresher = self._refreshers.get(integration)
+        key = self._token_key(integration, org_id, user_id)
+        async with self._refresh_lock(self._lock_key(integration, org_id, user_id)):
+            tokens = await self._load(key)
+            if not tokens:
+                raise HTTPException(status_code=401, detail=f'No {integration} tokens stored, please re-authorize.')
+            if (self._is_fresh(tokens) and not force) or not refresher or not tokens.get('refresh_token'):
+                return tokens['access_token']
+
+            try:
+                token_data = await refresher(tokens['refresh_token'])
+            except TokenRevoked:
+                # Retrying cannot help, so the background refresher stops trying until the user re-authorizes
+                await self._unindex(f'{integration}:{org_id}:{user_id}')
+                logger.warning("⚠️ %s refresh token revoked for user %s, org %s", integration, user_id, org_id)
+                raise
+            tokens = await self.store_tokens(integration, org_id, user_id, token_data)
+            logger.info("🔄 Refreshed %s token for user %s, org %s", integration, user_id, org_id)
+            return tokens['access_token']
+
+    async def refresh_expiring(self):
+        """Refresh every token that expires within the refresh margin"""
+        tenants = await self._due(time.time() + REFRESH_MARGIN_SECONDS)
+        results = await asyncio.gather(
+            *(self.refresh(*tenant.split(':', 2)) for tenant in tenants),
+            return_exceptions=True
+        )
+        for tenant, result in zip(tenants, results):
+            if isinstance(result, Exception):
+                logger.error("❌ Background token refresh failed for %s: %s", tenant, result)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_expiring()
+            except Exception as e:
+                logger.error("❌ Background token refresh error: %s", e)
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+token_manager = TokenManager()
+
+__all__ = ['token_manager', 'TokenManager', 'TokenRevoked']
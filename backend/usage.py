@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from redis_client import redis_client, redis_breaker, RedisUnavailable
+from scheduler import current_tenant
+from metrics import USAGE_DOWNGRADES
+
+logger = logging.getLogger(__name__)
+
+# How often counts collected on this worker are written to Redis
+USAGE_FLUSH_SECONDS = float(os.getenv('USAGE_FLUSH_SECONDS', '10'))
+# Provider requests an org may make per UTC day; 0 means unlimited
+USAGE_DAILY_REQUEST_BUDGET = int(os.getenv('USAGE_DAILY_REQUEST_BUDGET', '0'))
+# Per-org overrides, e.g. "org_big=50000,org_trial=500"
+USAGE_TENANT_BUDGETS = os.getenv('USAGE_TENANT_BUDGETS', '')
+# Daily usage hashes are kept this long for reporting
+USAGE_RETENTION_SECONDS = 35 * 24 * 3600
+
+METRICS = ('requests', 'bytes', 'throttled', 'errors', 'cache_hits')
+
+
+def _parse_budgets(budgets: str) -> Dict[str, int]:
+    parsed = {}
+    for pair in filter(None, (pair.strip() for pair in budgets.split(','))):
+        tenant_id, _, budget = pair.partition('=')
+        parsed[tenant_id] = int(budget)
+    return parsed
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class UsageMeter:
+    """
+    Counts provider requests, response bytes, 429s, errors and cache hits per org,
+    integration and endpoint. Counts accumulate in memory and a background task adds
+    them to one Redis hash per org and day every USAGE_FLUSH_SECONDS, so recording a
+    call never costs a Redis round trip. The same flush reads back each org's daily
+    request total across all workers, which is what budgets are checked against.
+    """
+    def __init__(self, default_budget: int = USAGE_DAILY_REQUEST_BUDGET, budgets: Optional[Dict[str, int]] = None):
+        self.default_budget = default_budget
+        self.budgets = budgets if budgets is not None else _parse_budgets(USAGE_TENANT_BUDGETS)
+        self._pending: Dict[Tuple[str, str, str], Counter] = defaultdict(Counter)
+        # Daily request totals per org as of the last flush, for the day in self._day
+        self._totals: Dict[str, int] = {}
+        self._day = _today()
+        self._task = None
+
+    @staticmethod
+    def _key(tenant_id: str, day: str) -> str:
+        return f"usage:{{{tenant_id}}}:{day}"
+
+    def record(self, integration: str, endpoint: str, status: int = 200, nbytes: int = 0, tenant_id: Optional[str] = None):
+        """Count one provider request made for the current scheduler tenant"""
+        counts = self._pending[(tenant_id or current_tenant(), integration, endpoint)]
+        counts['requests'] += 1
+        counts['bytes'] += nbytes
+        if status == 429:
+            counts['throttled'] += 1
+        elif status >= 400:
+            counts['errors'] += 1
+
+    def record_cache_hit(self, tenant_id: str, integration: str):
+        """Count a load answered from the cache instead of the provider"""
+        self._pending[(tenant_id, integration, 'cache')]['cache_hits'] += 1
+
+    def budget_for(self, tenant_id: str) -> int:
+        return self.budgets.get(tenant_id, self.default_budget)
+
+    def requests_today(self, tenant_id: str) -> int:
+        """Flushed total across workers plus this worker's unflushed requests"""
+        pending = sum(
+            counts['requests'] for (tenant, _, _), counts in self._pending.items() if tenant == tenant_id
+        )
+        return self._totals.get(tenant_id, 0) + pending
+
+    def over_budget(self, tenant_id: str) -> bool:
+        budget = self.budget_for(tenant_id)
+        return budget > 0 and self.requests_today(tenant_id) >= budget
+
+    def record_downgrade(self, integration: str):
+        USAGE_DOWNGRADES.labels(integration).inc()
+
+    async def flush(self):
+        """Add pending counts to Redis and refresh the daily totals; counts are kept if Redis is down"""
+        day = _today()
+        if day != self._day:
+            self._day, self._totals = day, {}
+        pending, self._pending = self._pending, defaultdict(Counter)
+        tenants = {tenant for tenant, _, _ in pending} | set(self._totals)
+        if not tenants:
+            return
+
+        pipe = redis_client.pipeline(transaction=False)
+        for (tenant, integration, endpoint), counts in pending.items():
+            key = self._key(tenant, day)
+            for metric, value in counts.items():
+                if value:
+                    pipe.hincrby(key, f"{integration}:{endpoint}:{metric}", value)
+            if counts['requests']:
+                pipe.hincrby(key, 'requests', counts['requests'])
+            pipe.expire(key, USAGE_RETENTION_SECONDS)
+        ordered_tenants = sorted(tenants)
+        for tenant in ordered_tenants:
+            pipe.hget(self._key(tenant, day), 'requests')
+        try:
+            results = await redis_breaker.call(pipe.execute())
+        except RedisUnavailable:
+            for key, counts in pending.items():
+                self._pending[key].update(counts)
+            return
+        for tenant, total in zip(ordered_tenants, results[-len(ordered_tenants):]):
+            self._totals[tenant] = int(total or 0)
+
+    async def get_usage(self, tenant_id: str, day: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Flushed usage of one org for a UTC day, as {integration: {endpoint: {metric: count}}}"""
+        fields = await redis_breaker.call(redis_client.hgetall(self._key(tenant_id, day or _today())))
+        usage = defaultdict(lambda: defaultdict(dict))
+        for field, value in fields.items():
+            parts = field.decode('utf-8').rsplit(':', 2)
+            if len(parts) == 3:
+                integration, endpoint, metric = parts
+                usage[integration][endpoint][metric] = int(value)
+        return {integration: dict(endpoints) for integration, endpoints in usage.items()}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("❌ Usage flush error: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Counts since the last flush would otherwise be lost with the worker
+        await self.flush()
+
+
+usage_meter = UsageMeter()
+
+__all__ = ['usage_meter', 'UsageMeter', 'METRICS']
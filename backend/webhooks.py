@@ -0,0 +1,266 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from cache import cache, Cache, encode_entry
+from integrations.registry import get_integration
+from redis_client import redis_client, add_key_value_redis, get_value_redis, get_values_redis
+
+logger = logging.getLogger(__name__)
+
+# Events arriving within this window are applied together
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv('WEBHOOK_DEBOUNCE_SECONDS', '1.0'))
+# HubSpot signatures older than this are rejected to prevent replays
+HUBSPOT_SIGNATURE_MAX_AGE_MS = 5 * 60 * 1000
+# Where providers reach this backend, e.g. https://api.example.com; behind a TLS proxy the
+# request URL is the internal one, so signed URIs and webhook targets are built from this
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+
+HUBSPOT_OBJECT_TYPES = {
+    'contact': 'contacts',
+    'company': 'companies',
+    'deal': 'deals',
+    'ticket': 'tickets',
+}
+
+
+def verify_hubspot_signature(method: str, uri: str, body: bytes, signature: str, timestamp: str) -> bool:
+    """HubSpot v3 signature: base64 HMAC-SHA256 of method + uri + body + timestamp with the app secret"""
+    client_secret = os.getenv('HUBSPOT_CLIENT_SECRET')
+    if not client_secret or not signature or not timestamp:
+        return False
+    try:
+        if abs(time.time() * 1000 - int(timestamp)) > HUBSPOT_SIGNATURE_MAX_AGE_MS:
+            return False
+    except ValueError:
+        return False
+    source = f'{method}{uri}'.encode('utf-8') + body + timestamp.encode('utf-8')
+    expected = base64.b64encode(hmac.new(client_secret.encode('utf-8'), source, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(expected, signature)
+
+
+def verify_notion_signature(body: bytes, signature: str) -> bool:
+    """Notion signature: 'sha256=' + hex HMAC-SHA256 of the body with the verification token"""
+    token = os.getenv('NOTION_WEBHOOK_VERIFICATION_TOKEN')
+    if not token or not signature:
+        return False
+    expected = 'sha256=' + hmac.new(token.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def verify_airtable_signature(body: bytes, signature: str, mac_secret: str) -> bool:
+    """Airtable signature: 'hmac-sha256=' + hex HMAC-SHA256 of the body with the webhook's MAC secret"""
+    if not mac_secret or not signature:
+        return False
+    expected = 'hmac-sha256=' + hmac.new(base64.b64decode(mac_secret), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def public_url(path: str, query: str = '') -> Optional[str]:
+    """The URL providers use for `path`, or None if PUBLIC_BASE_URL is not configured"""
+    if not PUBLIC_BASE_URL:
+        return None
+    return f'{PUBLIC_BASE_URL}{path}' + (f'?{query}' if query else '')
+
+
+def _airtable_webhook_key(base_id: str) -> str:
+    return f'airtable_webhook:{base_id}'
+
+
+async def save_airtable_webhook(base_id: str, webhook: Dict, expire: int):
+    """Remember a base's webhook ({'id', 'mac_secret', 'expires_at'}) until it expires"""
+    await add_key_value_redis(_airtable_webhook_key(base_id), json.dumps(webhook), expire=expire)
+
+
+async def get_airtable_webhook(base_id: str) -> Optional[Dict]:
+    webhook = await get_value_redis(_airtable_webhook_key(base_id))
+    return json.loads(webhook) if webhook else None
+
+
+async def get_airtable_webhooks(base_ids: List[str]) -> List[Optional[Dict]]:
+    webhooks = await get_values_redis([_airtable_webhook_key(base_id) for base_id in base_ids])
+    return [json.loads(webhook) if webhook else None for webhook in webhooks]
+
+
+def _tenants_key(integration: str, account_id: str) -> str:
+    return f'webhook_tenants:{integration}:{account_id}'
+
+
+def _accounts_key(integration: str, org_id: str, user_id: str) -> str:
+    return f'webhook_accounts:{integration}:{org_id}:{user_id}'
+
+
+async def register_webhook_tenant(integration: str, account_id: str, org_id: str, user_id: str):
+    """
+    Remember which tenants are connected to a provider account (HubSpot portal,
+    Notion workspace, Airtable base) so its webhook events can be routed to them.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.sadd(_tenants_key(integration, str(account_id)), f'{org_id}:{user_id}')
+        pipe.sadd(_accounts_key(integration, org_id, user_id), str(account_id))
+        await pipe.execute()
+
+
+async def get_webhook_accounts(integration: str, org_id: str, user_id: str) -> set:
+    """Provider accounts whose webhook events are routed to the tenant"""
+    members = await redis_client.smembers(_accounts_key(integration, org_id, user_id))
+    return {member.decode('utf-8') for member in members}
+
+
+async def unregister_webhook_tenant(integration: str, org_id: str, user_id: str):
+    """Stop routing webhook events to a tenant, e.g. once it disconnects"""
+    accounts = await get_webhook_accounts(integration, org_id, user_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for account_id in accounts:
+            pipe.srem(_tenants_key(integration, account_id), f'{org_id}:{user_id}')
+        pipe.delete(_accounts_key(integration, org_id, user_id))
+        await pipe.execute()
+
+
+async def get_webhook_tenants(integration: str, account_id: str) -> List[Dict[str, str]]:
+    members = await redis_client.smembers(_tenants_key(integration, str(account_id)))
+    tenants = []
+    for member in members:
+        org_id, _, user_id = member.decode('utf-8').partition(':')
+        tenants.append({'org_id': org_id, 'user_id': user_id})
+    return tenants
+
+
+def _apply_hubspot_events(items: List[Dict], events: List[Dict]) -> bool:
+    """
+    Apply HubSpot CRM events to a cached object list in place.
+    Returns False if an event cannot be applied from its payload alone (e.g. a creation,
+    which carries no properties), in which case the snapshot must be evicted instead.
+    """
+    by_id = {str(item.get('id')): item for item in items}
+    for event in events:
+        object_id = str(event.get('objectId'))
+        action = event.get('subscriptionType', '').split('.', 1)[-1]
+        if action == 'deletion':
+            item = by_id.pop(object_id, None)
+            if item is not None:
+                items.remove(item)
+        elif action == 'propertyChange' and object_id in by_id:
+            by_id[object_id].setdefault('properties', {})[event.get('propertyName')] = event.get('propertyValue')
+        else:
+            return False
+    return True
+
+
+class WebhookProcessor:
+    """
+    Buffers verified webhook events and applies them in debounced batches off the request
+    path. Events are grouped per provider account, so a burst of updates costs one cache
+    read and write per affected snapshot.
+    """
+    def __init__(self, debounce_seconds: float = WEBHOOK_DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self._pending: List[tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, integration: str, events: List[Dict]):
+        self._pending.extend((integration, event) for event in events)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.debounce_seconds)
+        await self.flush()
+
+    async def flush(self):
+        batch, self._pending = self._pending, []
+        grouped = defaultdict(list)
+        for integration, event in batch:
+            grouped[integration].append(event)
+        for integration, events in grouped.items():
+            try:
+                await getattr(self, f'_process_{integration}')(events)
+            except Exception as e:
+                logger.error("❌ Error processing %d %s webhook events: %s", len(events), integration, e)
+
+    async def _process_hubspot(self, events: List[Dict]):
+        batches = defaultdict(list)
+        for event in sorted(events, key=lambda event: event.get('occurredAt', 0)):
+            object_type = HUBSPOT_OBJECT_TYPES.get(event.get('subscriptionType', '').split('.', 1)[0])
+            if object_type:
+                batches[(str(event.get('portalId')), object_type)].append(event)
+
+        for (portal_id, object_type), object_events in batches.items():
+            for tenant in await get_webhook_tenants('hubspot', portal_id):
+                dataset = f'hubspot_{object_type}'
+                entry = await cache.get_entry(dataset, tenant)
+                if not entry:
+                    continue
+                snapshot = json.loads(await cache.read_body(entry))
+                if _apply_hubspot_events(snapshot['items'], object_events):
+                    snapshot['total'] = len(snapshot['items'])
+                    await cache.set_entry(
+                        dataset, tenant, encode_entry(snapshot),
+                        tags=Cache.tags_for(tenant, 'hubspot', object_type),
+                        adapt_ttl=False
+                    )
+                else:
+                    await cache.invalidate_tags([Cache.api_type_tag(tenant, 'hubspot', object_type)])
+
+    async def _process_notion(self, events: List[Dict]):
+        by_workspace = defaultdict(list)
+        for event in events:
+            by_workspace[event.get('workspace_id')].append(event)
+
+        for workspace_id, workspace_events in by_workspace.items():
+            only_deletions = all(event.get('type', '').endswith('.deleted') for event in workspace_events)
+            deleted_ids = {event.get('entity', {}).get('id') for event in workspace_events}
+            for tenant in await get_webhook_tenants('notion', workspace_id):
+                entry = await cache.get_entry('notion', tenant) if only_deletions else None
+                if entry:
+                    items = [item for item in json.loads(await cache.read_body(entry)) if item.get('id') not in deleted_ids]
+                    await cache.set_entry(
+                        'notion', tenant, encode_entry(items),
+                        tags=Cache.tags_for(tenant, 'notion'),
+                        adapt_ttl=False
+                    )
+                    # Cached database queries may hold the deleted rows
+                    await cache.invalidate_tags([Cache.api_type_tag(tenant, 'notion', 'databases')])
+                else:
+                    # Notion events carry no content, so anything but a deletion evicts the snapshot
+                    await cache.invalidate_tags([Cache.integration_tag(tenant, 'notion')])
+
+    async def _process_airtable(self, events: List[Dict]):
+        # Airtable notifications only say that a base changed; payloads must be pulled separately
+        base_ids = {event.get('base', {}).get('id') for event in events}
+        # The change may be to tables or fields, which the base listing does not reflect
+        await get_integration('airtable').hook('invalidate_schemas')([base_id for base_id in base_ids if base_id])
+        for base_id in base_ids:
+            tenants = await get_webhook_tenants('airtable', base_id)
+            if tenants:
+                await cache.invalidate_tags([Cache.integration_tag(tenant, 'airtable') for tenant in tenants])
+
+    async def stop(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        if self._pending:
+            await self.flush()
+
+
+webhook_processor = WebhookProcessor()
+
+__all__ = [
+    'webhook_processor',
+    'register_webhook_tenant',
+    'unregister_webhook_tenant',
+    'get_webhook_accounts',
+    'save_airtable_webhook',
+    'get_airtable_webhook',
+    'get_airtable_webhooks',
+    'public_url',
+    'verify_hubspot_signature',
+    'verify_notion_signature',
+    'verify_airtable_signature',
+]
@@ -11,7 +11,6 @@ import axios from 'axios';
 import { Table, Space, Tag, Tooltip } from 'antd';
 import { FolderOutlined, FileOutlined, CopyOutlined, DownloadOutlined, LinkOutlined } from '@ant-design/icons';
 import moment from 'moment';
-import * as XLSX from 'xlsx';
 import { 
     CloudDownload, 
     Refresh, 
@@ -30,6 +29,10 @@ export const DataForm = ({ integrationType, credentials }) => {
     const [loadedData, setLoadedData] = useState(null);
     const [selectedApi, setSelectedApi] = useState('contacts');
     const [totalItems, setTotalItems] = useState(0);
+    // ETag of the last payload per endpoint/API, so unchanged data comes back as a 304
+    const [etags, setEtags] = useState({});
+    // Dataset version of the loaded data per endpoint/API, so reloads only fetch what changed
+    const [versions, setVersions] = useState({});
     const endpoint = endpointMapping[integrationType];
 
     // Add HubSpot API options
@@ -40,33 +43,93 @@ export const DataForm = ({ integrationType, credentials }) => {
         { value: 'tickets', label: 'Tickets' }
     ];
 
+    // Items of a full payload: HubSpot wraps them in {items, total}, Notion and Airtable send a list
+    const itemsOf = (data) => (Array.isArray(data) ? data : data.items || []);
+
+    // A load cut short by the server deadline comes back as {items, partial, cursor}; keep
+    // resuming from the cursor, showing items as they arrive, until the rest has loaded
+    const resumePartial = async (data, hubspotParams) => {
+        let items = itemsOf(data);
+        setLoadedData(items);
+        while (data.partial && data.cursor) {
+            const response = await axios.post(
+                `http://localhost:8000/integrations/${endpoint}/load?cursor=${encodeURIComponent(data.cursor)}${hubspotParams}`,
+                credentials.handle
+                    ? { handle: credentials.handle }
+                    : { credentials: { access_token: credentials.access_token } },
+                { headers: { 'Content-Type': 'application/json' } }
+            );
+            data = response.data;
+            items = [...items, ...itemsOf(data)];
+            setLoadedData(items);
+        }
+        return items;
+    };
+
+    // Every full payload resets the version and ETag, so the next load only asks for what changed since it.
+    // Partial and resumed loads are not cached, so they leave nothing for the next load to build on.
+    const showFullResponse = async (response, etagKey, hubspotParams) => {
+        if (response.data.partial) {
+            setVersions(prev => ({ ...prev, [etagKey]: undefined }));
+            setEtags(prev => ({ ...prev, [etagKey]: undefined }));
+            const items = await resumePartial(response.data, hubspotParams);
+            setTotalItems(items.length);
+            return;
+        }
+        setVersions(prev => ({ ...prev, [etagKey]: response.headers['x-data-version'] }));
+        setEtags(prev => ({ ...prev, [etagKey]: response.headers.etag }));
+        const items = itemsOf(response.data);
+        setLoadedData(items);
+        setTotalItems(response.data.total ?? items.length);
+    };
+
     const handleLoad = async () => {
         try {
             console.log('Sending credentials:', credentials);
             
             const hubspotParams = integrationType.toLowerCase() === 'hubspot' ? `&api_type=${selectedApi}` : '';
+            const etagKey = `${endpoint}:${selectedApi}`;
             
+            const sinceVersion = loadedData && versions[etagKey] ? `&since_version=${versions[etagKey]}` : '';
+
             const response = await axios.post(
-                `http://localhost:8000/integrations/${endpoint}/load?${hubspotParams}`, 
-                { 
-                    credentials: {
-                        access_token: credentials.access_token,
-                    },
-                },
+                `http://localhost:8000/integrations/${endpoint}/load?${hubspotParams}${sinceVersion}`, 
+                credentials.handle
+                    ? { handle: credentials.handle }
+                    : { credentials: { access_token: credentials.access_token } },
                 {
                     headers: {
                         'Content-Type': 'application/json',
+                        ...(loadedData && etags[etagKey] ? { 'If-None-Match': etags[etagKey] } : {}),
                     },
+                    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
                 }
             );
-            console.log('Data loaded: ', response.data);
 
-            // Normalize the response data structure
-            const normalizedData = integrationType.toLowerCase() === 'hubspot' 
-                ? response.data.items 
-                : response.data;
+            if (response.status === 304) {
+                console.log('Data unchanged since last load');
+                return;
+            }
 
-            setLoadedData(normalizedData);
+            if (response.data.delta) {
+                // Apply the changes to the loaded items instead of replacing the dataset
+                const { added, changed, removed } = response.data;
+                const replaced = new Map(changed.map(item => [String(item.id), item]));
+                const removedIds = new Set([...removed, ...added.map(item => String(item.id))]);
+                const merged = [
+                    ...loadedData
+                        .filter(item => !removedIds.has(String(item.id)))
+                        .map(item => replaced.get(String(item.id)) || item),
+                    ...added,
+                ];
+                setVersions(prev => ({ ...prev, [etagKey]: response.headers['x-data-version'] }));
+                setLoadedData(merged);
+                setTotalItems(merged.length);
+                return;
+            }
+
+            console.log('Data loaded: ', response.data);
+            await showFullResponse(response, etagKey, hubspotParams);
         } catch (e) {
             console.error('Error payload:', e.response?.data);
             alert(e?.response?.data?.detail || 'An error occurred');
@@ -78,14 +141,13 @@ export const DataForm = ({ integrationType, credentials }) => {
             console.log('Sending credentials for force refresh:', credentials);
             
             const hubspotParams = integrationType.toLowerCase() === 'hubspot' ? `&api_type=${selectedApi}` : '';
+            const etagKey = `${endpoint}:${selectedApi}`;
             
             const response = await axios.post(
                 `http://localhost:8000/integrations/${endpoint}/load?force=true${hubspotParams}`, 
-                { 
-                    credentials: {
-                        access_token: credentials.access_token,
-                    },
-                },
+                credentials.handle
+                    ? { handle: credentials.handle }
+                    : { credentials: { access_token: credentials.access_token } },
                 {
                     headers: {
                         'Content-Type': 'application/json',
@@ -93,13 +155,7 @@ export const DataForm = ({ integrationType, credentials }) => {
                 }
             );
             console.log('Force refreshed data: ', response.data);
-
-            // Normalize the response data structure
-            const normalizedData = integrationType.toLowerCase() === 'hubspot' 
-                ? response.data.items 
-                : response.data;
-
-            setLoadedData(normalizedData);
+            await showFullResponse(response, etagKey, hubspotParams);
         } catch (e) {
             console.error('Error payload:', e.response?.data);
             alert(e?.response?.data?.detail || 'An error occurred');
@@ -228,49 +284,28 @@ export const DataForm = ({ integrationType, credentials }) => {
         return columns;
     };
 
-    // Helper function to export data to Excel
-    const exportToExcel = () => {
-        if (!loadedData || loadedData.length === 0) return;
-
-        // Flatten the data to handle nested properties
-        const flattenedData = loadedData.map(item => {
-            const flatItem = { ...item };
-            
-            // Remove nested objects that we don't want to export
-            delete flatItem.children;
-            
-            // Flatten properties if they exist
-            if (flatItem.properties) {
-                Object.entries(flatItem.properties).forEach(([key, value]) => {
-                    flatItem[key] = value;
-                });
-                delete flatItem.properties;
-            }
-
-            // Format dates and UUIDs in the exported data
-            Object.entries(flatItem).forEach(([key, value]) => {
-                if (looksLikeDate(value)) {
-                    flatItem[key] = formatDate(value);
-                } else if (isUUID(value)) {
-                    flatItem[key] = value; // Keep full UUID in Excel
-                }
-            });
-
-            return flatItem;
-        });
+    // Exports are built server-side and streamed, so large datasets never go through the tab
+    const handleExport = async (format) => {
+        try {
+            const hubspotParams = integrationType.toLowerCase() === 'hubspot' ? `&api_type=${selectedApi}` : '';
+            const response = await axios.post(
+                `http://localhost:8000/integrations/${endpoint}/export?format=${format}${hubspotParams}`,
+                credentials.handle
+                    ? { handle: credentials.handle }
+                    : { credentials: { access_token: credentials.access_token } },
+                { responseType: 'blob' }
+            );
 
-        // Create worksheet
-        const ws = XLSX.utils.json_to_sheet(flattenedData);
-        
-        // Create workbook
-        const wb = XLSX.utils.book_new();
-        XLSX.utils.book_append_sheet(wb, ws, "Data");
-
-        // Generate filename with timestamp
-        const fileName = `${integrationType}_data_${moment().format('YYYY-MM-DD_HH-mm')}.xlsx`;
-        
-        // Save file
-        XLSX.writeFile(wb, fileName);
+            const url = window.URL.createObjectURL(response.data);
+            const link = document.createElement('a');
+            link.href = url;
+            link.download = `${integrationType}_data_${moment().format('YYYY-MM-DD_HH-mm')}.${format}`;
+            link.click();
+            window.URL.revokeObjectURL(url);
+        } catch (e) {
+            console.error('Export failed:', e);
+            alert('Export failed');
+        }
     };
 
     return (
@@ -371,7 +406,7 @@ export const DataForm = ({ integrationType, credentials }) => {
                 <Button
                     variant="contained"
                     startIcon={<CloudDownload />}
-                    onClick={exportToExcel}
+                    onClick={() => handleExport('csv')}
                     sx={{
                         backgroundColor: '#38a169',
                         '&:hover': {
@@ -383,7 +418,7 @@ export const DataForm = ({ integrationType, credentials }) => {
                         boxShadow: '0 2px 4px rgba(0,0,0,0.1)',
                     }}
                 >
-                    Export to Excel
+                    Export CSV
                 </Button>
 
                 <Button